@@ -0,0 +1,147 @@
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from persistencia import escribir_atomico
+from registro_binario import TAMANO_REGISTRO, desde_segundos, desempaquetar, empaquetar
+
+ARCHIVO_INDICE = "indice.json"
+
+
+class ArchivoHistorico:
+    """
+    Archivo de turnos cerrados. Por día (fecha de apertura del turno) hay un
+    AAAAMMDD.dat con registros de ancho fijo (registro_binario) y un AAAAMMDD.cod
+    con los códigos originales. indice.json lleva por turno su día, el primer
+    registro, la cantidad y los totales, así que los resúmenes no leen los .dat
+    y las consultas de tickets sólo mapean (mmap) los segmentos pedidos.
+    """
+
+    def __init__(self, directorio: str):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._indice: Optional[List[Dict]] = None
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.directorio, nombre)
+
+    def indice(self) -> List[Dict]:
+        if self._indice is None:
+            try:
+                with open(self._ruta(ARCHIVO_INDICE), 'r', encoding='utf-8') as f:
+                    self._indice = json.load(f)
+            except FileNotFoundError:
+                self._indice = []
+        return self._indice
+
+    def archivar_turno(self, turno: str, abierto: datetime, cerrado: datetime,
+                       tickets: List, stats: Dict[str, int], total_faltantes: int) -> Dict:
+        """
+        Agrega los tickets (en orden de folio) del turno al archivo de su día y
+        lo registra en el índice. El índice se escribe al final y de forma
+        atómica: un corte a medias deja bytes sobrantes que la siguiente
+        escritura pisa, nunca una entrada que apunte a datos incompletos.
+        Archivar otra vez el mismo turno (un cierre recuperado) no lo duplica.
+        """
+        dia = abierto.strftime('%Y%m%d')
+        abierto_iso = abierto.isoformat(timespec='seconds')
+        cerrado_iso = cerrado.isoformat(timespec='seconds')
+        with self._lock:
+            os.makedirs(self.directorio, exist_ok=True)
+            indice = self.indice()
+            for entrada in indice:
+                if (entrada['turno'], entrada['abierto'], entrada['cerrado']) == (turno, abierto_iso, cerrado_iso):
+                    return entrada
+            del_dia = [e for e in indice if e['dia'] == dia]
+            primer_registro = del_dia[-1]['primer_registro'] + del_dia[-1]['cantidad'] if del_dia else 0
+            inicio_codigos = del_dia[-1]['fin_codigos'] if del_dia else 0
+
+            codigos = bytearray()
+            registros = bytearray()
+            for ticket in tickets:
+                codigo = ticket.codigo_original.encode('utf-8')
+                registros += empaquetar(ticket.folio, ticket.fecha_hora, ticket.centavos, ticket.estado,
+                                        inicio_codigos + len(codigos), len(codigo))
+                codigos += codigo
+
+            self._escribir_en(self._ruta(dia + ".dat"), primer_registro * TAMANO_REGISTRO, registros)
+            self._escribir_en(self._ruta(dia + ".cod"), inicio_codigos, codigos)
+
+            entrada = {
+                'dia': dia,
+                'turno': turno,
+                'abierto': abierto_iso,
+                'cerrado': cerrado_iso,
+                'primer_registro': primer_registro,
+                'cantidad': len(tickets),
+                'fin_codigos': inicio_codigos + len(codigos),
+                'total_ok': stats['total_ok'],
+                'total_cancelados': stats['total_cancelados'],
+                'centavos_ok': stats['centavos_ok'],
+                'centavos_cancelado': stats['centavos_cancelado'],
+                'total_faltantes': total_faltantes,
+            }
+            nuevo_indice = indice + [entrada]
+            escribir_atomico(self._ruta(ARCHIVO_INDICE), json.dumps(nuevo_indice, ensure_ascii=False))
+            self._indice = nuevo_indice
+        return entrada
+
+    @staticmethod
+    def _escribir_en(ruta: str, desplazamiento: int, datos: bytes):
+        modo = 'r+b' if os.path.exists(ruta) else 'wb'
+        with open(ruta, modo) as f:
+            f.seek(desplazamiento)
+            f.write(datos)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    def turnos(self, desde: Optional[str] = None, hasta: Optional[str] = None,
+               turno: Optional[str] = None) -> List[Dict]:
+        """Entradas del índice con día en [desde, hasta] ('YYYY-MM-DD'), sin leer los .dat"""
+        desde_dia = desde.replace('-', '') if desde else ""
+        hasta_dia = hasta.replace('-', '') if hasta else "99999999"
+        return [e for e in self.indice()
+                if desde_dia <= e['dia'] <= hasta_dia and (turno is None or e['turno'] == turno)]
+
+    def tickets(self, desde: Optional[str] = None, hasta: Optional[str] = None,
+                turno: Optional[str] = None) -> Iterator[Tuple[Dict, int, datetime, int, str, str]]:
+        """
+        (entrada, folio, fecha_hora, centavos, estado, codigo) de los turnos del
+        rango. Cada turno mapea sólo su tramo del .dat y de su .cod.
+        """
+        for entrada in self.turnos(desde, hasta, turno):
+            if not entrada['cantidad']:
+                continue
+            inicio = entrada['primer_registro'] * TAMANO_REGISTRO
+            largo = entrada['cantidad'] * TAMANO_REGISTRO
+            with _mapear(self._ruta(entrada['dia'] + ".dat"), inicio, largo) as (datos, base):
+                primero = desempaquetar(datos, base)
+                ultimo = desempaquetar(datos, base + largo - TAMANO_REGISTRO)
+                inicio_cod = primero[3]
+                with _mapear(self._ruta(entrada['dia'] + ".cod"), inicio_cod,
+                             ultimo[3] + ultimo[4] - inicio_cod) as (codigos, base_cod):
+                    for i in range(entrada['cantidad']):
+                        folio, segundos, centavos, desp, largo_cod, estado = desempaquetar(
+                            datos, base + i * TAMANO_REGISTRO)
+                        inicio_codigo = base_cod + desp - inicio_cod
+                        codigo = codigos[inicio_codigo:inicio_codigo + largo_cod].decode('utf-8')
+                        yield entrada, folio, desde_segundos(segundos), centavos, estado, codigo
+
+
+@contextmanager
+def _mapear(ruta: str, inicio: int, largo: int):
+    """mmap de sólo lectura del tramo [inicio, inicio+largo); entrega (mapa, posición del tramo en el mapa)"""
+    # El desplazamiento de mmap debe ser múltiplo de la granularidad del sistema
+    alineado = inicio - inicio % mmap.ALLOCATIONGRANULARITY
+    with open(ruta, 'rb') as archivo:
+        if largo == 0:
+            yield b"", 0
+            return
+        with mmap.mmap(archivo.fileno(), inicio - alineado + largo,
+                       access=mmap.ACCESS_READ, offset=alineado) as mapa:
+            yield mapa, inicio - alineado
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Auditoría de archivos históricos de escaneos (un código de barras por línea)
+Reparte el parseo entre varios procesos y genera, por día y por turno,
+totales y folios faltantes.
+
+Uso:
+    python auditoria.py escaneos_20251013.txt escaneos_20251014.txt
+    python auditoria.py --procesos 4 --faltantes archivo.txt
+
+Los códigos compactos (HHMMSS-FFF-MMMM.CC) no traen fecha: se toma de un
+YYYYMMDD en el nombre del archivo, o de --fecha si no lo hay.
+"""
+
+import argparse
+import os
+import re
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from parser_codigos import ParserCodigos
+from ticket_manager import formatear_monto
+
+# Códigos por bloque enviado a cada proceso
+TAMANO_BLOQUE = 5000
+# Bloques enviados y sin resultado por proceso: acota la memoria con archivos enormes
+BLOQUES_EN_VUELO_POR_PROCESO = 2
+# Hora a partir de la cual un ticket pertenece al turno de la tarde
+HORA_CAMBIO_TURNO = 15
+
+_RE_FECHA_ARCHIVO = re.compile(r'(\d{8})')
+
+# Parser por proceso (se crea una vez por worker)
+_parser: Optional[ParserCodigos] = None
+
+
+def _parsear_bloque(args: Tuple[List[str], str]) -> Tuple[List[Tuple[str, str, int, int]], int]:
+    """
+    Worker: parsea un bloque de códigos. Devuelve tuplas simples
+    (fecha, turno, folio, centavos) para que el envío entre procesos sea barato,
+    y la cantidad de códigos inválidos.
+    """
+    global _parser
+    if _parser is None:
+        _parser = ParserCodigos()
+    lineas, fecha_base_iso = args
+    fecha_base = datetime.fromisoformat(fecha_base_iso)
+
+    resultados = []
+    invalidos = 0
+    for linea in lineas:
+        try:
+            # Estricto: una línea basura no debe inventar un folio (ni cientos de faltantes)
+            parseado = _parser.parsear(linea.strip(), fecha_base, estricto=True)
+        except ValueError:
+            parseado = None
+        if parseado is None:
+            invalidos += 1
+            continue
+        fecha_hora = parseado.fecha_hora
+        turno = "mañana" if fecha_hora.hour < HORA_CAMBIO_TURNO else "tarde"
+        resultados.append((fecha_hora.strftime('%Y-%m-%d'), turno, int(parseado.folio), parseado.centavos))
+    return resultados, invalidos
+
+
+def _fecha_de_archivo(ruta: str, fecha_defecto: datetime) -> datetime:
+    match = _RE_FECHA_ARCHIVO.search(os.path.basename(ruta))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), '%Y%m%d')
+        except ValueError:
+            pass
+    return fecha_defecto
+
+
+def _bloques(rutas: List[str], fecha_defecto: datetime, tamano: int):
+    for ruta in rutas:
+        fecha_base = _fecha_de_archivo(ruta, fecha_defecto).isoformat()
+        bloque = []
+        with open(ruta, 'r', encoding='utf-8', errors='replace') as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                bloque.append(linea)
+                if len(bloque) >= tamano:
+                    yield bloque, fecha_base
+                    bloque = []
+        if bloque:
+            yield bloque, fecha_base
+
+
+def auditar(rutas: List[str], procesos: Optional[int] = None, tamano_bloque: int = TAMANO_BLOQUE,
+            fecha_defecto: Optional[datetime] = None) -> Tuple[Dict[Tuple[str, str], Dict], int]:
+    """
+    Parsea los archivos en paralelo y agrupa por (fecha, turno).
+    Retorna ({(fecha, turno): resumen}, códigos inválidos).
+    """
+    fecha_defecto = fecha_defecto or datetime.now()
+    # (fecha, turno) -> folio -> centavos (el primer escaneo de un folio es el que cuenta)
+    grupos: Dict[Tuple[str, str], Dict[int, int]] = defaultdict(dict)
+    duplicados: Dict[Tuple[str, str], int] = defaultdict(int)
+    invalidos = 0
+
+    def acumular(resultados):
+        for fecha, turno, folio, centavos in resultados:
+            grupo = grupos[(fecha, turno)]
+            if folio in grupo:
+                duplicados[(fecha, turno)] += 1
+            else:
+                grupo[folio] = centavos
+
+    en_vuelo = BLOQUES_EN_VUELO_POR_PROCESO * (procesos or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        # Se leen bloques sólo mientras haya lugar; los resultados se toman en orden de archivo
+        pendientes = deque()
+        for bloque in _bloques(rutas, fecha_defecto, tamano_bloque):
+            pendientes.append(ejecutor.submit(_parsear_bloque, bloque))
+            if len(pendientes) >= en_vuelo:
+                resultados, invalidos_bloque = pendientes.popleft().result()
+                invalidos += invalidos_bloque
+                acumular(resultados)
+        while pendientes:
+            resultados, invalidos_bloque = pendientes.popleft().result()
+            invalidos += invalidos_bloque
+            acumular(resultados)
+
+    resumen = {}
+    for clave, folios in grupos.items():
+        ordenados = sorted(folios)
+        faltantes = []
+        for anterior, siguiente in zip(ordenados, ordenados[1:]):
+            if siguiente - anterior > 1:
+                faltantes.extend(range(anterior + 1, siguiente))
+        resumen[clave] = {
+            'total': len(ordenados),
+            'centavos': sum(folios.values()),
+            'folio_min': ordenados[0],
+            'folio_max': ordenados[-1],
+            'faltantes': faltantes,
+            'duplicados': duplicados[clave],
+        }
+    return resumen, invalidos
+
+
+def generar_reporte(resumen: Dict[Tuple[str, str], Dict], invalidos: int, listar_faltantes: bool = False) -> str:
+    lineas = ["=== AUDITORÍA DE ESCANEOS ==="]
+    total_faltantes = 0
+    # mañana antes que tarde dentro de cada día
+    for (fecha, turno) in sorted(resumen, key=lambda c: (c[0], c[1] != "mañana")):
+        datos = resumen[(fecha, turno)]
+        total_faltantes += len(datos['faltantes'])
+        lineas.append(
+            f"{fecha} {turno:<7} tickets: {datos['total']:>6}  "
+            f"monto: {formatear_monto(datos['centavos']):>12}  "
+            f"folios {datos['folio_min']:03d}-{datos['folio_max']:03d}  "
+            f"faltantes: {len(datos['faltantes'])}  duplicados: {datos['duplicados']}"
+        )
+        if listar_faltantes and datos['faltantes']:
+            lineas.append("    " + ", ".join(f"{f:03d}" for f in datos['faltantes']))
+    lineas.append(f"Total faltantes: {total_faltantes}")
+    lineas.append(f"Códigos inválidos: {invalidos}")
+    return "\n".join(lineas)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argumentos = argparse.ArgumentParser(description="Auditoría de archivos históricos de escaneos")
+    argumentos.add_argument("archivos", nargs="+", help="Archivos con un código de barras por línea")
+    argumentos.add_argument("--procesos", type=int, default=None, help="Procesos a usar (por defecto: núcleos)")
+    argumentos.add_argument("--bloque", type=int, default=TAMANO_BLOQUE, help="Códigos por bloque")
+    argumentos.add_argument("--fecha", help="Fecha YYYY-MM-DD para archivos sin fecha en el nombre")
+    argumentos.add_argument("--faltantes", action="store_true", help="Listar los folios faltantes")
+    opciones = argumentos.parse_args(argv)
+
+    fecha_defecto = datetime.fromisoformat(opciones.fecha) if opciones.fecha else None
+    resumen, invalidos = auditar(opciones.archivos, opciones.procesos, opciones.bloque, fecha_defecto)
+    print(generar_reporte(resumen, invalidos, opciones.faltantes))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks del Sistema de Control de Tickets
+Uso: python benchmarks.py
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Optional
+
+from parser_codigos import CodigoParseado, ParserCodigos
+from persistencia import crear_persistencia
+from ticket_manager import Ticket, TicketManager
+
+
+def parsear_codigo_original(codigo: str, ahora: Optional[datetime] = None) -> Optional[CodigoParseado]:
+    """
+    Copia de referencia del parser anterior (re.* sin precompilar, cadena de
+    intentos completa). Se usa para medir la mejora y verificar equivalencia.
+    """
+    try:
+        codigo = codigo.strip()
+        codigo_norm = re.sub(r'[^0-9\.]', '', codigo)
+        if len(codigo_norm) < 12:
+            return None
+
+        for patron in (r'^(\d{6})(\d{3,5})(\d{4})\.(\d{2})$', r'^(\d{6})(\d{3,5})(\d{4})(\d{2})$'):
+            m = re.match(patron, codigo_norm)
+            if m:
+                hora_str, folio_str, mmmm, cc = m.groups()
+                hoy = ahora or datetime.now()
+                fecha = hoy.replace(hour=int(hora_str[:2]), minute=int(hora_str[2:4]),
+                                    second=int(hora_str[4:6]), microsecond=0)
+                return CodigoParseado(str(int(folio_str)), fecha, float(f"{int(mmmm):04d}.{int(cc):02d}"))
+
+        match_estandar = re.search(r'(\d{14})-(\d{3})-(\d{4}\.\d{2})', codigo)
+        if match_estandar:
+            fecha_str, folio_str, monto_str = match_estandar.groups()
+            return CodigoParseado(folio_str, datetime.strptime(fecha_str, '%Y%m%d%H%M%S'), float(monto_str))
+
+        patrones_fecha = [
+            r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})',
+            r'(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})',
+            r'(\d{14})',
+            r'(\d{12})',
+        ]
+        fecha = folio = monto = None
+        for patron in patrones_fecha:
+            match = re.search(patron, codigo)
+            if match:
+                fecha_str = match.group(1)
+                try:
+                    if 'T' in fecha_str:
+                        fecha = datetime.strptime(fecha_str, '%Y-%m-%dT%H:%M:%S')
+                    elif '/' in fecha_str:
+                        fecha = datetime.strptime(fecha_str, '%d/%m/%Y %H:%M:%S')
+                    elif len(fecha_str) == 14:
+                        fecha = datetime.strptime(fecha_str, '%Y%m%d%H%M%S')
+                    elif len(fecha_str) == 12:
+                        fecha = datetime.strptime(fecha_str, '%Y%m%d%H%M')
+                    break
+                except ValueError:
+                    continue
+
+        match_folio = re.search(r'_(\d{3,5})(?:_|$)', codigo)
+        if match_folio:
+            folio = str(int(match_folio.group(1)))
+        else:
+            folios = re.findall(r'(\b\d{3,5}\b)', codigo)
+            if folios:
+                folio = str(int(folios[0]))
+
+        montos = re.findall(r'(\d+\.\d{2})', codigo)
+        if montos:
+            monto = float(montos[0])
+
+        if not fecha:
+            fecha = ahora or datetime.now()
+        if not folio:
+            folio = str(int(datetime.now().timestamp()) % 10000)
+        if monto is None:
+            numeros = [n for n in re.findall(r'\d+', codigo) if 1 <= len(n) <= 6]
+            monto = float(numeros[-1]) if numeros else 0.0
+        return CodigoParseado(folio, fecha, monto)
+    except Exception:
+        return None
+
+
+# Mezcla representativa: casi todo compacto, algo de formatos heredados
+CODIGOS_MUESTRA = [
+    "093015-005-0100.50",
+    "141502-1234-0089.75",
+    "180000-99999-1250.00",
+    "0915300070125990",
+    "20251013143025-001-0125.50",
+    "2025-10-13T09:15:30_001_125.50",
+    "13/10/2025 09:20:15_002_89.75",
+    "CODE128:20251013144000128189.99END",
+]
+
+
+def _medir(funcion, codigos, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for codigo in codigos:
+            funcion(codigo)
+    return time.perf_counter() - inicio
+
+
+def benchmark_parser(repeticiones: int = 20000):
+    """Compara el parser anterior contra ParserCodigos (compacto y mezcla)"""
+    parser = ParserCodigos()
+    ahora = datetime(2025, 10, 13, 12, 0, 0)
+    nuevo = lambda c: parser.parsear(c.strip(), ahora)
+    original = lambda c: parsear_codigo_original(c, ahora)
+
+    compactos = CODIGOS_MUESTRA[:3]
+    print("=== BENCHMARK PARSER ===")
+    for nombre, codigos in (("compacto", compactos), ("mezcla", CODIGOS_MUESTRA)):
+        t_orig = _medir(original, codigos, repeticiones)
+        t_nuevo = _medir(nuevo, codigos, repeticiones)
+        total = repeticiones * len(codigos)
+        print(f"{nombre:>9}: original {t_orig / total * 1e6:6.2f} us/código | "
+              f"nuevo {t_nuevo / total * 1e6:6.2f} us/código | x{t_orig / t_nuevo:.1f}")
+
+
+class TicketConDict:
+    """Disposición anterior de Ticket (atributos en un __dict__ por instancia)"""
+
+    def __init__(self, folio, fecha_hora, monto, codigo_original, estado="OK"):
+        self.folio = folio
+        self.fecha_hora = fecha_hora
+        self.monto = monto
+        self.codigo_original = codigo_original
+        self.estado = estado
+
+
+def _memoria_tickets(clase, cantidad: int) -> int:
+    """Bytes asignados para `cantidad` tickets guardados en un dict por folio"""
+    base = datetime(2025, 10, 13, 9, 0, 0)
+    tracemalloc.start()
+    tickets = {}
+    for folio in range(1, cantidad + 1):
+        fecha = base + timedelta(seconds=folio)
+        codigo = f"{fecha:%H%M%S}-{folio:05d}-0125.50"
+        tickets[folio] = clase(folio, fecha, 125.5, codigo)
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tickets
+    return actual
+
+
+def benchmark_memoria(cantidades=(10_000, 100_000, 1_000_000)):
+    """Compara la memoria de Ticket con __slots__ contra la versión con __dict__"""
+    print("=== BENCHMARK MEMORIA ===")
+    for cantidad in cantidades:
+        con_dict = _memoria_tickets(TicketConDict, cantidad)
+        con_slots = _memoria_tickets(Ticket, cantidad)
+        print(f"{cantidad:>9} tickets: __dict__ {con_dict / 2**20:8.1f} MiB "
+              f"({con_dict / cantidad:5.0f} B/ticket) | __slots__ {con_slots / 2**20:8.1f} MiB "
+              f"({con_slots / cantidad:5.0f} B/ticket) | -{(1 - con_slots / con_dict) * 100:.0f}%")
+
+
+# Módulos que no deben cargarse al importar ticket_manager (ver test_sistema)
+MODULOS_DIFERIDOS = ('dateutil', 'sqlite3', 'socket')
+
+_SCRIPT_PRIMER_ESCANEO = """
+import sys, time
+inicio = time.perf_counter()
+from ticket_manager import TicketManager
+tm = TicketManager(sys.argv[1], cargar=sys.argv[2] == '1')
+listo = time.perf_counter()
+if sys.argv[2] != '1':
+    tm.cargar_datos()
+tm.agregar_ticket(sys.argv[3])
+fin = time.perf_counter()
+tm.cerrar()
+print(listo - inicio, fin - inicio)
+"""
+
+
+def _tiempo_import(modulo: str) -> float:
+    """Tiempo acumulado (s) de importar `modulo` según -X importtime"""
+    salida = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    for linea in reversed(salida.stderr.splitlines()):
+        partes = [p.strip() for p in linea.split('|')]
+        if len(partes) == 3 and partes[2] == modulo:
+            return int(partes[1]) / 1e6
+    raise RuntimeError(f"No se pudo medir el import de {modulo}: {salida.stderr[-200:]}")
+
+
+def benchmark_arranque(tickets: int = 20_000, repeticiones: int = 5):
+    """
+    Tiempo de import (-X importtime) y tiempo hasta el primer escaneo con un
+    turno de `tickets` tickets guardados, cargando antes o después de crear el objeto.
+    """
+    print("=== BENCHMARK ARRANQUE ===")
+    for modulo in ("ticket_manager", "gui_app"):
+        mejor = min(_tiempo_import(modulo) for _ in range(repeticiones))
+        print(f"import {modulo:<15}: {mejor * 1000:7.1f} ms")
+
+    base = datetime(2025, 10, 13, 9, 0, 0)
+    with tempfile.TemporaryDirectory() as carpeta:
+        data_file = os.path.join(carpeta, "tickets_data.json")
+        estado = {'turno_actual': 'mañana', 'turno_abierto': base.isoformat(), 'tickets': {
+            str(folio): {'folio': folio, 'fecha_hora': (base + timedelta(seconds=folio)).isoformat(),
+                         'centavos': 12550, 'codigo_original': f"{folio:05d}", 'estado': 'OK'}
+            for folio in range(1, tickets + 1)
+        }, 'tickets_faltantes': [], 'ultimo_folio_esperado': tickets}
+        with open(data_file, 'w', encoding='utf-8') as f:
+            json.dump(estado, f)
+        siguiente = base + timedelta(seconds=tickets + 1)
+        codigo = f"{siguiente:%H%M%S}-{tickets + 1:05d}-0125.50"
+
+        directorio = os.path.dirname(os.path.abspath(__file__))
+        for nombre, cargar in (("carga en el constructor", '1'), ("carga diferida (GUI)", '0')):
+            mediciones = []
+            for _ in range(repeticiones):
+                salida = subprocess.run([sys.executable, "-c", _SCRIPT_PRIMER_ESCANEO, data_file, cargar, codigo],
+                                        capture_output=True, text=True, cwd=directorio, check=True)
+                mediciones.append(tuple(float(x) for x in salida.stdout.split()[-2:]))
+                # El snapshot no cambia: el escaneo queda sólo en el journal, se descarta
+                for sufijo in (".journal", ".journal.1"):
+                    ruta = os.path.splitext(data_file)[0] + sufijo
+                    if os.path.exists(ruta):
+                        os.remove(ruta)
+            listo, primer_escaneo = min(mediciones, key=lambda m: m[1])
+            print(f"{nombre:<24}: objeto listo {listo * 1000:7.1f} ms | "
+                  f"primer escaneo {primer_escaneo * 1000:7.1f} ms ({tickets} tickets)")
+
+
+def benchmark_recarga(tickets: int = 100_000, repeticiones: int = 3):
+    """
+    Tiempo de TicketManager(...) tras un cierre inesperado con `tickets` tickets
+    sólo en el journal (json), en SQLite y en el log de ancho fijo (binario)
+    """
+    print("=== BENCHMARK RECARGA ===")
+    base = datetime(2025, 10, 13, 9, 0, 0)
+    registros = [{'op': 'alta', 'f': folio, 'h': (base + timedelta(seconds=folio)).isoformat(),
+                  'ct': 12550, 'c': f"{base + timedelta(seconds=folio):%H%M%S}-{folio:05d}-0125.50", 'e': 'OK'}
+                 for folio in range(1, tickets + 1)]
+    for backend in ("json", "sqlite", "binario"):
+        with tempfile.TemporaryDirectory() as carpeta:
+            data_file = os.path.join(carpeta, "tickets_data.json")
+            persistencia = crear_persistencia(data_file, backend)
+            persistencia.registrar_lote(registros)
+            persistencia.cerrar()
+            mejor = float('inf')
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                tm = TicketManager(data_file, backend=backend)
+                mejor = min(mejor, time.perf_counter() - inicio)
+                assert len(tm.tickets) == tickets
+                tm.cerrar()
+            print(f"{backend:<8}: {mejor * 1000:8.1f} ms ({tickets} tickets)")
+
+
+if __name__ == "__main__":
+    benchmark_arranque()
+    benchmark_recarga()
+    benchmark_parser()
+    # "python benchmarks.py rapido" omite el caso de 1M de tickets
+    benchmark_memoria((10_000, 100_000) if "rapido" in sys.argv[1:] else (10_000, 100_000, 1_000_000))
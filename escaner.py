@@ -0,0 +1,241 @@
+import queue
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from parser_codigos import normalizar_codigo
+
+# Un lector de códigos (teclado emulado) teclea cada carácter en pocos ms;
+# una pausa mayor a esta separa dos escaneos
+TIMEOUT_ENTRE_TECLAS = 0.08
+# Caracteres que el lector envía al terminar un código
+TERMINADORES = ('\r', '\n', '\t')
+
+
+def codigo_completo(codigo: str) -> bool:
+    """Indica si el código ya tiene todos los fragmentos esperados"""
+    codigo_norm = normalizar_codigo(codigo.strip())
+    n = len(codigo_norm)
+    if n >= 3 and codigo_norm[-3] == '.':
+        # HHMMSS + folio (3-5 dígitos) + monto con punto
+        if 16 <= n <= 18 and codigo_norm.count('.') == 1:
+            return True
+    elif 15 <= n <= 17 and '.' not in codigo_norm:
+        # HHMMSS + folio (3-5 dígitos) + monto sin punto
+        return True
+    # Formatos largos con fecha completa (14 dígitos seguidos) + folio + monto
+    return n >= 18 and any(len(parte) >= 14 for parte in codigo_norm.split('.'))
+
+
+class LectorEscaner:
+    """
+    Máquina de estados de la entrada del lector de códigos.
+    ESPERANDO: buffer vacío. LEYENDO: acumulando caracteres.
+    Un escaneo termina con un terminador (Enter/Tab) o, si el código ya está
+    completo, con una pausa mayor a TIMEOUT_ENTRE_TECLAS. Un código incompleto
+    sigue acumulando tras la pausa (captura manual) hasta el Enter.
+    """
+
+    ESPERANDO = "esperando"
+    LEYENDO = "leyendo"
+
+    def __init__(self, timeout: float = TIMEOUT_ENTRE_TECLAS):
+        self.timeout = timeout
+        self._buffer: List[str] = []
+        self._ultima_tecla = 0.0
+
+    @property
+    def estado(self) -> str:
+        return self.LEYENDO if self._buffer else self.ESPERANDO
+
+    @property
+    def texto(self) -> str:
+        return "".join(self._buffer)
+
+    def recibir(self, caracter: str, instante: Optional[float] = None) -> List[str]:
+        """
+        Procesa un carácter y devuelve los escaneos que quedaron terminados
+        (ninguno, uno, o dos si llegó un terminador justo tras una pausa).
+        """
+        instante = time.monotonic() if instante is None else instante
+        terminados = []
+
+        # Pausa larga con un código completo en el buffer: era otro escaneo
+        pausa = self._buffer and instante - self._ultima_tecla > self.timeout
+        if pausa and codigo_completo(self.texto):
+            terminados.append(self._vaciar())
+
+        if caracter in TERMINADORES:
+            if self._buffer:
+                terminados.append(self._vaciar())
+        else:
+            self._buffer.append(caracter)
+            self._ultima_tecla = instante
+
+        return [codigo for codigo in terminados if codigo]
+
+    def verificar_timeout(self, instante: Optional[float] = None) -> Optional[str]:
+        """Cierra el escaneo en curso si lleva una pausa y el código está completo"""
+        instante = time.monotonic() if instante is None else instante
+        if (self._buffer and instante - self._ultima_tecla > self.timeout
+                and codigo_completo(self.texto)):
+            return self._vaciar() or None
+        return None
+
+    def borrar(self):
+        """Retroceso en la captura manual"""
+        if self._buffer:
+            self._buffer.pop()
+
+    def descartar(self):
+        self._buffer.clear()
+
+    def _vaciar(self) -> str:
+        codigo = self.texto.strip()
+        self._buffer.clear()
+        return codigo
+
+
+class FuenteEscaner:
+    """
+    Origen de caracteres del lector. leer() devuelve el texto recibido,
+    '' si pasó el timeout sin datos, o None cuando la fuente se agotó.
+    """
+
+    def leer(self, timeout: float) -> Optional[str]:
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class FuenteArchivo(FuenteEscaner):
+    """
+    Dispositivo serie/HID en modo texto (COM3, /dev/ttyACM0) o archivo.
+    La lectura es bloqueante: el lector debe enviar un terminador (CR) al final.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._archivo = open(ruta, 'rb', buffering=0)
+
+    def leer(self, timeout):
+        datos = self._archivo.read(256)
+        if not datos:
+            return None
+        return datos.decode('utf-8', errors='replace')
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class FuenteStdin(FuenteEscaner):
+    """Un código por línea desde la entrada estándar"""
+
+    def leer(self, timeout):
+        linea = sys.stdin.readline()
+        return linea if linea else None
+
+
+class FuenteSocket(FuenteEscaner):
+    """Servidor TCP local (un cliente a la vez); útil para pruebas y puentes de red"""
+
+    def __init__(self, puerto: int = 0, host: str = "127.0.0.1"):
+        # Import diferido: la GUI sin escáner por red no carga socket/select
+        import select
+        import socket
+
+        self._select = select.select
+        self._servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._servidor.bind((host, puerto))
+        self._servidor.listen(1)
+        # Con puerto=0 el sistema asigna uno libre
+        self.puerto = self._servidor.getsockname()[1]
+        self._cliente: Optional[socket.socket] = None
+
+    def leer(self, timeout):
+        activo = self._cliente or self._servidor
+        listos, _, _ = self._select([activo], [], [], timeout)
+        if not listos:
+            return ''
+        if self._cliente is None:
+            self._cliente, _ = self._servidor.accept()
+            return ''
+        datos = self._cliente.recv(4096)
+        if not datos:
+            # El cliente se desconectó; esperar al siguiente
+            self._cliente.close()
+            self._cliente = None
+            return ''
+        return datos.decode('utf-8', errors='replace')
+
+    def cerrar(self):
+        if self._cliente is not None:
+            self._cliente.close()
+        self._servidor.close()
+
+
+def crear_fuente(especificacion: str) -> FuenteEscaner:
+    """'stdin', 'tcp:PUERTO' o la ruta del dispositivo (TICKETS_ESCANER)"""
+    if especificacion == "stdin":
+        return FuenteStdin()
+    if especificacion.startswith("tcp:"):
+        return FuenteSocket(int(especificacion[4:]))
+    return FuenteArchivo(especificacion)
+
+
+class IngestaEscaner:
+    """
+    Hilo que lee una fuente, delimita los escaneos con LectorEscaner y los deja
+    en una cola. La GUI la vacía con after(); TicketManager se sigue usando
+    sólo desde el hilo de Tk.
+    """
+
+    def __init__(self, fuente: FuenteEscaner, timeout: float = TIMEOUT_ENTRE_TECLAS):
+        self.fuente = fuente
+        self.lector = LectorEscaner(timeout)
+        self.cola: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._leer_en_segundo_plano, daemon=True)
+        self._hilo.start()
+
+    def _leer_en_segundo_plano(self):
+        while not self._detener.is_set():
+            try:
+                datos = self.fuente.leer(self.lector.timeout)
+            except (OSError, ValueError) as e:
+                if not self._detener.is_set():
+                    print(f"Error leyendo el escáner: {e}")
+                break
+            if datos is None:
+                break
+            instante = time.monotonic()
+            for caracter in datos:
+                for codigo in self.lector.recibir(caracter, instante):
+                    self.cola.put(codigo)
+            codigo = self.lector.verificar_timeout()
+            if codigo:
+                self.cola.put(codigo)
+        # Lo que quedó al agotarse la fuente cuenta como un escaneo terminado
+        for codigo in self.lector.recibir("\n"):
+            self.cola.put(codigo)
+
+    def obtener_codigos(self) -> List[str]:
+        """Escaneos terminados desde la última llamada (no bloquea)"""
+        codigos = []
+        while True:
+            try:
+                codigos.append(self.cola.get_nowait())
+            except queue.Empty:
+                return codigos
+
+    def detener(self):
+        self._detener.set()
+        self.fuente.cerrar()
+        if self._hilo is not None:
+            self._hilo.join(timeout=1.0)
@@ -1,60 +1,99 @@
-import re
+import os
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox
 import threading
 import time
-from ticket_manager import TicketManager
+from collections import deque
+from escaner import IngestaEscaner, LectorEscaner, codigo_completo, crear_fuente
+from impresora import ColaImpresion, TrabajoImpresion, crear_transporte
+from ticket_manager import TicketManager, formatear_monto
+
+# Filas que se insertan por página en la tabla de resumen
+FILAS_POR_PAGINA = 200
+# Cada cuántos ms la GUI revisa la cola del hilo del escáner
+INTERVALO_INGESTA_MS = 30
+# Como máximo un repintado de estadísticas por intervalo (~30 cuadros por segundo)
+INTERVALO_REPINTADO_MS = 33
+# Cada cuántos ms se revisa si terminó la carga del turno en segundo plano
+INTERVALO_CARGA_MS = 50
+# Cada cuántos ms se revisa el estado de los trabajos de impresión en curso
+INTERVALO_IMPRESION_MS = 200
+# Cada cuántos ms se revisa si el hilo escritor pudo guardar los escaneos
+INTERVALO_PERSISTENCIA_MS = 2000
 
 class PantallaConfirmacion:
-    """Ventana de confirmación verde/amarilla que aparece al registrar tickets"""
-    
-    def __init__(self, parent, es_advertencia=False, mensaje="Ticket registrado"):
+    """
+    Confirmación verde/amarilla al registrar tickets, roja si el escaneo se rechazó.
+    Se crea una sola vez y se reutiliza: cada escaneo sólo cambia color y texto.
+    No toma el foco ni hace grab_set, así el escáner nunca queda bloqueado.
+    """
+
+    ANCHO = 400
+    ALTO = 200
+    # Milisegundos que queda visible tras la última confirmación (más si fue un error)
+    DURACION_MS = 1500
+    DURACION_ERROR_MS = 4000
+    # Confirmaciones recientes que se muestran debajo del mensaje
+    HISTORIAL = 4
+
+    def __init__(self, parent):
         self.ventana = tk.Toplevel(parent)
+        self.ventana.withdraw()
         self.ventana.title("Confirmación")
-        
-        # Configurar ventana
-        self.ventana.geometry("400x200")
         self.ventana.resizable(False, False)
         self.ventana.transient(parent)
-        self.ventana.grab_set()
         # Forzar siempre visible sobre otras ventanas (solo esta confirmación)
         try:
             self.ventana.attributes("-topmost", True)
         except Exception:
             pass
-        
-        # Centrar en pantalla
-        self.ventana.update_idletasks()
-        x = (self.ventana.winfo_screenwidth() // 2) - (400 // 2)
-        y = (self.ventana.winfo_screenheight() // 2) - (200 // 2)
-        self.ventana.geometry(f"400x200+{x}+{y}")
-        
-        # Color de fondo
-        color_fondo = "#FFD700" if es_advertencia else "#00FF00"  # Amarillo o verde fosforescente
-        self.ventana.configure(bg=color_fondo)
-        
-        # Etiqueta principal
-        label = tk.Label(
-            self.ventana,
-            text=mensaje,
-            font=("Arial", 16, "bold"),
-            bg=color_fondo,
-            fg="black" if es_advertencia else "white",
-            wraplength=350
-        )
-        label.pack(expand=True)
-        
-        # Auto-cerrar después de 1.5 segundos
-        self.ventana.after(1500, self.cerrar)
-        
-        # También permitir cerrar con clic o tecla
+
+        # Centrar en pantalla (una sola vez)
+        x = (self.ventana.winfo_screenwidth() // 2) - (self.ANCHO // 2)
+        y = (self.ventana.winfo_screenheight() // 2) - (self.ALTO // 2)
+        self.ventana.geometry(f"{self.ANCHO}x{self.ALTO}+{x}+{y}")
+
+        self.label = tk.Label(self.ventana, font=("Arial", 16, "bold"), wraplength=350)
+        self.label.pack(expand=True)
+        self.label_historial = tk.Label(self.ventana, font=("Arial", 9), justify="left")
+        self.label_historial.pack(pady=(0, 8))
+
+        self.recientes = deque(maxlen=self.HISTORIAL + 1)
+        self._ocultar_id = None
+
+        # Permitir cerrar con clic (no con teclas: serían caracteres del escáner)
         self.ventana.bind("<Button-1>", lambda e: self.cerrar())
-        self.ventana.bind("<Key>", lambda e: self.cerrar())
-        self.ventana.focus_set()
-    
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cerrar)
+
+    def mostrar(self, mensaje="Ticket registrado", es_advertencia=False, es_error=False):
+        self.recientes.append(mensaje.splitlines()[0] if mensaje else "")
+
+        # Rojo, amarillo o verde fosforescente
+        if es_error:
+            color_fondo, color_texto = "#FF3B30", "white"
+        elif es_advertencia:
+            color_fondo, color_texto = "#FFD700", "black"
+        else:
+            color_fondo, color_texto = "#00FF00", "white"
+        self.ventana.configure(bg=color_fondo)
+        self.label.config(text=mensaje, bg=color_fondo, fg=color_texto)
+        anteriores = list(self.recientes)[:-1]
+        self.label_historial.config(text="\n".join(reversed(anteriores)), bg=color_fondo, fg=color_texto)
+
+        if self.ventana.state() == "withdrawn":
+            self.ventana.deiconify()
+        self.ventana.lift()
+
+        # Reiniciar el auto-cierre con cada confirmación
+        if self._ocultar_id is not None:
+            self.ventana.after_cancel(self._ocultar_id)
+        duracion = self.DURACION_ERROR_MS if es_error else self.DURACION_MS
+        self._ocultar_id = self.ventana.after(duracion, self.cerrar)
+
     def cerrar(self):
+        self._ocultar_id = None
         if self.ventana.winfo_exists():
-            self.ventana.destroy()
+            self.ventana.withdraw()
 
 class AplicacionTickets:
     """Aplicación principal para el manejo de tickets de carnicería"""
@@ -65,21 +104,87 @@ class AplicacionTickets:
         self.root.geometry("800x600")
         self.root.configure(bg="#f0f0f0")
         
-        # Inicializar el manejador de tickets
-        self.ticket_manager = TicketManager()
+        # Inicializar el manejador de tickets; los datos se cargan en un hilo
+        # después de dibujar la ventana y los escaneos esperan en una lista
+        self.ticket_manager = TicketManager(cargar=False)
+        self._cargado = threading.Event()
+        # Sólo lo toca el hilo de Tk: se activa al vaciar los escaneos en espera,
+        # así ningún escaneo nuevo se adelanta a los que llegaron durante la carga
+        self._listo = False
+        self._escaneos_pendientes = []
         
-        # Variable para el código de barras
+        # Variable para el código de barras (sólo muestra lo que lleva el lector)
         self.codigo_var = tk.StringVar()
-        self.codigo_var.trace('w', self.on_codigo_change)
+        self.lector = LectorEscaner()
+        self._timeout_escaneo = None
+        # (event.time en segundos, time.monotonic() al atenderla) de la última tecla
+        self._ultima_tecla = (0.0, 0.0)
         
         # Modo cancelado
         self.modo_cancelado = False
         
         # Configurar interfaz
+        self._repintado_pendiente = None
+        self._texto_stats = None
         self.crear_interfaz()
+        self.confirmacion = PantallaConfirmacion(self.root)
+        threading.Thread(target=self._cargar_en_segundo_plano, daemon=True).start()
+        self.root.after(INTERVALO_CARGA_MS, self._verificar_carga)
         
         # Focus en campo de entrada
         self.entrada_codigo.focus_set()
+
+        # Escáner por dispositivo/stdin/socket (TICKETS_ESCANER); si no, sólo el campo de texto
+        self.ingesta = None
+        especificacion = os.environ.get('TICKETS_ESCANER')
+        if especificacion:
+            try:
+                self.ingesta = IngestaEscaner(crear_fuente(especificacion))
+                self.ingesta.iniciar()
+                self.root.after(INTERVALO_INGESTA_MS, self._sondear_ingesta)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Error", f"No se pudo abrir el escáner '{especificacion}': {e}")
+                self.ingesta = None
+
+        # Impresora térmica (TICKETS_IMPRESORA); la cola se crea al primer resumen
+        self.cola_impresion = None
+        self._impresiones_en_curso = 0
+
+    def _cargar_en_segundo_plano(self):
+        try:
+            self.ticket_manager.cargar_datos()
+        finally:
+            self._cargado.set()
+
+    def _verificar_carga(self):
+        """Al terminar la carga: suscribirse a eventos y procesar los escaneos en espera"""
+        if not self._cargado.is_set():
+            self.root.after(INTERVALO_CARGA_MS, self._verificar_carga)
+            return
+        # Suscribir recién ahora: los eventos de la carga salían del otro hilo
+        self.ticket_manager.suscribir(self.on_evento_tickets)
+        pendientes, self._escaneos_pendientes = self._escaneos_pendientes, []
+        self._listo = True
+        self.actualizar_estadisticas()
+        self._despachar(pendientes)
+        self.root.after(INTERVALO_PERSISTENCIA_MS, self._sondear_persistencia)
+
+    def _sondear_persistencia(self):
+        """Muestra (o quita) el aviso de escaneos sin guardar aunque no se escanee nada"""
+        self.actualizar_estadisticas()
+        self.root.after(INTERVALO_PERSISTENCIA_MS, self._sondear_persistencia)
+
+    def _datos_cargando(self) -> bool:
+        """Avisa y retorna True si el turno todavía se está cargando"""
+        if self._listo:
+            return False
+        messagebox.showinfo("Cargando", "Espere a que terminen de cargarse los datos del turno.")
+        return True
+
+    def _sondear_ingesta(self):
+        """Procesa los escaneos que dejó el hilo de ingesta, aunque el foco esté en otra ventana"""
+        self._despachar(self.ingesta.obtener_codigos())
+        self.root.after(INTERVALO_INGESTA_MS, self._sondear_ingesta)
     
     def crear_interfaz(self):
         """Crea la interfaz gráfica principal"""
@@ -123,7 +228,7 @@ class AplicacionTickets:
             justify="center"
         )
         self.entrada_codigo.pack(pady=10)
-        self.entrada_codigo.bind("<Return>", self.procesar_codigo_manual)
+        self.entrada_codigo.bind("<Key>", self.on_tecla)
         
         # Instrucciones
         instrucciones = tk.Label(
@@ -199,6 +304,16 @@ class AplicacionTickets:
         )
         btn_imprimir.pack(side="left", padx=10)
 
+        # Estado del último trabajo de impresión (se actualiza sin bloquear)
+        self.label_impresion = tk.Label(
+            self.root,
+            text="",
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#7f8c8d"
+        )
+        self.label_impresion.pack()
+
         # Checkbox: Siempre visible (investigación: usa atributo topmost)
         self.topmost_var = tk.BooleanVar(value=False)
         chk_topmost = tk.Checkbutton(
@@ -236,99 +351,71 @@ class AplicacionTickets:
         # Area de log (oculta por defecto, se puede mostrar para debug)
         self.log_visible = False
 
-    def _codigo_parece_completo(self, codigo: str) -> bool:
-        """Valida si el escaneo ya tiene todos los fragmentos esperados"""
-        codigo_limpio = codigo.strip()
-        if not codigo_limpio:
-            return False
-
-        codigo_norm = re.sub(r'[^0-9\.]', '', codigo_limpio)
-
-        patrones_norm = [
-            r'^\d{6}\d{3,5}\d{4}\.\d{2}$',  # HHMMSS + folio (3-5 dígitos) + monto con punto
-            r'^\d{6}\d{3,5}\d{4}\d{2}$',     # HHMMSS + folio (3-5 dígitos) + monto sin punto
-        ]
-
-        if any(re.fullmatch(p, codigo_norm) for p in patrones_norm):
-            return True
-
-        # Si el escáner envía Enter/CR al final, úsalo como señal de fin
-        if (codigo_limpio.endswith('\n') or codigo_limpio.endswith('\r')) and len(codigo_norm) >= 12:
-            return True
-
-        # Permitir formatos largos con fecha completa + folio + monto
-        if len(codigo_norm) >= 18 and re.search(r'\d{14}', codigo_norm):
-            return True
+    def on_tecla(self, event):
+        """Alimenta el lector con cada tecla; la validación se hace al terminar el escaneo"""
+        # Las pausas se miden con el instante en que se pulsó la tecla (event.time, en ms),
+        # no con el de ahora: si Tk estuvo ocupado, las teclas encoladas llegan juntas pero
+        # conservan sus pausas reales y no parecen una ráfaga del lector
+        instante = event.time / 1000
+        if event.keysym == "BackSpace":
+            self.lector.borrar()
+        elif event.keysym in ("Return", "KP_Enter", "Tab"):
+            self._despachar(self.lector.recibir("\n", instante))
+        elif event.char and event.char.isprintable():
+            self._ultima_tecla = (instante, time.monotonic())
+            self._despachar(self.lector.recibir(event.char, instante))
+            self._programar_timeout()
+        else:
+            # Flechas, Shift, etc.: comportamiento normal del campo
+            return None
+        self.codigo_var.set(self.lector.texto)
+        return "break"
 
-        return False
-    
-    def on_codigo_change(self, *args):
-        """Se ejecuta cuando cambia el contenido del campo de código"""
-        codigo = self.codigo_var.get()
+    def _programar_timeout(self):
+        """Revisa el fin del escaneo por pausa una vez que dejan de llegar teclas"""
+        if self._timeout_escaneo is not None:
+            self.root.after_cancel(self._timeout_escaneo)
+        espera_ms = int(self.lector.timeout * 1000) + 20
+        self._timeout_escaneo = self.root.after(espera_ms, self._verificar_timeout)
 
-        # Procesar solo cuando el código parece completo para evitar lecturas parciales
-        if not hasattr(self, '_procesando') and self._codigo_parece_completo(codigo):
-            self._procesando = True
-            if self.modo_cancelado:
-                self.root.after(50, self.procesar_codigo_cancelado_auto)
-            else:
-                self.root.after(50, self.procesar_codigo_automatico)
+    def _verificar_timeout(self):
+        self._timeout_escaneo = None
+        # Hora actual en el reloj de event.time: lo transcurrido desde que se atendió la última
+        # tecla (si se atendió tarde, la pausa se subestima y se vuelve a revisar)
+        tecla, atendida = self._ultima_tecla
+        codigo = self.lector.verificar_timeout(tecla + time.monotonic() - atendida)
+        if codigo:
+            self._despachar([codigo])
+            self.codigo_var.set(self.lector.texto)
+        elif codigo_completo(self.lector.texto):
+            self._programar_timeout()
 
-    def procesar_codigo_manual(self, event=None):
-        """Procesa cuando el escáner envía Enter al finalizar el código"""
-        codigo = self.codigo_var.get().strip()
-        if not codigo:
+    def _despachar(self, codigos):
+        """Procesa los escaneos terminados, en el orden en que llegaron"""
+        if not self._listo:
+            self._escaneos_pendientes.extend(codigos)
+            self.actualizar_estadisticas()
             return
-
-        if self.modo_cancelado:
-            self.procesar_ticket_cancelado_codigo(codigo)
-        else:
-            self.procesar_ticket(codigo)
-        self.codigo_var.set("")
-        self.entrada_codigo.focus_set()
-        if hasattr(self, '_procesando'):
-            delattr(self, '_procesando')
-    
-    def procesar_codigo_cancelado_auto(self):
-        """Procesa automáticamente en modo cancelado después de un delay"""
-        try:
-            codigo = self.codigo_var.get().strip()
-            if codigo:
+        for codigo in codigos:
+            if self.modo_cancelado:
                 self.procesar_ticket_cancelado_codigo(codigo)
-                self.codigo_var.set("")
-        finally:
-            if hasattr(self, '_procesando'):
-                delattr(self, '_procesando')
+            else:
+                self.procesar_ticket(codigo)
+        if codigos:
             self.entrada_codigo.focus_set()
-    
+
     def procesar_ticket_cancelado_codigo(self, codigo):
         """Procesa un código como cancelado"""
         try:
             exito, mensaje, _ = self.ticket_manager.agregar_ticket_cancelado(codigo)
             if exito:
-                PantallaConfirmacion(self.root, es_advertencia=True, mensaje=mensaje)
-                self.actualizar_estadisticas()
+                self.confirmacion.mostrar(mensaje, es_advertencia=True)
                 # Salir del modo cancelado después de procesar
                 self.modo_cancelado = False
             else:
-                messagebox.showerror("Error", mensaje)
+                self.confirmacion.mostrar(mensaje, es_error=True)
         except Exception as e:
-            messagebox.showerror("Error", f"Error procesando cancelado: {str(e)}")
-    
-    def procesar_codigo_automatico(self):
-        """Procesa el código automáticamente después de un breve delay"""
-        try:
-            codigo = self.codigo_var.get().strip()
-            if codigo:
-                self.procesar_ticket(codigo)
-                # Limpiar campo para próximo código
-                self.codigo_var.set("")
-        finally:
-            if hasattr(self, '_procesando'):
-                delattr(self, '_procesando')
-            
-            # Mantener focus en el campo de entrada
-            self.entrada_codigo.focus_set()
+            self.confirmacion.mostrar(f"Error procesando cancelado: {str(e)}", es_error=True)
     
     def procesar_ticket(self, codigo):
         """Procesa un ticket y muestra la confirmación correspondiente"""
@@ -337,21 +424,15 @@ class AplicacionTickets:
             
             if exito:
                 # Mostrar pantalla de confirmación
-                PantallaConfirmacion(
-                    self.root,
-                    es_advertencia=mostrar_amarillo,
-                    mensaje=mensaje
-                )
-                
-                # Actualizar estadísticas
-                self.actualizar_estadisticas()
+                self.confirmacion.mostrar(mensaje, es_advertencia=mostrar_amarillo)
                 
             else:
-                # Error al procesar
-                messagebox.showerror("Error", mensaje)
+                # Error al procesar: en la misma pantalla, sin diálogo modal (los
+                # escaneos siguientes no se apilan detrás de él)
+                self.confirmacion.mostrar(mensaje, es_error=True)
                 
         except Exception as e:
-            messagebox.showerror("Error", f"Error procesando ticket: {str(e)}")
+            self.confirmacion.mostrar(f"Error procesando ticket: {str(e)}", es_error=True)
 
     def procesar_ticket_cancelado(self):
         """Cambia a modo cancelado para escanear el ticket a cancelar"""
@@ -360,32 +441,58 @@ class AplicacionTickets:
         self.entrada_codigo.focus_set()
         messagebox.showinfo(
             "Modo Cancelado",
-            "Escanea o escribe el código a cancelar.\n(Se procesará automáticamente)"
+            "Escanea o escribe el código a cancelar.\n"
+            "Si el ticket ya fue registrado se cancela y deja de sumar.\n(Se procesará automáticamente)"
         )
         self.entrada_codigo.focus_set()
     
+    def on_evento_tickets(self, evento, datos):
+        """Agrupa los eventos de TicketManager en un solo repintado por intervalo"""
+        if self._repintado_pendiente is None:
+            self._repintado_pendiente = self.root.after(INTERVALO_REPINTADO_MS, self._repintar)
+
+    def _repintar(self):
+        self._repintado_pendiente = None
+        self.actualizar_estadisticas()
+
     def actualizar_estadisticas(self):
         """Actualiza las estadísticas mostradas en pantalla (solo datos confiables)"""
+        if not self._listo:
+            texto = "Cargando datos del turno..."
+            if self._escaneos_pendientes:
+                texto += f"\n{len(self._escaneos_pendientes)} escaneo(s) en espera"
+            self.label_stats.config(text=texto)
+            return
+
         stats = self.ticket_manager.obtener_estadisticas_turno()
 
         stats_text = (
             f"Tickets OK: {stats['total_ok']}\n"
             f"Cancelados: {stats['total_cancelados']}\n"
             f"Total escaneados: {stats['total_escaneados']}\n"
-            f"Monto acumulado: ${stats['monto_ok']:.2f}"
+            f"Monto acumulado: {formatear_monto(stats['centavos_ok'])}"
         )
 
-        if stats['monto_cancelado'] > 0:
-            stats_text += f"\nMonto cancelado (no suma): ${stats['monto_cancelado']:.2f}"
-        
+        if stats['centavos_cancelado'] > 0:
+            stats_text += f"\nMonto cancelado (no suma): {formatear_monto(stats['centavos_cancelado'])}"
+        error = self.ticket_manager.error_persistencia()
+        if error:
+            stats_text += f"\n⚠ No se pudo guardar, se reintenta: {error}"
+        
+        # Reconfigurar los labels sólo si el texto cambió
+        turno_text = f"Turno: {self.ticket_manager.turno_actual.upper()}"
+        if (stats_text, turno_text) == self._texto_stats:
+            return
+        self._texto_stats = (stats_text, turno_text)
         self.label_stats.config(text=stats_text)
         
         # Actualizar subtítulo con turno
-        self.subtitulo.config(text=f"Turno: {self.ticket_manager.turno_actual.upper()}")
+        self.subtitulo.config(text=turno_text)
     
     def mostrar_resumen(self):
         """Muestra el resumen completo de tickets con faltantes en rojo"""
-        tickets_detalle = self.ticket_manager.obtener_resumen_detallado()
+        if self._datos_cargando():
+            return
         
         # Crear ventana de resumen
         ventana_resumen = tk.Toplevel(self.root)
@@ -408,99 +515,61 @@ class AplicacionTickets:
         )
         titulo.pack(pady=10)
         
-        # Frame con scroll para la lista
-        frame_scroll = tk.Frame(ventana_resumen)
-        frame_scroll.pack(fill="both", expand=True, padx=20, pady=10)
-        
-        # Crear canvas y scrollbar
-        canvas = tk.Canvas(frame_scroll, bg="white")
-        scrollbar = tk.Scrollbar(frame_scroll, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas, bg="white")
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Encabezados
-        header_frame = tk.Frame(scrollable_frame, bg="#34495e")
-        header_frame.pack(fill="x", padx=5, pady=5)
-        
-        tk.Label(header_frame, text="Folio", font=("Arial", 10, "bold"), 
-                bg="#34495e", fg="white", width=10).pack(side="left", padx=5)
-        tk.Label(header_frame, text="Estado", font=("Arial", 10, "bold"), 
-                bg="#34495e", fg="white", width=12).pack(side="left", padx=5)
-        tk.Label(header_frame, text="Hora", font=("Arial", 10, "bold"), 
-                bg="#34495e", fg="white", width=12).pack(side="left", padx=5)
-        tk.Label(header_frame, text="Monto", font=("Arial", 10, "bold"), 
-                bg="#34495e", fg="white", width=12).pack(side="left", padx=5)
-        tk.Label(header_frame, text="Revisar Cámaras", font=("Arial", 10, "bold"), 
-                bg="#34495e", fg="white", width=20).pack(side="left", padx=5)
-        
+        # Tabla virtualizada: ttk.Treeview dibuja sólo las filas visibles y
+        # las filas se insertan por páginas a medida que se hace scroll
+        frame_tabla = tk.Frame(ventana_resumen)
+        frame_tabla.pack(fill="both", expand=True, padx=20, pady=10)
+
+        columnas = ("folio", "estado", "hora", "monto", "camaras")
+        tabla = ttk.Treeview(frame_tabla, columns=columnas, show="headings", selectmode="browse")
+        encabezados = (("Folio", 90), ("Estado", 120), ("Hora", 100), ("Monto", 100), ("Revisar Cámaras", 200))
+        for columna, (texto, ancho) in zip(columnas, encabezados):
+            tabla.heading(columna, text=texto)
+            tabla.column(columna, width=ancho, anchor="center")
+
+        # Colores por estado: faltante en ROJO, cancelado en GRIS, OK en blanco
+        tabla.tag_configure("FALTANTE", background="#ffcccc", foreground="#c0392b", font=("Arial", 10, "bold"))
+        tabla.tag_configure("CANCELADO", background="#eeeeee", foreground="#7f8c8d")
+        tabla.tag_configure("OK", background="white", foreground="#2c3e50")
+
+        scrollbar = ttk.Scrollbar(frame_tabla, orient="vertical", command=tabla.yview)
+
         # Contador de faltantes
-        total_faltantes = sum(1 for t in tickets_detalle if t['status'] == 'FALTANTE')
-        
-        # Mostrar tickets
-        if not tickets_detalle:
-            tk.Label(
-                scrollable_frame,
-                text="No hay tickets registrados aún",
-                font=("Arial", 12),
-                bg="white",
-                fg="#7f8c8d"
-            ).pack(pady=20)
-        else:
-            for ticket in tickets_detalle:
+        total_faltantes = self.ticket_manager.contar_faltantes()
+
+        # Rango de folios fijado al abrir; cada página se arma entera al pedirla
+        filas = self.ticket_manager.instantanea_resumen_detallado(pagina=FILAS_POR_PAGINA)
+
+        def cargar_pagina():
+            """Inserta la siguiente página de filas; devuelve False si ya no hay más"""
+            insertadas = 0
+            for ticket in filas:
                 if ticket['status'] == 'FALTANTE':
-                    # Ticket faltante en ROJO
-                    fila_frame = tk.Frame(scrollable_frame, bg="#ffcccc", bd=1, relief="solid")
-                    fila_frame.pack(fill="x", padx=5, pady=2)
-                    
-                    tk.Label(fila_frame, text=ticket['folio'], font=("Arial", 10, "bold"), 
-                            bg="#ffcccc", fg="#c0392b", width=10).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text="⚠️ FALTANTE", font=("Arial", 10, "bold"), 
-                            bg="#ffcccc", fg="#c0392b", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['hora'], font=("Arial", 10), 
-                            bg="#ffcccc", fg="#c0392b", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['monto'], font=("Arial", 10), 
-                            bg="#ffcccc", fg="#c0392b", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['horario_camaras'], font=("Arial", 10, "bold"), 
-                            bg="#ffcccc", fg="#c0392b", width=20).pack(side="left", padx=5)
+                    valores = (ticket['folio'], "⚠️ FALTANTE", ticket['hora'], ticket['monto'], ticket['horario_camaras'])
                 elif ticket['status'] == 'CANCELADO':
-                    # Ticket cancelado en GRIS
-                    fila_frame = tk.Frame(scrollable_frame, bg="#eeeeee", bd=1, relief="solid")
-                    fila_frame.pack(fill="x", padx=5, pady=2)
-                    
-                    tk.Label(fila_frame, text=ticket['folio'], font=("Arial", 10), 
-                            bg="#eeeeee", fg="#7f8c8d", width=10).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text="✖ CANCELADO", font=("Arial", 10, "bold"), 
-                            bg="#eeeeee", fg="#7f8c8d", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['hora'], font=("Arial", 10), 
-                            bg="#eeeeee", fg="#7f8c8d", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['monto'], font=("Arial", 10), 
-                            bg="#eeeeee", fg="#7f8c8d", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text="(no suma)", font=("Arial", 10, "italic"), 
-                            bg="#eeeeee", fg="#7f8c8d", width=20).pack(side="left", padx=5)
+                    valores = (ticket['folio'], "✖ CANCELADO", ticket['hora'], ticket['monto'], "(no suma)")
                 else:
-                    # Ticket OK en blanco
-                    fila_frame = tk.Frame(scrollable_frame, bg="white", bd=1, relief="flat")
-                    fila_frame.pack(fill="x", padx=5, pady=1)
-                    
-                    tk.Label(fila_frame, text=ticket['folio'], font=("Arial", 10), 
-                            bg="white", fg="#2c3e50", width=10).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text="✓ OK", font=("Arial", 10), 
-                            bg="white", fg="#27ae60", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['hora'], font=("Arial", 10), 
-                            bg="white", fg="#2c3e50", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text=ticket['monto'], font=("Arial", 10), 
-                            bg="white", fg="#2c3e50", width=12).pack(side="left", padx=5)
-                    tk.Label(fila_frame, text="", font=("Arial", 10), 
-                            bg="white", fg="#2c3e50", width=20).pack(side="left", padx=5)
-        
-        canvas.pack(side="left", fill="both", expand=True)
+                    valores = (ticket['folio'], "✓ OK", ticket['hora'], ticket['monto'], "")
+                tabla.insert("", "end", values=valores, tags=(ticket['status'],))
+                insertadas += 1
+                if insertadas >= FILAS_POR_PAGINA:
+                    return True
+            return False
+
+        hay_mas = [cargar_pagina()]
+
+        def on_scroll(inicio, fin):
+            scrollbar.set(inicio, fin)
+            # Al acercarse al final de lo cargado, traer la siguiente página
+            if hay_mas[0] and float(fin) > 0.9:
+                hay_mas[0] = cargar_pagina()
+
+        tabla.configure(yscrollcommand=on_scroll)
+
+        if not self.ticket_manager.tickets:
+            tabla.insert("", "end", values=("", "No hay tickets registrados aún", "", "", ""))
+
+        tabla.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
         # Resumen al final
@@ -529,7 +598,7 @@ class AplicacionTickets:
             resumen_frame,
             text=(
                 f"Cancelados en turno: {stats['total_cancelados']}  "
-                f"(monto cancelado: ${stats['monto_cancelado']:.2f})"
+                f"(monto cancelado: {formatear_monto(stats['centavos_cancelado'])})"
             ),
             font=("Arial", 11),
             bg="#ecf0f1",
@@ -557,6 +626,8 @@ class AplicacionTickets:
     
     def cierre_de_caja(self):
         """Realiza el cierre de caja con confirmación"""
+        if self._datos_cargando():
+            return
         # Confirmar cierre
         respuesta = messagebox.askyesno(
             "Confirmar Cierre",
@@ -572,10 +643,8 @@ class AplicacionTickets:
                 # Mostrar resultado
                 messagebox.showinfo("Cierre Completado", mensaje)
                 
-                # Actualizar interfaz
-                self.actualizar_estadisticas()
-                
                 # Limpiar campo de entrada
+                self.lector.descartar()
                 self.codigo_var.set("")
                 self.entrada_codigo.focus_set()
                 
@@ -593,26 +662,62 @@ class AplicacionTickets:
     def on_closing(self):
         """Maneja el cierre de la aplicación"""
         if messagebox.askokcancel("Salir", "¿Desea salir del sistema de tickets?"):
+            if self.ingesta is not None:
+                self.ingesta.detener()
+            if self.cola_impresion is not None:
+                self.cola_impresion.detener()
+            self.ticket_manager.cerrar()
             self.root.destroy()
     
     def imprimir_resumen(self):
-        """Imprime el resumen en la impresora térmica POS"""
+        """Encola el resumen para la impresora térmica POS; el estado llega por _sondear_impresion"""
+        if self._datos_cargando():
+            return
         try:
-            resumen_texto = self._generar_resumen_impresion()
-            exito = self._enviar_a_impresora(resumen_texto)
-            if exito:
-                messagebox.showinfo("Impresión", "Resumen enviado a la impresora.")
-            else:
-                messagebox.showerror("Error", "No se pudo enviar a la impresora. Verifica que esté disponible.")
+            if self.cola_impresion is None:
+                especificacion = os.environ.get('TICKETS_IMPRESORA')
+                if not especificacion:
+                    messagebox.showerror(
+                        "Impresión",
+                        "No hay impresora configurada. Defina TICKETS_IMPRESORA con la ruta del "
+                        "dispositivo (\\\\localhost\\POS58, /dev/usb/lp0), tcp:IP[:puerto] o archivo:RUTA.")
+                    return
+                self.cola_impresion = ColaImpresion(crear_transporte(especificacion))
+            trabajo = self.cola_impresion.enviar(self._generar_resumen_impresion())
+            self.label_impresion.config(text=f"Impresión #{trabajo.numero}: en cola", fg="#7f8c8d")
+            self._impresiones_en_curso += 1
+            if self._impresiones_en_curso == 1:
+                self.root.after(INTERVALO_IMPRESION_MS, self._sondear_impresion)
         except Exception as e:
             messagebox.showerror("Error", f"Error imprimiendo: {str(e)}")
+
+    def _sondear_impresion(self):
+        """Muestra los cambios de estado de la cola de impresión mientras haya trabajos en curso"""
+        for trabajo, estado in self.cola_impresion.obtener_actualizaciones():
+            texto = f"Impresión #{trabajo.numero}: {estado}"
+            color = "#7f8c8d"
+            if estado == TrabajoImpresion.REINTENTANDO:
+                texto += f" (intento {trabajo.intentos + 1} de {self.cola_impresion.reintentos})"
+                color = "#f39c12"
+            elif estado == TrabajoImpresion.IMPRESO:
+                color = "#27ae60"
+                self._impresiones_en_curso -= 1
+            elif estado == TrabajoImpresion.FALLIDO:
+                texto += f": {trabajo.error}"
+                color = "#e74c3c"
+                self._impresiones_en_curso -= 1
+                # Aviso no modal: un messagebox detendría el escaneo
+                self.confirmacion.mostrar(f"No se pudo imprimir el resumen #{trabajo.numero}\n{trabajo.error}",
+                                          es_advertencia=True)
+            self.label_impresion.config(text=texto, fg=color)
+        if self._impresiones_en_curso > 0:
+            self.root.after(INTERVALO_IMPRESION_MS, self._sondear_impresion)
     
     def _generar_resumen_impresion(self) -> str:
         """Genera el texto formateado para la impresora térmica (57mm)"""
         import datetime
         
         stats = self.ticket_manager.obtener_estadisticas_turno()
-        tickets_detalle = self.ticket_manager.obtener_resumen_detallado()
         
         # Ancho para impresora térmica 57mm (aprox 32 caracteres)
         ancho = 32
@@ -629,38 +734,38 @@ class AplicacionTickets:
             "",
             f"Total de tickets procesados:",
             f"{stats['total_ok']}",
-            f"Monto total: ${stats['monto_ok']:.2f}",
+            f"Monto total: {formatear_monto(stats['centavos_ok'])}",
             ""
         ]
         
         # Cancelados si hay
         if stats['total_cancelados'] > 0:
             lineas.append(f"\nTICKETS CANCELADOS: {stats['total_cancelados']}")
-            lineas.append(f"Monto cancelado (no suma): ${stats['monto_cancelado']:.2f}")
+            lineas.append(f"Monto cancelado (no suma): {formatear_monto(stats['centavos_cancelado'])}")
             lineas.append("")
         
-        # Tickets faltantes
-        total_faltantes = sum(1 for t in tickets_detalle if t['status'] == 'FALTANTE')
-        if total_faltantes > 0:
-            lineas.append(f"TICKETS FALTANTES: {total_faltantes}")
+        # Tickets faltantes (un bloque por intervalo de folios consecutivos)
+        faltantes = self.ticket_manager.tickets_faltantes_detectados
+        if faltantes:
+            lineas.append(f"TICKETS FALTANTES: {len(faltantes)}")
             lineas.append(linea_sep)
             
-            for ticket in tickets_detalle:
-                if ticket['status'] == 'FALTANTE':
-                    folio_str = f"Folio {ticket['folio']}"
-                    lineas.append(folio_str)
-                    lineas.append(f"Revisar camaras:")
-                    if ticket['horario_camaras']:
-                        # Partir el horario en dos líneas si es necesario
-                        horario = ticket['horario_camaras']
-                        if len(horario) > ancho:
-                            parts = horario.split(' - ')
-                            lineas.append(parts[0])
-                            if len(parts) > 1:
-                                lineas.append("a " + parts[1])
-                        else:
-                            lineas.append(horario)
-                    lineas.append("")
+            for inicio, fin, horario in self.ticket_manager.iterar_intervalos_faltantes():
+                if inicio == fin:
+                    lineas.append(f"Folio {self.ticket_manager.formatear_folio(inicio)}")
+                else:
+                    lineas.append(f"Folios {self.ticket_manager.formatear_folio(inicio)}"
+                                  f"-{self.ticket_manager.formatear_folio(fin)}")
+                lineas.append(f"Revisar camaras:")
+                # Partir el horario en dos líneas si es necesario
+                if len(horario) > ancho:
+                    parts = horario.split(' - ')
+                    lineas.append(parts[0])
+                    if len(parts) > 1:
+                        lineas.append("a " + parts[1])
+                else:
+                    lineas.append(horario)
+                lineas.append("")
         else:
             lineas.append("TICKETS FALTANTES: 0")
             lineas.append("Todos los tickets en orden")
@@ -673,41 +778,6 @@ class AplicacionTickets:
         lineas.append("")  # Salto final para el papel
         
         return "\n".join(lineas)
-    
-    def _enviar_a_impresora(self, texto: str) -> bool:
-        """Envía el texto a la impresora térmica POS predeterminada"""
-        try:
-            import subprocess
-            import os
-            
-            # Crear archivo temporal con el contenido
-            import tempfile
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as f:
-                f.write(texto)
-                temp_file = f.name
-            
-            try:
-                # Enviar a la impresora predeterminada en Windows
-                # Usar comando de impresión directa sin abrir diálogo
-                subprocess.run(
-                    ["notepad.exe", "/p", temp_file],
-                    check=True,
-                    capture_output=True,
-                    timeout=10
-                )
-                return True
-            finally:
-                # Limpiar archivo temporal
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
-                    
-        except subprocess.TimeoutExpired:
-            return False
-        except Exception as e:
-            print(f"Error en impresora: {e}")
-            return False
 
 def main():
     """Función principal"""
@@ -0,0 +1,208 @@
+import itertools
+import queue
+import textwrap
+import threading
+from typing import List, Optional, Tuple
+
+# Caracteres por línea de una térmica de 57mm con la fuente A
+ANCHO_57MM = 32
+# Puerto de impresión directa (RAW / JetDirect) de las impresoras de red
+PUERTO_RAW = 9100
+# Intentos por trabajo y espera inicial entre ellos (se duplica en cada reintento)
+REINTENTOS = 3
+ESPERA_REINTENTO = 2.0
+# Página de códigos PC850 (ñ, acentos); ESC t 2 la selecciona en la impresora
+CODIFICACION = "cp850"
+
+# Comandos ESC/POS
+ESC_INICIALIZAR = b"\x1b@"
+ESC_PAGINA_PC850 = b"\x1bt\x02"
+ESC_NEGRITA = b"\x1bE\x01"
+ESC_SIN_NEGRITA = b"\x1bE\x00"
+ESC_CENTRADO = b"\x1ba\x01"
+ESC_IZQUIERDA = b"\x1ba\x00"
+GS_CORTE_PARCIAL = b"\x1dVB\x00"  # avanza hasta la cuchilla y corta
+
+
+def _es_separador(linea: str) -> bool:
+    return len(linea) > 1 and linea.strip("=-") == ""
+
+
+def renderizar_escpos(texto: str, ancho: int = ANCHO_57MM, cortar: bool = True) -> bytes:
+    """
+    Convierte el texto del resumen en bytes ESC/POS. Las líneas entre los dos
+    primeros separadores (====) son el encabezado: centradas y en negrita.
+    Las líneas más largas que `ancho` se parten por palabras.
+    """
+    salida = bytearray(ESC_INICIALIZAR + ESC_PAGINA_PC850)
+    separadores = 0
+    for linea in texto.split("\n"):
+        if _es_separador(linea):
+            separadores += 1
+            salida += linea[:ancho].encode(CODIFICACION, errors="replace") + b"\n"
+            continue
+        encabezado = separadores == 1
+        if encabezado:
+            salida += ESC_CENTRADO + ESC_NEGRITA
+        for parte in textwrap.wrap(linea, ancho) or [""]:
+            salida += parte.encode(CODIFICACION, errors="replace") + b"\n"
+        if encabezado:
+            salida += ESC_SIN_NEGRITA + ESC_IZQUIERDA
+    if cortar:
+        salida += GS_CORTE_PARCIAL
+    return bytes(salida)
+
+
+class TransporteImpresora:
+    """Destino de los bytes ESC/POS. enviar() lanza OSError si la impresora no responde."""
+
+    def enviar(self, datos: bytes):
+        raise NotImplementedError
+
+
+class TransporteDispositivo(TransporteImpresora):
+    """
+    Dispositivo de impresión directa: /dev/usb/lp0, COM3 o una impresora
+    compartida de Windows (\\\\localhost\\POS58). Se abre en cada trabajo, así un
+    reintento funciona si la impresora se reconectó.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+
+    def enviar(self, datos):
+        with open(self.ruta, 'wb') as dispositivo:
+            dispositivo.write(datos)
+            dispositivo.flush()
+
+
+class TransporteTCP(TransporteImpresora):
+    """Impresora de red en el puerto RAW (9100)"""
+
+    def __init__(self, host: str, puerto: int = PUERTO_RAW, timeout: float = 5.0):
+        self.host = host
+        self.puerto = puerto
+        self.timeout = timeout
+
+    def enviar(self, datos):
+        # Import diferido: sin impresora de red no se carga socket
+        import socket
+
+        with socket.create_connection((self.host, self.puerto), timeout=self.timeout) as conexion:
+            conexion.sendall(datos)
+
+
+class TransporteArchivo(TransporteImpresora):
+    """Anexa los trabajos a un archivo (pruebas y equipos sin impresora)"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+
+    def enviar(self, datos):
+        with open(self.ruta, 'ab') as archivo:
+            archivo.write(datos)
+
+
+def crear_transporte(especificacion: str) -> TransporteImpresora:
+    """'tcp:HOST[:PUERTO]', 'archivo:RUTA' o la ruta del dispositivo (TICKETS_IMPRESORA)"""
+    if especificacion.startswith("tcp:"):
+        host, _, puerto = especificacion[4:].partition(":")
+        return TransporteTCP(host, int(puerto) if puerto else PUERTO_RAW)
+    if especificacion.startswith("archivo:"):
+        return TransporteArchivo(especificacion[8:])
+    return TransporteDispositivo(especificacion)
+
+
+class TrabajoImpresion:
+    """Un resumen en la cola; su estado lo cambia sólo el hilo de la cola"""
+
+    PENDIENTE = "pendiente"
+    IMPRIMIENDO = "imprimiendo"
+    REINTENTANDO = "reintentando"
+    IMPRESO = "impreso"
+    FALLIDO = "fallido"
+
+    def __init__(self, numero: int, datos: bytes):
+        self.numero = numero
+        self.datos = datos
+        self.estado = self.PENDIENTE
+        self.intentos = 0
+        self.error: Optional[str] = None
+        self.terminado = threading.Event()
+
+
+class ColaImpresion:
+    """
+    Hilo que envía los trabajos al transporte, de a uno y en orden, con
+    reintentos. enviar() retorna enseguida; los cambios de estado quedan en
+    una cola que la GUI vacía con after(), como la ingesta del escáner.
+    """
+
+    def __init__(self, transporte: TransporteImpresora, reintentos: int = REINTENTOS,
+                 espera: float = ESPERA_REINTENTO):
+        self.transporte = transporte
+        self.reintentos = reintentos
+        self.espera = espera
+        self.actualizaciones: "queue.SimpleQueue[Tuple[TrabajoImpresion, str]]" = queue.SimpleQueue()
+        self._trabajos: "queue.Queue[Optional[TrabajoImpresion]]" = queue.Queue()
+        self._numeros = itertools.count(1)
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+
+    def enviar(self, texto: str) -> TrabajoImpresion:
+        """Encola el texto ya convertido a ESC/POS y retorna sin esperar a la impresora"""
+        trabajo = TrabajoImpresion(next(self._numeros), renderizar_escpos(texto))
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._procesar, daemon=True)
+            self._hilo.start()
+        self._trabajos.put(trabajo)
+        return trabajo
+
+    def _procesar(self):
+        while True:
+            trabajo = self._trabajos.get()
+            if trabajo is None:
+                break
+            self._imprimir(trabajo)
+
+    def _imprimir(self, trabajo: TrabajoImpresion):
+        for intento in range(1, self.reintentos + 1):
+            trabajo.intentos = intento
+            self._notificar(trabajo, TrabajoImpresion.IMPRIMIENDO)
+            try:
+                self.transporte.enviar(trabajo.datos)
+            except OSError as e:
+                trabajo.error = str(e) or type(e).__name__
+                print(f"Error en impresora (intento {intento}): {trabajo.error}")
+                ultimo = intento == self.reintentos
+                if ultimo or self._detener.wait(self.espera * 2 ** (intento - 1)):
+                    break
+                self._notificar(trabajo, TrabajoImpresion.REINTENTANDO)
+            else:
+                trabajo.error = None
+                self._notificar(trabajo, TrabajoImpresion.IMPRESO)
+                trabajo.terminado.set()
+                return
+        self._notificar(trabajo, TrabajoImpresion.FALLIDO)
+        trabajo.terminado.set()
+
+    def _notificar(self, trabajo: TrabajoImpresion, estado: str):
+        trabajo.estado = estado
+        self.actualizaciones.put((trabajo, estado))
+
+    def obtener_actualizaciones(self) -> List[Tuple[TrabajoImpresion, str]]:
+        """(trabajo, estado) desde la última llamada, en orden (no bloquea)"""
+        cambios = []
+        while True:
+            try:
+                cambios.append(self.actualizaciones.get_nowait())
+            except queue.Empty:
+                return cambios
+
+    def detener(self, timeout: float = 5.0):
+        """Deja terminar lo encolado hasta `timeout` segundos y luego corta los reintentos"""
+        if self._hilo is None:
+            return
+        self._trabajos.put(None)
+        self._hilo.join(timeout)
+        self._detener.set()
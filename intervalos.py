@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, List, Tuple
+
+
+class ConjuntoIntervalos:
+    """
+    Conjunto de folios enteros guardado como intervalos cerrados [inicio, fin]
+    disjuntos y ordenados. Un salto de miles de folios ocupa un solo intervalo;
+    la pertenencia se resuelve con bisect en O(log n) intervalos.
+    """
+
+    __slots__ = ('_inicios', '_fines', '_total')
+
+    def __init__(self, folios: Iterable[int] = ()):
+        # Listas paralelas: _inicios[i].._fines[i] es el intervalo i
+        self._inicios: List[int] = []
+        self._fines: List[int] = []
+        self._total = 0
+        for folio in folios:
+            self.add(folio)
+
+    def __len__(self) -> int:
+        return self._total
+
+    def __bool__(self) -> bool:
+        return self._total > 0
+
+    def __contains__(self, folio: int) -> bool:
+        i = bisect_right(self._inicios, folio) - 1
+        return i >= 0 and folio <= self._fines[i]
+
+    def __iter__(self) -> Iterator[int]:
+        """Folios en orden ascendente"""
+        for inicio, fin in zip(self._inicios, self._fines):
+            yield from range(inicio, fin + 1)
+
+    def __repr__(self):
+        return f"ConjuntoIntervalos({self.intervalos()})"
+
+    def intervalos(self) -> List[Tuple[int, int]]:
+        return list(zip(self._inicios, self._fines))
+
+    def add(self, folio: int):
+        self.agregar_rango(folio, folio)
+
+    def agregar_rango(self, inicio: int, fin: int):
+        """Agrega [inicio, fin] fusionando los intervalos que se solapan o tocan"""
+        if inicio > fin:
+            return
+        # Intervalos que terminan en inicio-1 o después y empiezan en fin+1 o antes
+        desde = bisect_left(self._fines, inicio - 1)
+        hasta = bisect_right(self._inicios, fin + 1)
+        if desde < hasta:
+            inicio = min(inicio, self._inicios[desde])
+            fin = max(fin, self._fines[hasta - 1])
+            for i in range(desde, hasta):
+                self._total -= self._fines[i] - self._inicios[i] + 1
+        self._inicios[desde:hasta] = [inicio]
+        self._fines[desde:hasta] = [fin]
+        self._total += fin - inicio + 1
+
+    def discard(self, folio: int) -> bool:
+        """Quita un folio partiendo su intervalo si hace falta; retorna si estaba"""
+        i = bisect_right(self._inicios, folio) - 1
+        if i < 0 or folio > self._fines[i]:
+            return False
+        inicio, fin = self._inicios[i], self._fines[i]
+        inicios, fines = [], []
+        if inicio < folio:
+            inicios.append(inicio)
+            fines.append(folio - 1)
+        if folio < fin:
+            inicios.append(folio + 1)
+            fines.append(fin)
+        self._inicios[i:i + 1] = inicios
+        self._fines[i:i + 1] = fines
+        self._total -= 1
+        return True
+
+    def clear(self):
+        self._inicios.clear()
+        self._fines.clear()
+        self._total = 0
+
+    def a_lista(self) -> List[List[int]]:
+        """Formato compacto para JSON: [[inicio, fin], ...]"""
+        return [[inicio, fin] for inicio, fin in zip(self._inicios, self._fines)]
+
+    @classmethod
+    def desde_lista(cls, datos: Iterable) -> 'ConjuntoIntervalos':
+        """Acepta el formato compacto y el anterior (un folio por elemento, '007' o 7)"""
+        conjunto = cls()
+        for elemento in datos:
+            if isinstance(elemento, (list, tuple)):
+                conjunto.agregar_rango(int(elemento[0]), int(elemento[1]))
+            else:
+                conjunto.add(int(elemento))
+        return conjunto
@@ -0,0 +1,244 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+# Resultado del parseo, independiente de la clase Ticket
+# El monto va en centavos enteros para que las sumas sean exactas
+# fecha_inferida: el código sólo traía la hora y la fecha se tomó de `ahora`
+CodigoParseado = namedtuple('CodigoParseado', ['folio', 'fecha_hora', 'centavos', 'fecha_inferida'],
+                            defaults=(False,))
+
+# Patrones precompilados (antes se compilaban en cada llamada vía re.*)
+_RE_NO_NUMERICO = re.compile(r'[^0-9\.]')
+_RE_ESTANDAR = re.compile(r'(\d{14})-(\d{3})-(\d{4}\.\d{2})')
+_RE_FECHAS = [
+    re.compile(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})'),  # 2025-10-13T14:30:25
+    re.compile(r'(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})'),   # 13/10/2025 14:30:25
+    re.compile(r'(\d{14})'),                                # 20251013143025 (sin separadores)
+    re.compile(r'(\d{12})'),                                # 202510131430 (sin segundos)
+]
+_RE_FOLIO_GUION_BAJO = re.compile(r'_(\d{3,5})(?:_|$)')
+_RE_FOLIO = re.compile(r'(\b\d{3,5}\b)')
+_RE_MONTO = re.compile(r'(\d+\.\d{2})')
+_RE_NUMEROS = re.compile(r'\d+')
+
+# Cada cuántos parseos se reordenan las estrategias por aciertos
+REORDENAR_CADA = 256
+# Desfase admitido entre el reloj de la impresora de tickets y el del equipo
+TOLERANCIA_RELOJ = timedelta(minutes=15)
+
+
+def normalizar_codigo(codigo: str) -> str:
+    """Deja sólo dígitos ASCII y el punto decimal"""
+    # Camino rápido: el separador habitual es el guion
+    sin_guiones = codigo.replace('-', '')
+    if sin_guiones.isascii() and sin_guiones.replace('.', '').isdigit():
+        return sin_guiones
+    return _RE_NO_NUMERICO.sub('', codigo)
+
+
+def centavos_de_texto(monto_str: str) -> int:
+    """'0125.50' -> 12550, sin pasar por float"""
+    enteros, _, decimales = monto_str.partition('.')
+    return int(enteros) * 100 + int(decimales or 0)
+
+
+def _hora_sobre_fecha(hora_str: str, ahora: Optional[datetime]) -> datetime:
+    hoy = ahora or datetime.now()
+    return hoy.replace(
+        hour=int(hora_str[:2]),
+        minute=int(hora_str[2:4]),
+        second=int(hora_str[4:6]),
+        microsecond=0
+    )
+
+
+def resolver_fecha(fecha_hora: datetime, referencia: datetime,
+                   desde: Optional[datetime] = None) -> datetime:
+    """
+    Coloca la hora de un código compacto en el día anterior, el mismo o el
+    siguiente al de `referencia`. Sin `desde`, en el que la deja más cerca de
+    la referencia: un ticket de las 00:05 tras uno de las 23:58 cae en el día
+    siguiente. Con `desde` (apertura del turno; la referencia es la hora
+    actual), en el primero que no sea anterior a la apertura ni posterior a
+    la referencia, con TOLERANCIA_RELOJ de margen en ambos extremos.
+    """
+    candidata = datetime.combine(referencia.date(), fecha_hora.time())
+    candidatas = [candidata + timedelta(days=dias) for dias in (-1, 0, 1)]
+    if desde is not None:
+        validas = [c for c in candidatas
+                   if desde - TOLERANCIA_RELOJ <= c <= referencia + TOLERANCIA_RELOJ]
+        if validas:
+            return validas[0]
+    return min(candidatas, key=lambda c: abs(c - referencia))
+
+
+class EstrategiaFormato:
+    """Interfaz de un formato de código; devuelve None si el código no le corresponde"""
+
+    nombre = "base"
+
+    def __init__(self):
+        self.aciertos = 0
+
+    def intentar(self, codigo: str, codigo_norm: str,
+                 ahora: Optional[datetime]) -> Optional[CodigoParseado]:
+        raise NotImplementedError
+
+
+class FormatoCompacto(EstrategiaFormato):
+    """HHMMSS-FFF-MMMM.CC (folio de 3 a 5 dígitos, con o sin punto) sin regex"""
+
+    nombre = "compacto"
+
+    def intentar(self, codigo, codigo_norm, ahora):
+        n = len(codigo_norm)
+        if n >= 3 and codigo_norm[-3] == '.':
+            # HHMMSS FFF/FFFF/FFFFF MMMM . CC
+            if not 16 <= n <= 18:
+                return None
+            digitos = codigo_norm[:-3] + codigo_norm[-2:]
+        else:
+            # HHMMSS FFF/FFFF/FFFFF MMMM CC
+            if not 15 <= n <= 17:
+                return None
+            digitos = codigo_norm
+        # codigo_norm sólo contiene dígitos ASCII y puntos
+        if not digitos.isdigit():
+            return None
+
+        fecha = _hora_sobre_fecha(digitos[:6], ahora)
+        # normalizar folio removiendo ceros a la izquierda
+        folio = str(int(digitos[6:-6]))
+        centavos = int(digitos[-6:-2]) * 100 + int(digitos[-2:])
+        return CodigoParseado(folio, fecha, centavos, True)
+
+
+class FormatoEstandar(EstrategiaFormato):
+    """YYYYMMDDHHMMSS-FFF-MMMM.CC"""
+
+    nombre = "estandar"
+
+    def intentar(self, codigo, codigo_norm, ahora):
+        # Necesita al menos 14 + 3 + 6 dígitos (\d también acepta dígitos Unicode)
+        if len(codigo_norm) < 23 and codigo.isascii():
+            return None
+        match = _RE_ESTANDAR.search(codigo)
+        if not match:
+            return None
+        fecha_str, folio_str, monto_str = match.groups()
+        fecha = datetime.strptime(fecha_str, '%Y%m%d%H%M%S')
+        return CodigoParseado(folio_str, fecha, centavos_de_texto(monto_str))
+
+
+def parsear_generico(codigo: str, ahora: Optional[datetime] = None,
+                     estricto: bool = False) -> Optional[CodigoParseado]:
+    """
+    Formatos alternativos para compatibilidad (ISO, fecha en español,
+    14/12 dígitos). Siempre devuelve un resultado, con valores por defecto;
+    con estricto=True devuelve None si falta la fecha, el folio o el monto.
+    """
+    fecha_encontrada = None
+    folio_encontrado = None
+    monto_encontrado = None
+
+    # Buscar fecha/hora
+    for patron in _RE_FECHAS:
+        match = patron.search(codigo)
+        if match:
+            fecha_str = match.group(1)
+            try:
+                if 'T' in fecha_str:
+                    fecha_encontrada = datetime.strptime(fecha_str, '%Y-%m-%dT%H:%M:%S')
+                elif '/' in fecha_str:
+                    fecha_encontrada = datetime.strptime(fecha_str, '%d/%m/%Y %H:%M:%S')
+                elif len(fecha_str) == 14:  # YYYYMMDDHHMMSS
+                    fecha_encontrada = datetime.strptime(fecha_str, '%Y%m%d%H%M%S')
+                elif len(fecha_str) == 12:  # YYYYMMDDHHMM (sin segundos)
+                    fecha_encontrada = datetime.strptime(fecha_str, '%Y%m%d%H%M')
+                break
+            except ValueError:
+                continue
+
+    # Buscar folio: patrón _XXX_ o _XXXX_ o _XXXXX_ al final
+    match_folio = _RE_FOLIO_GUION_BAJO.search(codigo)
+    if match_folio:
+        folio_encontrado = str(int(match_folio.group(1)))
+    else:
+        # Buscar cualquier secuencia de 3 dígitos como respaldo
+        folios = _RE_FOLIO.findall(codigo)
+        if folios:
+            folio_encontrado = str(int(folios[0]))
+
+    # Buscar monto
+    montos = _RE_MONTO.findall(codigo)
+    if montos:
+        monto_encontrado = centavos_de_texto(montos[0])
+
+    if estricto and not (fecha_encontrada and folio_encontrado and monto_encontrado is not None):
+        return None
+
+    # Si no se encuentran todos los componentes, usar valores por defecto
+    if not fecha_encontrada:
+        fecha_encontrada = ahora or datetime.now()
+
+    if not folio_encontrado:
+        # Generar folio basado en timestamp si no se encuentra
+        folio_encontrado = str(int(datetime.now().timestamp()) % 10000)
+
+    if monto_encontrado is None:
+        # Evitar interpretar cadenas numéricas largas como monto
+        numeros = [n for n in _RE_NUMEROS.findall(codigo) if 1 <= len(n) <= 6]
+        if numeros:
+            monto_encontrado = int(numeros[-1]) * 100
+        else:
+            monto_encontrado = 0
+
+    return CodigoParseado(folio_encontrado, fecha_encontrada, monto_encontrado)
+
+
+class ParserCodigos:
+    """
+    Parser de códigos de barras con estrategias intercambiables.
+    Las estrategias se prueban en orden de aciertos observados; el parseo
+    genérico queda siempre al final como respaldo.
+    Las estrategias registradas deben aceptar conjuntos de códigos disjuntos,
+    así el orden sólo afecta la velocidad y no el resultado.
+    """
+
+    def __init__(self, estrategias: Optional[List[EstrategiaFormato]] = None):
+        self.estrategias = estrategias if estrategias is not None else [
+            FormatoCompacto(),
+            FormatoEstandar(),
+        ]
+        self._parseos = 0
+
+    def registrar_estrategia(self, estrategia: EstrategiaFormato):
+        self.estrategias.append(estrategia)
+
+    def parsear(self, codigo: str, ahora: Optional[datetime] = None,
+                estricto: bool = False) -> Optional[CodigoParseado]:
+        """
+        Parsea un código ya sin espacios alrededor. Devuelve None si es claramente
+        incompleto; los errores de fecha/hora inválida se propagan al llamador.
+        estricto=True no inventa folio, fecha ni monto en el respaldo genérico
+        (para auditar archivos con líneas basura).
+        """
+        codigo_norm = normalizar_codigo(codigo)
+
+        # Evitar parsear cadenas claramente incompletas
+        if len(codigo_norm) < 12:
+            return None
+
+        self._parseos += 1
+        if self._parseos % REORDENAR_CADA == 0:
+            self.estrategias.sort(key=lambda e: e.aciertos, reverse=True)
+
+        for estrategia in self.estrategias:
+            resultado = estrategia.intentar(codigo, codigo_norm, ahora)
+            if resultado is not None:
+                estrategia.aciertos += 1
+                return resultado
+
+        return parsear_generico(codigo, ahora, estricto)
@@ -0,0 +1,931 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from registro_binario import CODIGO_ESTADO, ESTADOS, REGISTRO, TAMANO_REGISTRO, a_segundos, desde_segundos
+
+# Cada cuántos registros (o segundos) se fuerza fsync del journal
+FSYNC_CADA_REGISTROS = 10
+FSYNC_CADA_SEGUNDOS = 2.0
+# Registros acumulados en el journal antes de compactar con un snapshot nuevo
+COMPACTAR_CADA_REGISTROS = 500
+# Capacidad de la cola del hilo escritor; si se llena, registrar() espera (no se pierden datos)
+TAMANO_COLA_ESCRITURA = 10000
+
+# Comandos internos de la cola del hilo escritor
+_REGISTRO = "registro"
+_ROTAR = "rotar"
+_REINTENTAR = "reintentar"
+_DETENER = "detener"
+
+
+class _EscritorEnSegundoPlano:
+    """
+    Hilo escritor de los backends de archivos: registrar() sólo encola y el
+    hilo agrupa todo lo pendiente en una sola escritura. Cada backend define
+    _anexar() y _fsync(); los comandos de control (_ROTAR, _DETENER) se
+    aplican en orden, tras los registros encolados antes.
+
+    Si una escritura falla, el lote se deshace en el archivo y queda en
+    espera: se reintenta en la siguiente escritura o cuando el hilo está
+    inactivo. Mientras tanto error_escritura describe el problema (la GUI lo
+    muestra) y vaciar() lanza OSError.
+    """
+
+    fsync_cada: int
+    fsync_segundos: float
+    _lock: threading.Lock
+    _pendientes_fsync: int
+    _ultimo_fsync: float
+
+    def _iniciar_escritor(self):
+        self._cola: "queue.Queue" = queue.Queue(maxsize=TAMANO_COLA_ESCRITURA)
+        self._hilo_escritor: Optional[threading.Thread] = None
+        # Eventos de escrituras fallidas, en orden, a la espera de un reintento
+        self._sin_escribir: List[Dict] = []
+        self.error_escritura: Optional[str] = None
+        atexit.register(self._cerrar_al_salir)
+
+    def _anexar(self, registros: List[Dict]):
+        """Agrega los eventos al archivo (con el lock tomado); si falla, no deja nada a medias y lanza"""
+        raise NotImplementedError
+
+    def _fsync(self):
+        raise NotImplementedError
+
+    def _encolar(self, comando):
+        if self._hilo_escritor is None or not self._hilo_escritor.is_alive():
+            self._hilo_escritor = threading.Thread(target=self._escribir_en_segundo_plano, daemon=True)
+            self._hilo_escritor.start()
+        self._cola.put(comando)
+
+    def _escribir_en_segundo_plano(self):
+        """Hilo escritor: agrupa los registros pendientes en una sola escritura"""
+        while True:
+            try:
+                comando = self._cola.get(timeout=self.fsync_segundos)
+            except queue.Empty:
+                # Inactivo: reintentar lo que haya fallado y sincronizar lo que quedó sin fsync
+                self._escribir_registros([], sincronizar=True)
+                continue
+
+            comandos = [comando]
+            while True:
+                try:
+                    comandos.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            detener = False
+            try:
+                registros = []
+                for tipo, dato in comandos:
+                    if tipo == _REGISTRO:
+                        registros.append(dato)
+                        continue
+                    # Los comandos de control se aplican en orden, tras los registros previos
+                    self._escribir_registros(registros)
+                    registros = []
+                    if tipo == _ROTAR:
+                        self._compactar(*dato)
+                    elif tipo == _DETENER:
+                        detener = True
+                self._escribir_registros(registros)
+            except Exception as e:
+                print(f"Error en el hilo escritor: {e}")
+            finally:
+                # Siempre: si no, vaciar() quedaría esperando para siempre en join()
+                for _ in comandos:
+                    self._cola.task_done()
+            if detener:
+                return
+
+    def _escribir_registros(self, registros: List[Dict], sincronizar: bool = False):
+        """Escribe primero lo que quedó de escrituras fallidas y después `registros`"""
+        lote = self._sin_escribir + registros
+        if lote:
+            try:
+                with self._lock:
+                    self._anexar(lote)
+                    self._pendientes_fsync += len(lote)
+            except Exception as e:
+                self._sin_escribir = lote
+                self.error_escritura = f"{e or type(e).__name__} ({len(lote)} evento(s) sin guardar)"
+                print(f"Error escribiendo {self.data_file}: {self.error_escritura}")
+                return
+            self._sin_escribir = []
+            self.error_escritura = None
+        if self._pendientes_fsync and (sincronizar or self._pendientes_fsync >= self.fsync_cada
+                                       or time.monotonic() - self._ultimo_fsync >= self.fsync_segundos):
+            try:
+                with self._lock:
+                    self._fsync()
+            except Exception as e:
+                self.error_escritura = f"{e or type(e).__name__} (sin sincronizar a disco)"
+                print(f"Error sincronizando {self.data_file}: {self.error_escritura}")
+
+    def vaciar(self):
+        """
+        Espera a que el hilo escritor haya escrito y sincronizado todo lo
+        encolado; lanza OSError si quedan eventos que no se pudieron escribir
+        """
+        if self._hilo_escritor is not None and self._hilo_escritor.is_alive():
+            self._cola.put((_REINTENTAR, None))
+            self._cola.join()
+        with self._lock:
+            self._fsync()
+        if self._sin_escribir:
+            raise OSError(f"No se pudo escribir en {self.data_file}: {self.error_escritura}")
+
+    def _detener_escritor(self):
+        if self._hilo_escritor is not None and self._hilo_escritor.is_alive():
+            self._cola.put((_DETENER, None))
+            self._hilo_escritor.join()
+        self._hilo_escritor = None
+
+    def cerrar(self):
+        raise NotImplementedError
+
+    def _cerrar_al_salir(self):
+        try:
+            self.cerrar()
+        except Exception as e:
+            print(f"Error cerrando {self.data_file}: {e}")
+
+
+class _CierresEnArchivos:
+    """
+    Cierre de caja en dos pasos para los backends de archivos. cerrar_turno()
+    renombra los archivos del turno que cierra a <base>.cierre<n>.* (O(1)) y los
+    describe en el marcador <base>.cierre<n>.json; confirmar_cierre() los borra
+    cuando el reporte y el histórico ya están en disco. Si un corte interrumpe
+    el cierre, cargar() termina de apartar el turno y cierres_pendientes()
+    lo devuelve para volver a generar lo que falte.
+    """
+
+    _base: str
+
+    def _archivos_turno(self) -> List[Tuple[str, str]]:
+        """(archivo del turno en curso, sufijo que toma al apartarse)"""
+        raise NotImplementedError
+
+    def _escribir_turno_nuevo(self, estado: Dict):
+        raise NotImplementedError
+
+    def _cierre_del_turno_vivo(self) -> Optional[int]:
+        """Número del cierre que dejó abierto el turno en curso (None si no consta)"""
+        raise NotImplementedError
+
+    def _leer_apartado(self, prefijo: str) -> Tuple[Optional[Dict], List[Dict]]:
+        """(datos, registros) del turno apartado, en el formato de cargar()"""
+        raise NotImplementedError
+
+    def _prefijo_cierre(self, numero) -> str:
+        return f"{self._base}.cierre{numero}"
+
+    def _numeros_cierre(self) -> List[int]:
+        directorio = os.path.dirname(self._base) or "."
+        prefijo = os.path.basename(self._base) + ".cierre"
+        numeros = set()
+        if os.path.isdir(directorio):
+            for nombre in os.listdir(directorio):
+                if nombre.startswith(prefijo):
+                    numero = nombre[len(prefijo):].split(".", 1)[0]
+                    if numero.isdigit():
+                        numeros.add(int(numero))
+        return sorted(numeros)
+
+    def _leer_marcador(self, numero) -> Optional[Dict]:
+        try:
+            with open(self._prefijo_cierre(numero) + ".json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _escribir_marcador(self, numero, marcador: Dict):
+        escribir_atomico(self._prefijo_cierre(numero) + ".json", json.dumps(marcador, ensure_ascii=False))
+
+    def _cerrar_en_archivos(self, estado: Dict, cierre: Dict) -> str:
+        numeros = self._numeros_cierre()
+        numero = numeros[-1] + 1 if numeros else 1
+        marcador = dict(cierre, estado=estado, apartado=False)
+        # El marcador va primero: si el corte llega a mitad de los renombres, cargar() los termina
+        self._escribir_marcador(numero, marcador)
+        self._apartar_turno(numero, marcador)
+        return str(numero)
+
+    def _apartar_turno(self, numero: int, marcador: Dict):
+        prefijo = self._prefijo_cierre(numero)
+        for vivo, sufijo in self._archivos_turno():
+            if os.path.exists(vivo):
+                os.replace(vivo, prefijo + sufijo)
+        self._escribir_turno_nuevo(dict(marcador['estado'], cierre=numero))
+        self._escribir_marcador(numero, dict(marcador, apartado=True))
+
+    def _completar_cierres(self):
+        """Termina de apartar los turnos de un cierre interrumpido (se llama al cargar)"""
+        for numero in self._numeros_cierre():
+            marcador = self._leer_marcador(numero)
+            if marcador is None:
+                # Restos de un confirmar_cierre interrumpido (el marcador se borra al final)
+                self.confirmar_cierre(str(numero))
+            elif not marcador.get('apartado'):
+                if self._cierre_del_turno_vivo() == numero:
+                    self._escribir_marcador(numero, dict(marcador, apartado=True))
+                else:
+                    self._apartar_turno(numero, marcador)
+
+    def cierres_pendientes(self) -> List[Tuple[str, Dict, Optional[Dict], List[Dict]]]:
+        """(cierre, {turno, abierto, cerrado, reporte}, datos, registros) de los cierres sin confirmar"""
+        pendientes = []
+        for numero in self._numeros_cierre():
+            marcador = self._leer_marcador(numero)
+            if marcador is None:
+                continue
+            datos, registros = self._leer_apartado(self._prefijo_cierre(numero))
+            info = {clave: marcador.get(clave) for clave in ('turno', 'abierto', 'cerrado', 'reporte')}
+            pendientes.append((str(numero), info, datos, registros))
+        return pendientes
+
+    def confirmar_cierre(self, cierre: str):
+        """El reporte y el histórico del cierre ya están en disco: borrar el turno apartado"""
+        prefijo = self._prefijo_cierre(cierre)
+        for _, sufijo in self._archivos_turno():
+            if os.path.exists(prefijo + sufijo):
+                os.remove(prefijo + sufijo)
+        if os.path.exists(prefijo + ".json"):
+            os.remove(prefijo + ".json")
+
+
+class PersistenciaJournal(_EscritorEnSegundoPlano, _CierresEnArchivos):
+    """
+    Persistencia en dos niveles: un snapshot JSON completo (tickets_data.json)
+    y un journal de solo-anexado (tickets_data.journal) con un registro compacto
+    por evento. Cada evento lleva un número de secuencia 's'; al cargar se toma
+    el snapshot y se reproducen los registros con secuencia mayor a la suya.
+
+    Las escrituras las hace un hilo en segundo plano: registrar() sólo encola,
+    y el hilo agrupa todo lo pendiente en una sola escritura al archivo.
+    """
+
+    def __init__(self, data_file: str,
+                 fsync_cada: int = FSYNC_CADA_REGISTROS,
+                 fsync_segundos: float = FSYNC_CADA_SEGUNDOS,
+                 compactar_cada: int = COMPACTAR_CADA_REGISTROS):
+        self.data_file = data_file
+        base = os.path.splitext(data_file)[0]
+        self._base = base
+        self.journal_file = base + ".journal"
+        # Journal rotado durante una compactación en curso
+        self.journal_rotado = self.journal_file + ".1"
+        self.fsync_cada = fsync_cada
+        self.fsync_segundos = fsync_segundos
+        self.compactar_cada = compactar_cada
+
+        # _lock protege el archivo del journal; _lock_seq la numeración de eventos
+        self._lock = threading.Lock()
+        self._lock_seq = threading.Lock()
+        self._fh = None
+        self._seq = 0
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        self._registros_sin_compactar = 0
+        self._compactando = False
+
+        self._iniciar_escritor()
+
+    # --- Carga ---
+    def cargar(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """Devuelve (snapshot, registros del journal posteriores al snapshot)"""
+        self._completar_cierres()
+        snapshot, registros = self._leer_snapshot_y_journal(
+            self.data_file, (self.journal_rotado, self.journal_file))
+        seq_snapshot = snapshot.get('seq', 0) if snapshot else 0
+        self._seq = max([seq_snapshot] + [registro['s'] for registro in registros])
+        self._registros_sin_compactar = len(registros)
+        return snapshot, registros
+
+    def _leer_snapshot_y_journal(self, ruta_snapshot: str, journals) -> Tuple[Optional[Dict], List[Dict]]:
+        snapshot = None
+        if os.path.exists(ruta_snapshot):
+            with open(ruta_snapshot, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        seq_snapshot = snapshot.get('seq', 0) if snapshot else 0
+        registros = [registro for ruta in journals for registro in self._leer_journal(ruta)
+                     if registro.get('s', 0) > seq_snapshot]
+        return snapshot, registros
+
+    def _leer_journal(self, ruta: str) -> List[Dict]:
+        if not os.path.exists(ruta):
+            return []
+        registros = []
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea:
+                    continue
+                try:
+                    registros.append(json.loads(linea))
+                except ValueError:
+                    # Última línea incompleta por un corte de energía: se descarta
+                    break
+        return registros
+
+    # --- Escritura ---
+    def registrar(self, registro: Dict):
+        """Encola un evento para el journal; no toca el disco en el hilo que llama"""
+        self.registrar_lote([registro])
+
+    def registrar_lote(self, registros: List[Dict]):
+        """Encola varios eventos con secuencia consecutiva; el hilo los escribe juntos"""
+        with self._lock_seq:
+            for registro in registros:
+                self._seq += 1
+                self._registros_sin_compactar += 1
+                self._encolar((_REGISTRO, {'s': self._seq, **registro}))
+
+    def _anexar(self, registros: List[Dict]):
+        lineas = [json.dumps(registro, separators=(',', ':'), ensure_ascii=False) for registro in registros]
+        fh = self._abrir_journal()
+        largo = os.fstat(fh.fileno()).st_size
+        try:
+            fh.write("\n".join(lineas) + "\n")
+            fh.flush()
+        except Exception:
+            # Sin líneas a medias: la carga se detiene en la primera línea rota
+            self._fh = None
+            try:
+                fh.close()
+            except OSError:
+                pass
+            try:
+                os.truncate(self.journal_file, largo)
+            except OSError:
+                pass
+            raise
+
+    def _abrir_journal(self):
+        if self._fh is None:
+            self._fh = open(self.journal_file, 'a', encoding='utf-8')
+        return self._fh
+
+    def _fsync(self):
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def _cerrar_journal(self):
+        if self._fh is not None:
+            self._fsync()
+            self._fh.close()
+            self._fh = None
+
+    # --- Snapshots y compactación ---
+    def necesita_compactar(self) -> bool:
+        return self._registros_sin_compactar >= self.compactar_cada and not self._compactando
+
+    def compactar_en_segundo_plano(self, estado: Union[Dict, Callable[[], Dict]]):
+        """
+        Encola la rotación del journal y la escritura de un snapshot nuevo.
+        `estado` debe reflejar todos los eventos registrados hasta ahora; puede
+        ser una función que lo arma, y entonces se llama en el hilo escritor.
+        """
+        with self._lock_seq:
+            self._registros_sin_compactar = 0
+            self._compactando = True
+            self._encolar((_ROTAR, (estado, self._seq)))
+
+    def _compactar(self, estado: Union[Dict, Callable[[], Dict]], seq: int):
+        """Se ejecuta en el hilo escritor, después de escribir los registros previos"""
+        try:
+            with self._lock:
+                self._cerrar_journal()
+                if os.path.exists(self.journal_file):
+                    if os.path.exists(self.journal_rotado):
+                        # Quedó de una compactación interrumpida: unir ambos
+                        with open(self.journal_rotado, 'a', encoding='utf-8') as destino, \
+                                open(self.journal_file, 'r', encoding='utf-8') as origen:
+                            destino.write(origen.read())
+                        os.remove(self.journal_file)
+                    else:
+                        os.replace(self.journal_file, self.journal_rotado)
+            # Los registros nuevos ya van al journal nuevo mientras se escribe el snapshot
+            self._escribir_snapshot(dict(estado() if callable(estado) else estado, seq=seq))
+            if os.path.exists(self.journal_rotado):
+                os.remove(self.journal_rotado)
+        except Exception as e:
+            print(f"Error compactando journal: {e}")
+        finally:
+            self._compactando = False
+
+    def guardar_snapshot(self, estado: Dict):
+        """Escribe un snapshot completo de forma síncrona y vacía el journal"""
+        self.vaciar()
+        with self._lock:
+            self._cerrar_journal()
+            self._escribir_snapshot(dict(estado, seq=self._seq))
+            for ruta in (self.journal_rotado, self.journal_file):
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            self._registros_sin_compactar = 0
+
+    def cerrar_turno(self, estado: Dict, cierre: Dict) -> str:
+        """
+        Cierre de caja: aparta el snapshot y el journal del turno que cierra
+        (ver _CierresEnArchivos) y escribe el snapshot del turno nuevo (vacío).
+        `cierre` describe el turno cerrado: turno, abierto, cerrado y reporte.
+        """
+        self.vaciar()
+        with self._lock:
+            self._cerrar_journal()
+            numero = self._cerrar_en_archivos(dict(estado, seq=self._seq), cierre)
+            self._registros_sin_compactar = 0
+        return numero
+
+    def _archivos_turno(self):
+        return [(self.journal_rotado, ".journal.1"), (self.journal_file, ".journal"),
+                (self.data_file, ".snapshot.json")]
+
+    def _escribir_turno_nuevo(self, estado: Dict):
+        self._escribir_snapshot(estado)
+
+    def _cierre_del_turno_vivo(self):
+        try:
+            with open(self.data_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('cierre')
+        except (OSError, ValueError):
+            return None
+
+    def _leer_apartado(self, prefijo):
+        return self._leer_snapshot_y_journal(prefijo + ".snapshot.json",
+                                             (prefijo + ".journal.1", prefijo + ".journal"))
+
+    def _escribir_snapshot(self, estado: Dict):
+        escribir_atomico(self.data_file, json.dumps(estado, indent=2, ensure_ascii=False))
+
+    def cerrar(self):
+        """Escribe todo lo pendiente, detiene el hilo escritor y cierra el journal"""
+        self._detener_escritor()
+        with self._lock:
+            self._cerrar_journal()
+        if self._sin_escribir:
+            raise OSError(f"{len(self._sin_escribir)} evento(s) no se pudieron escribir en {self.journal_file}")
+
+
+class PersistenciaSQLite:
+    """
+    Persistencia en SQLite (modo WAL): cada ticket es una fila de `tickets`
+    asociada a un turno de `turnos`. Los turnos cerrados no se borran, así
+    que el historial se puede consultar sin leer los reportes de texto.
+    Expone la misma interfaz que PersistenciaJournal.
+    """
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS turnos (
+            id INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            abierto TEXT NOT NULL,
+            cerrado TEXT
+        );
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY,
+            turno_id INTEGER NOT NULL REFERENCES turnos(id),
+            folio INTEGER NOT NULL,
+            fecha_hora TEXT NOT NULL,
+            centavos INTEGER NOT NULL,
+            estado TEXT NOT NULL,
+            codigo TEXT NOT NULL,
+            UNIQUE (turno_id, folio)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tickets_folio ON tickets(folio);
+        CREATE INDEX IF NOT EXISTS idx_tickets_fecha_hora ON tickets(fecha_hora);
+        CREATE INDEX IF NOT EXISTS idx_tickets_estado ON tickets(turno_id, estado);
+        CREATE INDEX IF NOT EXISTS idx_turnos_abierto ON turnos(abierto);
+        CREATE TABLE IF NOT EXISTS cierres_pendientes (
+            turno_id INTEGER PRIMARY KEY REFERENCES turnos(id),
+            datos TEXT NOT NULL
+        );
+    """
+
+    # Sentencias fijas: sqlite3 las prepara una vez y las reutiliza desde su caché
+    SQL_ALTA = ("INSERT INTO tickets (turno_id, folio, fecha_hora, centavos, estado, codigo) "
+                "VALUES (?, ?, ?, ?, ?, ?)")
+    SQL_ESTADO = "UPDATE tickets SET estado = ? WHERE turno_id = ? AND folio = ?"
+    SQL_TURNO_ABIERTO = "SELECT id, nombre, abierto FROM turnos WHERE cerrado IS NULL ORDER BY id DESC LIMIT 1"
+    SQL_ABRIR_TURNO = "INSERT INTO turnos (nombre, abierto) VALUES (?, ?)"
+    SQL_CERRAR_TURNO = "UPDATE turnos SET cerrado = ? WHERE id = ?"
+    SQL_APERTURA = "UPDATE turnos SET abierto = ? WHERE id = ?"
+    SQL_TICKETS_TURNO = ("SELECT folio, fecha_hora, centavos, codigo, estado FROM tickets "
+                         "WHERE turno_id = ? ORDER BY id")
+    SQL_CIERRE_PENDIENTE = "INSERT INTO cierres_pendientes (turno_id, datos) VALUES (?, ?)"
+
+    def __init__(self, data_file: str):
+        # Import diferido: sólo se paga al elegir este backend
+        import sqlite3
+
+        self.data_file = os.path.splitext(data_file)[0] + ".db"
+        # check_same_thread=False: el historial puede consultarse desde otros hilos
+        self._conexion = sqlite3.connect(self.data_file, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        # En WAL, NORMAL no hace fsync en cada commit (sólo en los checkpoints)
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(self.ESQUEMA)
+        self._turno_id: Optional[int] = None
+        # El turno abierto no tiene tickets: su primer alta fija la apertura
+        self._turno_vacio = True
+
+    def _abrir_turno(self, nombre: str, abierto: Optional[str] = None) -> int:
+        cursor = self._conexion.execute(self.SQL_ABRIR_TURNO, (nombre, abierto or _ahora_iso()))
+        return cursor.lastrowid
+
+    def cargar(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """
+        Devuelve el turno abierto como snapshot mínimo y sus tickets como eventos
+        'alta'. Sin tickets no hay apertura: la fila se creó al cerrar el anterior.
+        """
+        with self._lock:
+            fila = self._conexion.execute(self.SQL_TURNO_ABIERTO).fetchone()
+            if fila is None:
+                return None, []
+            self._turno_id, nombre, abierto = fila
+            registros = [
+                {'op': 'alta', 'f': folio, 'h': fecha_hora, 'ct': centavos, 'c': codigo, 'e': estado}
+                for folio, fecha_hora, centavos, codigo, estado
+                in self._conexion.execute(self.SQL_TICKETS_TURNO, (self._turno_id,))
+            ]
+        self._turno_vacio = not registros
+        return {'turno_actual': nombre, 'turno_abierto': abierto if registros else None}, registros
+
+    def _turno(self, nombre: str = "mañana") -> int:
+        if self._turno_id is None:
+            self._turno_id = self._abrir_turno(nombre)
+        return self._turno_id
+
+    def registrar(self, registro: Dict):
+        """Inserta una sola fila por evento: el costo no depende del tamaño del turno"""
+        self.registrar_lote([registro])
+
+    def registrar_lote(self, registros: List[Dict]):
+        """Aplica todos los eventos en una sola transacción (altas primero, luego cambios de estado)"""
+        with self._lock, self._conexion:
+            turno_id = self._turno()
+            altas = [r for r in registros if r.get('op') == 'alta']
+            if self._turno_vacio and altas:
+                self._conexion.execute(self.SQL_APERTURA, (altas[0]['h'], turno_id))
+                self._turno_vacio = False
+            self._conexion.executemany(self.SQL_ALTA, [
+                (turno_id, r['f'], r['h'], r['ct'], r['e'], r['c'])
+                for r in altas
+            ])
+            self._conexion.executemany(self.SQL_ESTADO, [
+                (r['e'], turno_id, r['f'])
+                for r in registros if r.get('op') == 'estado'
+            ])
+
+    def necesita_compactar(self) -> bool:
+        return False
+
+    def compactar_en_segundo_plano(self, estado: Dict):
+        pass
+
+    def guardar_snapshot(self, estado: Dict):
+        """Los tickets ya están en la base; sólo se asegura el turno abierto"""
+        with self._lock, self._conexion:
+            self._turno(estado.get('turno_actual', 'mañana'))
+
+    def cerrar_turno(self, estado: Dict, cierre: Dict) -> str:
+        """
+        Marca el turno actual como cerrado y abre el siguiente. Los tickets del
+        turno cerrado siguen en la base; queda en cierres_pendientes hasta
+        confirmar_cierre()
+        """
+        with self._lock, self._conexion:
+            turno_id = self._turno(cierre.get('turno', 'mañana'))
+            cerrado = cierre.get('cerrado') or _ahora_iso()
+            self._conexion.execute(self.SQL_CERRAR_TURNO, (cerrado, turno_id))
+            self._conexion.execute(self.SQL_CIERRE_PENDIENTE, (turno_id, json.dumps(cierre, ensure_ascii=False)))
+            # Apertura provisoria: la reemplaza la hora del primer ticket del turno nuevo
+            self._turno_id = self._abrir_turno(estado.get('turno_actual', 'mañana'), cerrado)
+            self._turno_vacio = True
+        return str(turno_id)
+
+    def cierres_pendientes(self) -> List[Tuple[str, Dict, Optional[Dict], List[Dict]]]:
+        """(cierre, {turno, abierto, cerrado, reporte}, datos, registros) de los cierres sin confirmar"""
+        with self._lock:
+            pendientes = []
+            for turno_id, datos in self._conexion.execute(
+                    "SELECT turno_id, datos FROM cierres_pendientes ORDER BY turno_id").fetchall():
+                registros = [
+                    {'op': 'alta', 'f': folio, 'h': fecha_hora, 'ct': centavos, 'c': codigo, 'e': estado}
+                    for folio, fecha_hora, centavos, codigo, estado
+                    in self._conexion.execute(self.SQL_TICKETS_TURNO, (turno_id,))
+                ]
+                pendientes.append((str(turno_id), json.loads(datos), None, registros))
+        return pendientes
+
+    def confirmar_cierre(self, cierre: str):
+        with self._lock, self._conexion:
+            self._conexion.execute("DELETE FROM cierres_pendientes WHERE turno_id = ?", (int(cierre),))
+
+    def resumen_turnos(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict]:
+        """
+        Totales por turno con apertura entre `desde` y `hasta` (fechas ISO,
+        'YYYY-MM-DD'), usando los índices en lugar de los reportes de texto.
+        """
+        sql = """
+            SELECT t.id, t.nombre, t.abierto, t.cerrado,
+                   COALESCE(SUM(k.estado != 'CANCELADO'), 0),
+                   COALESCE(SUM(CASE WHEN k.estado != 'CANCELADO' THEN k.centavos END), 0),
+                   COALESCE(SUM(k.estado = 'CANCELADO'), 0),
+                   COALESCE(SUM(CASE WHEN k.estado = 'CANCELADO' THEN k.centavos END), 0),
+                   MIN(k.folio), MAX(k.folio), COUNT(k.id)
+            FROM turnos t LEFT JOIN tickets k ON k.turno_id = t.id
+            WHERE t.abierto >= ? AND t.abierto < ?
+            GROUP BY t.id ORDER BY t.id
+        """
+        with self._lock:
+            filas = self._conexion.execute(sql, (desde or "", (hasta or "9999") + "\uffff")).fetchall()
+        resumen = []
+        for (turno_id, nombre, abierto, cerrado, total_ok, centavos_ok,
+             total_cancelados, centavos_cancelado, folio_min, folio_max, escaneados) in filas:
+            faltantes = (folio_max - folio_min + 1 - escaneados) if escaneados else 0
+            resumen.append({
+                'turno_id': turno_id, 'turno': nombre, 'abierto': abierto, 'cerrado': cerrado,
+                'total_ok': total_ok, 'centavos_ok': centavos_ok,
+                'total_cancelados': total_cancelados, 'centavos_cancelado': centavos_cancelado,
+                'total_faltantes': faltantes,
+            })
+        return resumen
+
+    def vaciar(self):
+        pass
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.commit()
+
+
+class PersistenciaBinaria(_EscritorEnSegundoPlano, _CierresEnArchivos):
+    """
+    Log de ancho fijo del turno abierto: <base>.tck con un registro
+    registro_binario.REGISTRO por evento y <base>.cod con los códigos originales.
+    Cada alta es una escritura del código y una del registro (en ese orden), y
+    un cambio de estado es otro registro del mismo folio sin código; las hace
+    el hilo escritor, como en PersistenciaJournal. Al cargar se recorre el
+    .tck mapeado en memoria, de a un registro, sin JSON ni fechas en texto; los
+    códigos quedan en un solo bloque y se decodifican al pedirlos.
+    <base>.meta.json guarda sólo el nombre y la apertura del turno.
+    """
+
+    def __init__(self, data_file: str,
+                 fsync_cada: int = FSYNC_CADA_REGISTROS,
+                 fsync_segundos: float = FSYNC_CADA_SEGUNDOS):
+        base = os.path.splitext(data_file)[0]
+        self._base = base
+        self.data_file = base + ".tck"
+        self.codigos_file = base + ".cod"
+        self.meta_file = base + ".meta.json"
+        self.fsync_cada = fsync_cada
+        self.fsync_segundos = fsync_segundos
+        self._lock = threading.Lock()
+        self._fd_registros: Optional[int] = None
+        self._fd_codigos: Optional[int] = None
+        self._fin_codigos = 0
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        self._iniciar_escritor()
+
+    def cargar(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """Devuelve los datos del turno; los tickets se leen con leer_registros()"""
+        self._completar_cierres()
+        meta = None
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        return meta, []
+
+    def leer_registros(self) -> Tuple[Iterator[Tuple[int, int, int, int, int, int]], bytes]:
+        """
+        (registros, códigos): los registros son tuplas (folio, segundos, centavos,
+        desplazamiento, largo, estado) que se desempaquetan del .tck mapeado a
+        medida que se recorren; códigos es el contenido del .cod. Al terminar el
+        recorrido se recortan los restos de una escritura interrumpida; hay que
+        recorrerlo entero antes de registrar eventos nuevos.
+        """
+        codigos = self._leer_codigos(self.codigos_file)
+        return self._recorrer_log(self.data_file, codigos, self._preparar_escritura), codigos
+
+    @staticmethod
+    def _leer_codigos(ruta: str) -> bytes:
+        if not os.path.exists(ruta):
+            return b""
+        with open(ruta, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def _recorrer_log(ruta: str, codigos: bytes,
+                      al_terminar: Optional[Callable[[int, int], None]] = None
+                      ) -> Iterator[Tuple[int, int, int, int, int, int]]:
+        """
+        Genera los registros del .tck sin copiarlo: cada uno se desempaqueta del
+        mapa al pedirlo. Se detiene en el primero incompleto o cuyo código no
+        llegó a escribirse (corte de energía); al_terminar(registros válidos,
+        fin de sus códigos) se llama sólo si el recorrido llega al final.
+        """
+        validos = fin_codigos = 0
+        if os.path.exists(ruta) and os.path.getsize(ruta) >= TAMANO_REGISTRO:
+            import mmap
+            with open(ruta, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                tramo = memoryview(mapa)[:len(mapa) // TAMANO_REGISTRO * TAMANO_REGISTRO]
+                registros = REGISTRO.iter_unpack(tramo)
+                try:
+                    for registro in registros:
+                        fin = registro[3] + registro[4]
+                        if fin > len(codigos):
+                            break
+                        fin_codigos = max(fin_codigos, fin)
+                        validos += 1
+                        yield registro
+                finally:
+                    # El mapa no se puede cerrar mientras haya vistas sobre él
+                    del registros
+                    tramo.release()
+        if al_terminar is not None:
+            al_terminar(validos, fin_codigos)
+
+    def _preparar_escritura(self, registros: int, fin_codigos: int):
+        """Recorta los restos de una escritura interrumpida y abre los archivos para anexar"""
+        with self._lock:
+            self._cerrar_archivos()
+            for ruta, largo in ((self.data_file, registros * TAMANO_REGISTRO), (self.codigos_file, fin_codigos)):
+                if os.path.exists(ruta) and os.path.getsize(ruta) != largo:
+                    os.truncate(ruta, largo)
+            self._fin_codigos = fin_codigos
+
+    def _abrir_archivos(self):
+        if self._fd_registros is None:
+            banderas = os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0)
+            self._fd_codigos = os.open(self.codigos_file, banderas)
+            self._fd_registros = os.open(self.data_file, banderas)
+            self._fin_codigos = os.fstat(self._fd_codigos).st_size
+
+    def registrar(self, registro: Dict):
+        self.registrar_lote([registro])
+
+    def registrar_lote(self, registros: List[Dict]):
+        """Encola los eventos; el hilo escritor los anexa al log"""
+        for registro in registros:
+            self._encolar((_REGISTRO, registro))
+
+    def _anexar(self, registros: List[Dict]):
+        """Anexa los eventos: una escritura para los códigos y otra para los registros"""
+        codigos = bytearray()
+        binarios = bytearray()
+        self._abrir_archivos()
+        for registro in registros:
+            if registro.get('op') == 'alta':
+                codigo = registro['c'].encode('utf-8')
+                binarios += REGISTRO.pack(registro['f'], a_segundos(datetime.fromisoformat(registro['h'])),
+                                          registro['ct'], self._fin_codigos + len(codigos), len(codigo),
+                                          CODIGO_ESTADO.get(registro['e'], 0))
+                codigos += codigo
+            elif registro.get('op') == 'estado':
+                binarios += REGISTRO.pack(registro['f'], 0, 0, 0, 0, CODIGO_ESTADO.get(registro['e'], 0))
+        largo_registros = os.fstat(self._fd_registros).st_size
+        try:
+            # El código va primero: un registro sólo es válido si su código ya está en disco
+            self._escribir_todo(self._fd_codigos, codigos)
+            self._escribir_todo(self._fd_registros, binarios)
+        except Exception:
+            # Sin restos a medias: el reintento vuelve a escribir el lote completo
+            for fd, largo in ((self._fd_codigos, self._fin_codigos), (self._fd_registros, largo_registros)):
+                try:
+                    os.ftruncate(fd, largo)
+                except OSError:
+                    pass
+            raise
+        self._fin_codigos += len(codigos)
+
+    @staticmethod
+    def _escribir_todo(fd: int, datos: bytes):
+        vista = memoryview(datos)
+        while vista:
+            vista = vista[os.write(fd, vista):]
+
+    def _fsync(self):
+        for fd in (self._fd_codigos, self._fd_registros):
+            if fd is not None:
+                os.fsync(fd)
+        self._pendientes_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def _cerrar_archivos(self):
+        if self._fd_registros is not None:
+            self._fsync()
+            os.close(self._fd_codigos)
+            os.close(self._fd_registros)
+            self._fd_registros = self._fd_codigos = None
+
+    def necesita_compactar(self) -> bool:
+        return False
+
+    def compactar_en_segundo_plano(self, estado: Dict):
+        pass
+
+    def guardar_snapshot(self, estado: Dict):
+        """El log ya tiene los tickets; sólo se guardan los datos del turno"""
+        escribir_atomico(self.meta_file, json.dumps(self._meta(estado), ensure_ascii=False))
+
+    def cerrar_turno(self, estado: Dict, cierre: Dict) -> str:
+        """Aparta el log del turno que cierra (ver _CierresEnArchivos); el turno nuevo empieza vacío"""
+        self.vaciar()
+        with self._lock:
+            self._cerrar_archivos()
+            numero = self._cerrar_en_archivos(estado, cierre)
+            self._fin_codigos = 0
+        return numero
+
+    def _archivos_turno(self):
+        return [(self.data_file, ".tck"), (self.codigos_file, ".cod"), (self.meta_file, ".meta.json")]
+
+    def _escribir_turno_nuevo(self, estado: Dict):
+        self.guardar_snapshot(estado)
+
+    def _cierre_del_turno_vivo(self):
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('cierre')
+        except (OSError, ValueError):
+            return None
+
+    def _leer_apartado(self, prefijo):
+        """El log apartado como registros 'alta'/'estado' (sólo se usa al recuperar un cierre)"""
+        meta = None
+        if os.path.exists(prefijo + ".meta.json"):
+            with open(prefijo + ".meta.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        codigos = self._leer_codigos(prefijo + ".cod")
+        binarios = self._recorrer_log(prefijo + ".tck", codigos)
+        registros = []
+        vistos = set()
+        for folio, segundos, centavos, desplazamiento, largo, estado in binarios:
+            if folio in vistos:
+                registros.append({'op': 'estado', 'f': folio, 'e': ESTADOS[estado]})
+                continue
+            vistos.add(folio)
+            registros.append({'op': 'alta', 'f': folio, 'h': desde_segundos(segundos).isoformat(),
+                              'ct': centavos, 'c': codigos[desplazamiento:desplazamiento + largo].decode('utf-8'),
+                              'e': ESTADOS[estado]})
+        return meta, registros
+
+    @staticmethod
+    def _meta(estado: Dict) -> Dict:
+        meta = {'turno_actual': estado.get('turno_actual', 'mañana'), 'turno_abierto': estado.get('turno_abierto')}
+        if estado.get('cierre') is not None:
+            meta['cierre'] = estado['cierre']
+        return meta
+
+    def cerrar(self):
+        """Escribe todo lo pendiente, detiene el hilo escritor y cierra el log"""
+        self._detener_escritor()
+        with self._lock:
+            self._cerrar_archivos()
+        if self._sin_escribir:
+            raise OSError(f"{len(self._sin_escribir)} evento(s) no se pudieron escribir en {self.data_file}")
+
+
+def escribir_atomico(ruta: str, texto: str):
+    """Escribe en un temporal, fsync y os.replace: nunca queda un archivo a medias"""
+    temporal = ruta + ".tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        f.write(texto)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def _ahora_iso() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+# Backends disponibles; se elige con TicketManager(backend=...) o TICKETS_BACKEND
+BACKENDS = {
+    'json': PersistenciaJournal,
+    'sqlite': PersistenciaSQLite,
+    'binario': PersistenciaBinaria,
+}
+
+
+def crear_persistencia(data_file: str, backend: Optional[str] = None):
+    nombre = (backend or os.environ.get('TICKETS_BACKEND') or 'json').lower()
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend de persistencia desconocido: {nombre}")
+    return BACKENDS[nombre](data_file)
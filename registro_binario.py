@@ -0,0 +1,35 @@
+import struct
+from datetime import datetime, timedelta
+from typing import Tuple
+
+# Registro de ancho fijo de un ticket (little-endian, 36 bytes):
+# folio, segundos desde 1970-01-01 (hora local, sin zona), centavos,
+# desplazamiento y largo del código original dentro del archivo de códigos, estado
+REGISTRO = struct.Struct('<IqqQIB3x')
+TAMANO_REGISTRO = REGISTRO.size
+
+ESTADOS = ("OK", "CANCELADO")
+CODIGO_ESTADO = {estado: i for i, estado in enumerate(ESTADOS)}
+
+_EPOCA = datetime(1970, 1, 1)
+
+
+def a_segundos(fecha_hora: datetime) -> int:
+    """Hora de pared a segundos enteros; sin zona horaria, así no le afecta el horario de verano"""
+    return (fecha_hora - _EPOCA) // timedelta(seconds=1)
+
+
+def desde_segundos(segundos: int) -> datetime:
+    return _EPOCA + timedelta(seconds=segundos)
+
+
+def empaquetar(folio: int, fecha_hora: datetime, centavos: int, estado: str,
+               desplazamiento_codigo: int, largo_codigo: int) -> bytes:
+    return REGISTRO.pack(folio, a_segundos(fecha_hora), centavos,
+                         desplazamiento_codigo, largo_codigo, CODIGO_ESTADO.get(estado, 0))
+
+
+def desempaquetar(buffer, desplazamiento: int = 0) -> Tuple[int, int, int, int, int, str]:
+    """(folio, segundos, centavos, desplazamiento_codigo, largo_codigo, estado)"""
+    folio, segundos, centavos, desp, largo, estado = REGISTRO.unpack_from(buffer, desplazamiento)
+    return folio, segundos, centavos, desp, largo, ESTADOS[estado]
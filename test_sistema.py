@@ -5,13 +5,47 @@ Script de prueba para el Sistema de Control de Tickets
 Simula codigos de barras de ejemplo para probar la funcionalidad
 """
 
-from ticket_manager import TicketManager
-from datetime import datetime, timedelta
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from auditoria import auditar, generar_reporte
+from benchmarks import CODIGOS_MUESTRA, MODULOS_DIFERIDOS, parsear_codigo_original
+from escaner import FuenteSocket, IngestaEscaner, LectorEscaner
+from impresora import (ColaImpresion, TrabajoImpresion, TransporteImpresora,
+                       crear_transporte, renderizar_escpos)
+from intervalos import ConjuntoIntervalos
+from parser_codigos import ParserCodigos
+from registro_binario import TAMANO_REGISTRO
+from ticket_manager import TicketManager, formatear_monto
+
+@contextmanager
+def carpeta_temporal():
+    """Directorio temporal que además queda como actual: ahí caen datos, reportes de cierre e histórico"""
+    with tempfile.TemporaryDirectory() as carpeta:
+        anterior = os.getcwd()
+        os.chdir(carpeta)
+        try:
+            yield carpeta
+        finally:
+            os.chdir(anterior)
 
 def test_ticket_manager():
     """Prueba el funcionamiento del TicketManager"""
     print("=== PRUEBA DEL SISTEMA DE TICKETS ===\n")
-    
+    with carpeta_temporal():
+        _probar_ticket_manager()
+
+def _probar_ticket_manager():
     # Crear instancia del manejador
     tm = TicketManager()
     
@@ -52,12 +86,14 @@ def test_ticket_manager():
     print("\n=== SIMULANDO CIERRE DE CAJA ===")
     resultado_cierre = tm.cierre_de_caja()
     print(resultado_cierre)
+    tm.cerrar()
 
 def test_parseo_codigos():
     """Prueba diferentes formatos de códigos de barras"""
     print("\n=== PRUEBA DE PARSEO DE CÓDIGOS ===\n")
     
-    tm = TicketManager()
+    # Sólo se parsea: sin cargar no lee ni escribe archivos
+    tm = TicketManager(cargar=False)
     
     # Diferentes formatos de código
     formatos_prueba = [
@@ -75,15 +111,659 @@ def test_parseo_codigos():
         if ticket:
             print(f"   ✅ Parseado: Folio {ticket.folio}, "
                   f"Fecha {ticket.fecha_hora.strftime('%d/%m/%Y %H:%M:%S')}, "
-                  f"Monto ${ticket.monto:.2f}")
+                  f"Monto {formatear_monto(ticket.centavos)}")
         else:
             print(f"   ❌ No se pudo parsear")
         print()
 
+def test_journal_persistencia():
+    """Prueba que el journal reconstruye el estado sin reescribir el JSON"""
+    print("\n=== PRUEBA DE JOURNAL ===\n")
+
+    with carpeta_temporal() as carpeta:
+        data_file = os.path.join(carpeta, "tickets_data.json")
+        tm = TicketManager(data_file)
+        tm.persistencia.compactar_cada = 3
+        for folio in (1, 2, 4, 5, 6):
+            tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0100.50")
+        tm.cerrar()
+
+        recargado = TicketManager(data_file)
+        print(f"   Tickets recargados: {sorted(recargado.tickets)}")
+        print(f"   Faltantes recargados: {recargado.tickets_faltantes_detectados}")
+        assert sorted(recargado.tickets) == [1, 2, 4, 5, 6]
+        assert list(recargado.tickets_faltantes_detectados) == [3]
+        assert recargado.ultimo_folio_esperado == 6
+        stats = recargado.obtener_estadisticas_turno()
+        assert stats['total_ok'] == 5 and (recargado.folio_min, recargado.folio_max) == (1, 6)
+        recargado.cerrar()
+
+def test_parser_equivalente():
+    """Prueba que ParserCodigos da los mismos resultados que el parser anterior"""
+    print("\n=== PRUEBA DE EQUIVALENCIA DEL PARSER ===\n")
+
+    parser = ParserCodigos()
+    ahora = datetime(2025, 10, 13, 12, 0, 0)
+    azar = random.Random(13)
+    codigos = list(CODIGOS_MUESTRA) + [
+        "093015 005 0100.50", "093015-05-0100.50", "253015-005-0100.50",
+        "20251399143025-001-0125.50", "093015-123456-0100.50", "12.34.56.78.90.12",
+    ]
+    for _ in range(2000):
+        folio = str(azar.randint(1, 99999)).zfill(azar.choice([3, 4, 5]))
+        hora = f"{azar.randint(0, 23):02d}{azar.randint(0, 59):02d}{azar.randint(0, 59):02d}"
+        separador = azar.choice(["-", "", " ", "/"])
+        punto = azar.choice([".", ""])
+        codigos.append(f"{hora}{separador}{folio}{separador}{azar.randint(0, 9999):04d}{punto}{azar.randint(0, 99):02d}")
+
+    for codigo in codigos:
+        esperado = parsear_codigo_original(codigo, ahora)
+        try:
+            obtenido = parser.parsear(codigo.strip(), ahora)
+        except ValueError:
+            obtenido = None
+        if esperado is not None and obtenido is not None:
+            # El parser anterior devolvía float (con redondeo en montos enormes);
+            # el nuevo devuelve centavos enteros exactos
+            assert math.isclose(obtenido.centavos, esperado.centavos * 100, rel_tol=1e-12, abs_tol=0.5), codigo
+            obtenido = obtenido[:2]
+            esperado = esperado[:2]
+        assert obtenido == esperado, f"{codigo}: {obtenido} != {esperado}"
+    print(f"   {len(codigos)} códigos con resultados idénticos")
+
+def test_faltantes_lejanos():
+    """Prueba que un hueco de más de 100 folios conserva su referencia de cámaras"""
+    print("\n=== PRUEBA DE HUECO GRANDE ===\n")
+
+    with carpeta_temporal() as carpeta:
+        tm = TicketManager(os.path.join(carpeta, "tickets_data.json"))
+        # Carga directa: el rango ±10 impide escanear un salto así
+        for folio, hora in ((1, "091500"), (250, "120000")):
+            tm._aplicar_ticket(tm.parsear_codigo_barras(f"{hora}-{folio:03d}-0100.00"))
+        detalle = tm.obtener_resumen_detallado()
+        faltante = detalle[124]
+        print(f"   Folio {faltante['folio']}: {faltante['horario_camaras']}")
+        assert faltante['status'] == 'FALTANTE'
+        assert faltante['horario_camaras'] == "09:15 - 12:10"
+        assert "Sin referencia" not in tm.obtener_resumen()
+        faltantes = [fila for fila in detalle if fila['status'] == 'FALTANTE']
+        assert list(tm.iterar_resumen_detallado(solo_faltantes=True)) == faltantes
+        assert list(tm.iterar_resumen_detallado(desde=100, hasta=102)) == detalle[99:102]
+        assert tm.contar_faltantes() == len(faltantes) == 248
+        # La ventana de resumen pagina sin copiar el turno: la página ya pedida no
+        # cambia con un escaneo posterior y ningún folio se salta ni se repite
+        filas = tm.instantanea_resumen_detallado(pagina=100)
+        primeras = [next(filas) for _ in range(50)]
+        tm._aplicar_ticket(tm.parsear_codigo_barras("100000-075-0100.00"))
+        tm._aplicar_ticket(tm.parsear_codigo_barras("110000-150-0100.00"))
+        resto = list(filas)
+        assert primeras + resto[:50] == detalle[:100]
+        assert [fila['folio'] for fila in primeras + resto] == [fila['folio'] for fila in detalle]
+        assert resto[99]['status'] == 'OK' and resto[99]['folio'] == "150"
+        tm.cerrar()
+
+def test_backend_sqlite():
+    """Prueba el backend SQLite: recarga del turno abierto e historial de turnos cerrados"""
+    print("\n=== PRUEBA DE BACKEND SQLITE ===\n")
+
+    with carpeta_temporal() as carpeta:
+        data_file = os.path.join(carpeta, "tickets_data.json")
+        tm = TicketManager(data_file, backend="sqlite")
+        for folio in (1, 2, 4):
+            tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0100.50")
+        tm.cerrar()
+
+        recargado = TicketManager(data_file, backend="sqlite")
+        assert sorted(recargado.tickets) == [1, 2, 4]
+        assert list(recargado.tickets_faltantes_detectados) == [3]
+        recargado.cierre_de_caja()
+        recargado.agregar_ticket("101500-050-0010.00")
+
+        turnos = recargado.consultar_turnos()
+        print(f"   Turnos: {turnos}")
+        assert [t['turno'] for t in turnos] == ['mañana', 'tarde']
+        assert turnos[0]['total_ok'] == 3 and turnos[0]['centavos_ok'] == 30150
+        assert turnos[0]['total_faltantes'] == 1 and turnos[0]['cerrado'] is not None
+        assert turnos[1]['total_ok'] == 1 and turnos[1]['cerrado'] is None
+        recargado.cerrar()
+
+def test_importacion_lote():
+    """Prueba que el lote da los mismos resultados que escanear uno por uno"""
+    print("\n=== PRUEBA DE IMPORTACIÓN EN LOTE ===\n")
+
+    codigos = [f"0915{f % 60:02d}-{f:03d}-0010.00" for f in (1, 2, 2, 5, 4, 40, 6, 3)] + ["basura"]
+    with carpeta_temporal() as carpeta:
+        uno_a_uno = TicketManager(os.path.join(carpeta, "a.json"))
+        esperado = [(c,) + uno_a_uno.agregar_ticket(c) for c in codigos]
+        uno_a_uno.cerrar()
+
+        ruta_log = os.path.join(carpeta, "log.txt")
+        with open(ruta_log, 'w', encoding='utf-8') as f:
+            f.write("\n".join(codigos) + "\n")
+        lote = TicketManager(os.path.join(carpeta, "b.json"))
+        resultados = lote.importar_archivo(ruta_log)
+        lote.cerrar()
+        for resultado in resultados:
+            print(f"   {resultado}")
+        assert resultados == esperado
+
+        recargado = TicketManager(os.path.join(carpeta, "b.json"))
+        assert sorted(recargado.tickets) == [1, 2, 3, 4, 5, 6]
+        recargado.cerrar()
+
+def test_auditoria():
+    """Prueba la auditoría multiproceso por día y turno"""
+    print("\n=== PRUEBA DE AUDITORÍA ===\n")
+
+    with carpeta_temporal() as carpeta:
+        ruta = os.path.join(carpeta, "escaneos_20251013.txt")
+        with open(ruta, 'w', encoding='utf-8') as f:
+            # mañana: folios 1-5 sin el 3; tarde: 10-12 con un duplicado
+            for folio in (1, 2, 4, 5):
+                f.write(f"0915{folio:02d}-{folio:03d}-0010.00\n")
+            for folio in (10, 11, 11, 12):
+                f.write(f"1630{folio:02d}-{folio:03d}-0001.50\n")
+            f.write("x\n")
+            # Basura que el respaldo genérico convertiría en un folio inventado
+            f.write("ERROR LECTURA 123456789012\n")
+        # bloques pequeños para forzar varios envíos a los procesos
+        resumen, invalidos = auditar([ruta], procesos=2, tamano_bloque=3)
+        print(generar_reporte(resumen, invalidos, listar_faltantes=True))
+
+        manana = resumen[("2025-10-13", "mañana")]
+        tarde = resumen[("2025-10-13", "tarde")]
+        assert manana['faltantes'] == [3] and manana['centavos'] == 4000
+        assert tarde['total'] == 3 and tarde['duplicados'] == 1 and tarde['faltantes'] == []
+        assert invalidos == 2 and len(resumen) == 2
+
+def test_lector_escaner():
+    """Prueba la detección de fin de escaneo por terminador y por pausa"""
+    print("\n=== PRUEBA DEL LECTOR DE ESCÁNER ===\n")
+
+    lector = LectorEscaner(timeout=0.05)
+    escaneos = []
+
+    def teclear(texto, inicio, intervalo=0.005):
+        for i, caracter in enumerate(texto):
+            escaneos.extend(lector.recibir(caracter, inicio + i * intervalo))
+
+    # Dos escaneos seguidos sin Enter: la pausa los separa sin perder ninguno
+    teclear("093015-005-0100.50", 0.0)
+    teclear("093016-006-0100.50", 0.2)
+    # El último se cierra por timeout
+    escaneos.append(lector.verificar_timeout(0.5))
+    # Con terminador el escaneo termina de inmediato
+    teclear("093017-007-0100.50\r", 1.0)
+    # Captura manual lenta: un código incompleto no se corta por las pausas
+    teclear("0930", 2.0, intervalo=0.3)
+    assert lector.verificar_timeout(5.0) is None and lector.texto == "0930"
+    teclear("18-008-0100.50\n", 6.0, intervalo=0.3)
+
+    print(f"   {escaneos}")
+    assert escaneos == ["093015-005-0100.50", "093016-006-0100.50",
+                        "093017-007-0100.50", "093018-008-0100.50"]
+    assert lector.estado == LectorEscaner.ESPERANDO
+
+def test_ingesta_socket():
+    """Prueba el hilo de ingesta leyendo de un socket local"""
+    print("\n=== PRUEBA DE INGESTA POR SOCKET ===\n")
+
+    ingesta = IngestaEscaner(FuenteSocket(0), timeout=0.05)
+    ingesta.iniciar()
+    try:
+        with socket.create_connection(("127.0.0.1", ingesta.fuente.puerto)) as cliente:
+            # Dos códigos en un solo envío con CR, y uno sin terminador (cierra por pausa)
+            cliente.sendall(b"093015-005-0100.50\r093016-006-0100.50\r")
+            cliente.sendall(b"093017-007-0100.50")
+            codigos = []
+            limite = time.monotonic() + 3.0
+            while len(codigos) < 3 and time.monotonic() < limite:
+                codigos.extend(ingesta.obtener_codigos())
+                time.sleep(0.01)
+    finally:
+        ingesta.detener()
+
+    print(f"   {codigos}")
+    assert codigos == ["093015-005-0100.50", "093016-006-0100.50", "093017-007-0100.50"]
+
+def test_eventos():
+    """Prueba los eventos que publica TicketManager a sus suscriptores"""
+    print("\n=== PRUEBA DE EVENTOS ===\n")
+
+    with carpeta_temporal() as carpeta:
+        manager = TicketManager(os.path.join(carpeta, "e.json"))
+        eventos = []
+        manager.suscribir(lambda evento, datos: eventos.append((evento, datos)))
+        for codigo in ("091501-001-0010.00", "091504-004-0010.00", "091503-003-0010.00"):
+            manager.agregar_ticket(codigo)
+        manager.agregar_ticket("091505-005-0002.50", cancelado=True)
+        manager.agregar_ticket("091501-001-0010.00")  # duplicado: no publica nada
+        manager.cancelar_ticket(4)  # cambio de estado de un ticket ya agregado
+        manager.cierre_de_caja()
+        manager.cerrar()
+
+    for evento in eventos:
+        print(f"   {evento}")
+    assert eventos == [
+        ("ticket_agregado", {'folio': 1, 'centavos': 1000, 'estado': 'OK'}),
+        ("hueco_abierto", {'desde': 2, 'hasta': 3}),
+        ("ticket_agregado", {'folio': 4, 'centavos': 1000, 'estado': 'OK'}),
+        ("hueco_cerrado", {'folio': 3}),
+        ("ticket_agregado", {'folio': 3, 'centavos': 1000, 'estado': 'OK'}),
+        # Un alta ya cancelada es un alta: las altas y los cambios de estado no se mezclan
+        ("ticket_agregado", {'folio': 5, 'centavos': 250, 'estado': 'CANCELADO'}),
+        ("ticket_cancelado", {'folio': 4, 'centavos': 1000}),
+        ("turno_cerrado", {'turno': 'mañana', 'nuevo_turno': 'tarde'}),
+    ]
+
+def test_cancelacion_existente():
+    """Prueba cancelar y reactivar tickets ya escaneados (journal y SQLite)"""
+    print("\n=== PRUEBA DE CANCELACIÓN DE TICKETS EXISTENTES ===\n")
+
+    with carpeta_temporal() as carpeta:
+        for backend in ("json", "sqlite"):
+            ruta = os.path.join(carpeta, f"c_{backend}.json")
+            manager = TicketManager(ruta, backend=backend)
+            for folio in (1, 2, 3):
+                manager.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0010.00")
+            assert manager.agregar_ticket_cancelado("091502-002-0010.00")[0]
+            assert manager.cancelar_ticket(3) == (True, "Ticket 003 CANCELADO")
+            assert manager.reactivar_ticket(3)[0]
+            assert not manager.cancelar_ticket(2)[0] and not manager.cancelar_ticket(9)[0]
+            manager.cerrar()
+
+            recargado = TicketManager(ruta, backend=backend)
+            stats = recargado.obtener_estadisticas_turno()
+            print(f"   {backend}: {stats}")
+            assert recargado.tickets[2].estado == "CANCELADO" and recargado.tickets[3].estado == "OK"
+            assert stats['total_ok'] == 2 and stats['centavos_ok'] == 2000
+            assert stats['total_cancelados'] == 1 and stats['centavos_cancelado'] == 1000
+            recargado.cerrar()
+
+def test_intervalos_faltantes():
+    """Prueba los faltantes como intervalos: partir, fusionar y persistir compacto"""
+    print("\n=== PRUEBA DE INTERVALOS DE FALTANTES ===\n")
+
+    conjunto = ConjuntoIntervalos()
+    conjunto.agregar_rango(10, 5000)
+    conjunto.agregar_rango(5001, 5003)
+    assert conjunto.intervalos() == [(10, 5003)] and len(conjunto) == 4994
+    assert conjunto.discard(100) and 100 not in conjunto and 99 in conjunto
+    assert conjunto.intervalos() == [(10, 99), (101, 5003)]
+    conjunto.add(100)
+    assert conjunto.a_lista() == [[10, 5003]]
+
+    with carpeta_temporal() as carpeta:
+        data_file = os.path.join(carpeta, "tickets_data.json")
+        # Snapshot con el formato anterior (un folio de texto por elemento)
+        with open(data_file, 'w', encoding='utf-8') as f:
+            json.dump({'turno_actual': 'mañana', 'tickets_faltantes': ['003', '004', '007'],
+                       'tickets': {}, 'ultimo_folio_esperado': 8}, f)
+        tm = TicketManager(data_file)
+        assert tm.tickets_faltantes_detectados.intervalos() == [(3, 4), (7, 7)]
+        tm.guardar_datos()
+        tm.cerrar()
+        with open(data_file, 'r', encoding='utf-8') as f:
+            assert json.load(f)['tickets_faltantes'] == [[3, 4], [7, 7]]
+
+        tm = TicketManager(data_file)
+        for folio in (2, 4, 8):
+            tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0010.00")
+        resumen = tm.obtener_resumen()
+        print(resumen)
+        assert "TICKETS FALTANTES: 2" in resumen and "Folio 003:" in resumen and "Folio 007:" in resumen
+        assert [(inicio, fin) for inicio, fin, _ in tm.iterar_intervalos_faltantes()] == [(3, 3), (7, 7)]
+        tm.cerrar()
+
+def test_fechas_medianoche():
+    """Prueba que los códigos compactos pasada la medianoche caen en el día siguiente"""
+    print("\n=== PRUEBA DE FECHAS CON CAMBIO DE DÍA ===\n")
+
+    with carpeta_temporal() as carpeta:
+        data_file = os.path.join(carpeta, "tickets_data.json")
+        tm = TicketManager(data_file)
+        tm.turno_abierto = datetime(2025, 10, 13, 22, 0, 0)
+        tm.reloj = lambda: datetime(2025, 10, 14, 0, 15, 0)
+        for codigo in ("235800-001-0010.00", "000500-003-0010.00", "001000-004-0010.00"):
+            tm.agregar_ticket(codigo)
+        tm.guardar_datos()
+        tm.cerrar()
+
+        recargado = TicketManager(data_file)
+        fechas = {folio: t.fecha_hora for folio, t in recargado.tickets.items()}
+        print(f"   {fechas}")
+        assert recargado.turno_abierto == datetime(2025, 10, 13, 22, 0, 0)
+        assert fechas[1] == datetime(2025, 10, 13, 23, 58, 0)
+        assert fechas[3] == datetime(2025, 10, 14, 0, 5, 0)
+        assert list(recargado.tickets_por_fecha) == ["2025-10-13", "2025-10-14"]
+        assert [t.folio for t in recargado.tickets_en_ventana(datetime(2025, 10, 13, 23, 0),
+                                                              datetime(2025, 10, 14, 0, 5))] == [1, 3]
+        # El folio 2 llega tarde (23:59): su vecino anterior lo ubica el día 13
+        recargado.agregar_ticket("235900-002-0010.00")
+        assert recargado.tickets[2].fecha_hora == datetime(2025, 10, 13, 23, 59, 0)
+        recargado.cerrar()
+
+        # Un lote de todo un día que cruza la medianoche fecha igual que los escaneos de a uno
+        codigos = ["080000-001-0010.00", "140000-002-0010.00", "200000-003-0010.00",
+                   "235900-004-0010.00", "003000-005-0010.00"]
+        fechas_por_modo = []
+        for modo in ("uno", "lote"):
+            tm = TicketManager(os.path.join(carpeta, f"{modo}.json"))
+            tm.turno_abierto = datetime(2025, 10, 13, 8, 0, 0)
+            tm.reloj = lambda: datetime(2025, 10, 14, 0, 45, 0)
+            if modo == "lote":
+                tm.agregar_tickets_lote(codigos)
+            else:
+                for codigo in codigos:
+                    tm.agregar_ticket(codigo)
+            fechas_por_modo.append({folio: t.fecha_hora for folio, t in tm.tickets.items()})
+            tm.cerrar()
+        assert fechas_por_modo[0] == fechas_por_modo[1]
+        assert fechas_por_modo[1][4] == datetime(2025, 10, 13, 23, 59, 0)
+        assert fechas_por_modo[1][5] == datetime(2025, 10, 14, 0, 30, 0)
+
+        # Primer escaneo tras un cierre nocturno: se fecha por el reloj, no por la hora del cierre
+        for backend in ("json", "sqlite"):
+            data_file = os.path.join(carpeta, f"noche_{backend}.json")
+            tm = TicketManager(data_file, backend=backend)
+            tm.reloj = lambda: datetime(2025, 10, 13, 21, 0, 0)
+            tm.agregar_ticket("205500-049-0010.00")
+            tm.cierre_de_caja()
+            tm.esperar_reportes()
+            tm.cerrar()
+            recargado = TicketManager(data_file, backend=backend)
+            assert recargado.turno_abierto is None
+            recargado.reloj = lambda: datetime(2025, 10, 14, 11, 5, 0)
+            recargado.agregar_ticket("110000-050-0010.00")
+            recargado.agregar_ticket("110500-051-0010.00")
+            print(f"   {backend}: {recargado.tickets[50].fecha_hora}")
+            assert recargado.tickets[50].fecha_hora == datetime(2025, 10, 14, 11, 0, 0)
+            assert recargado.tickets[51].fecha_hora == datetime(2025, 10, 14, 11, 5, 0)
+            assert recargado.turno_abierto == datetime(2025, 10, 14, 11, 0, 0)
+            recargado.cerrar()
+
+def test_arranque_diferido():
+    """Prueba que importar ticket_manager no carga módulos diferidos y la carga manual"""
+    print("\n=== PRUEBA DE ARRANQUE DIFERIDO ===\n")
+
+    codigo = ("import sys, ticket_manager; "
+              f"print([m for m in {MODULOS_DIFERIDOS!r} if m in sys.modules])")
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    print(f"   Módulos diferidos cargados: {salida.stdout.strip()}")
+    assert salida.stdout.strip() == "[]"
+
+    with carpeta_temporal() as carpeta:
+        data_file = os.path.join(carpeta, "tickets_data.json")
+        tm = TicketManager(data_file)
+        tm.agregar_ticket("091501-001-0010.00")
+        tm.cerrar()
+        diferido = TicketManager(data_file, cargar=False)
+        assert not diferido.tickets
+        diferido.cargar_datos()
+        assert list(diferido.tickets) == [1]
+        diferido.cerrar()
+
+def test_cierre_en_segundo_plano():
+    """Prueba que los cierres no pisan reportes y el turno nuevo queda listo al instante"""
+    print("\n=== PRUEBA DE CIERRE EN SEGUNDO PLANO ===\n")
+
+    with carpeta_temporal() as carpeta:
+        tm = TicketManager("tickets_data.json")
+        for folio in (1, 2, 4):
+            tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0010.00")
+        print(f"   {tm.cierre_de_caja()}")
+        # El turno nuevo acepta escaneos aunque el reporte siga escribiéndose
+        assert tm.agregar_ticket("101500-050-0005.00")[0] and list(tm.tickets) == [50]
+        print(f"   {tm.cierre_de_caja()}")
+        print(f"   {tm.cierre_de_caja()}")
+        tm.cerrar()
+        reportes = sorted(n for n in os.listdir(carpeta) if n.startswith("cierre_"))
+        print(f"   {reportes}")
+        assert len(reportes) == 3 and all(n.endswith(".txt") for n in reportes)
+        # El primero en orden es el del turno de la mañana con los tres tickets
+        with open(os.path.join(carpeta, reportes[0]), 'r', encoding='utf-8') as f:
+            contenido = f.read()
+        assert "Tickets OK: 3" in contenido and "Folio 003:" in contenido
+
+def test_cierre_recuperado():
+    """Prueba que un cierre sin archivar sobrevive al reinicio y se completa una sola vez"""
+    print("\n=== PRUEBA DE CIERRE RECUPERADO ===\n")
+
+    def falla_archivo(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    for backend in ("json", "binario", "sqlite"):
+        with carpeta_temporal() as carpeta:
+            tm = TicketManager("tickets_data.json", backend=backend)
+            for folio in (1, 2, 4):
+                tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0010.00")
+            # El reporte se escribe pero el archivo histórico falla: el turno queda apartado
+            tm.historico.archivar_turno = falla_archivo
+            tm.cierre_de_caja()
+            tm.esperar_reportes()
+            tm.agregar_ticket("101500-050-0005.00")
+            tm.cerrar()
+            assert len(tm.persistencia.cierres_pendientes()) == 1
+
+            # Al reiniciar se archiva el turno apartado sin tocar el turno nuevo ni repetir el reporte
+            tm = TicketManager("tickets_data.json", backend=backend)
+            tm.esperar_reportes()
+            turnos = tm.historico.turnos()
+            reportes = [n for n in os.listdir(carpeta) if n.startswith("cierre_")]
+            pendientes = tm.persistencia.cierres_pendientes()
+            folios = list(tm.tickets)
+            tm.cerrar()
+            print(f"   {backend}: archivados={[t['cantidad'] for t in turnos]} reportes={len(reportes)} turno nuevo={folios}")
+            assert [t['cantidad'] for t in turnos] == [3] and turnos[0]['total_faltantes'] == 1
+            assert len(reportes) == 1 and not pendientes
+            assert folios == [50]
+
+def test_escritura_fallida():
+    """Prueba que los eventos de una escritura fallida se reintentan y no se pierden"""
+    print("\n=== PRUEBA DE ESCRITURA FALLIDA ===\n")
+
+    def disco_lleno(registros):
+        raise OSError("disco lleno")
+
+    for backend in ("json", "binario"):
+        with carpeta_temporal() as carpeta:
+            data_file = os.path.join(carpeta, "tickets_data.json")
+            tm = TicketManager(data_file, backend=backend)
+            tm.agregar_ticket("091500-001-0010.00")
+            tm.persistencia.vaciar()
+            tm.persistencia._anexar = disco_lleno
+            tm.agregar_ticket("091600-002-0010.00")
+            tm.agregar_ticket("091700-003-0010.00")
+            try:
+                tm.persistencia.vaciar()
+                assert False, "vaciar() debía avisar de los eventos sin escribir"
+            except OSError as e:
+                print(f"   {backend}: {e}")
+            assert "2 evento(s)" in tm.error_persistencia()
+            # El cierre se rechaza: el turno sigue abierto con sus tickets
+            try:
+                tm.cierre_de_caja()
+                assert False, "el cierre debía rechazarse"
+            except OSError:
+                pass
+            assert sorted(tm.tickets) == [1, 2, 3]
+
+            # El disco vuelve: el reintento escribe el lote en orden y sin restos
+            del tm.persistencia._anexar
+            tm.persistencia.vaciar()
+            assert tm.error_persistencia() is None
+            tm.agregar_ticket("091800-004-0010.00")
+            tm.cerrar()
+            recargado = TicketManager(data_file, backend=backend)
+            assert sorted(recargado.tickets) == [1, 2, 3, 4]
+            recargado.cerrar()
+
+def test_archivo_historico():
+    """Prueba el archivo binario de turnos cerrados y sus consultas por rango de días"""
+    print("\n=== PRUEBA DE ARCHIVO HISTÓRICO ===\n")
+
+    with carpeta_temporal() as carpeta:
+        tm = TicketManager(os.path.join(carpeta, "tickets_data.json"))
+        # Tres turnos: dos el día 13 (mañana y tarde) y uno el 14
+        for dia, turno_folios in ((13, (1, 2, 4)), (13, (10, 11)), (14, (20, 23))):
+            tm.turno_abierto = datetime(2025, 10, dia, 8, 0, 0)
+            tm.reloj = lambda: datetime(2025, 10, dia, 10, 0, 0)
+            for folio in turno_folios:
+                tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-00{folio:02d}.00")
+            tm.cancelar_ticket(turno_folios[-1])
+            tm.cierre_de_caja()
+        tm.cerrar()
+
+        recargado = TicketManager(os.path.join(carpeta, "tickets_data.json"))
+        turnos = recargado.consultar_historico("2025-10-13", "2025-10-13")
+        for turno in turnos:
+            print(f"   {turno}")
+        assert [t['cantidad'] for t in turnos] == [3, 2]
+        assert sum(t['total_faltantes'] for t in recargado.consultar_historico()) == 1 + 2
+        tickets = list(recargado.tickets_historicos("2025-10-14"))
+        assert [(t.folio, t.estado, t.centavos) for t in tickets] == [(20, "OK", 2000), (23, "CANCELADO", 2300)]
+        assert tickets[0].fecha_hora == datetime(2025, 10, 14, 9, 15, 20)
+        assert tickets[0].codigo_original == "091520-020-0020.00"
+        assert [t.folio for t in recargado.tickets_historicos(turno="tarde")] == [10, 11]
+        recargado.cerrar()
+
+def test_log_binario():
+    """Prueba el backend 'binario': recarga desde el log mapeado y cola cortada"""
+    print("\n=== PRUEBA DE LOG BINARIO ===\n")
+
+    with carpeta_temporal() as carpeta:
+        archivo = os.path.join(carpeta, "tickets_data.json")
+        tm = TicketManager(archivo, backend="binario")
+        for folio in (1, 2, 5):
+            tm.agregar_ticket(f"0915{folio:02d}-{folio:03d}-0{folio:02d}0.50")
+        tm.cancelar_ticket(2)
+        # Las escrituras al log las hace el hilo escritor, no el que escanea
+        assert tm.persistencia._hilo_escritor.is_alive()
+        tm.guardar_datos()
+        tm.cerrar()
+
+        recargado = TicketManager(archivo, backend="binario")
+        stats = recargado.obtener_estadisticas_turno()
+        print(f"   {stats}")
+        assert sorted(recargado.tickets) == [1, 2, 5]
+        assert recargado.tickets[2].estado == "CANCELADO"
+        assert recargado.tickets[5].codigo_original == "091505-005-0050.50"
+        assert (stats['total_ok'], stats['centavos_ok'], stats['centavos_cancelado']) == (2, 1050 + 5050, 2050)
+        assert list(recargado.tickets_faltantes_detectados) == [3, 4]
+        recargado.cerrar()
+
+        # Corte a mitad de un registro: se descarta sólo el incompleto
+        with open(os.path.join(carpeta, "tickets_data.tck"), 'ab') as f:
+            f.write(b"\x06" + b"\x00" * (TAMANO_REGISTRO // 2))
+        cortado = TicketManager(archivo, backend="binario")
+        assert sorted(cortado.tickets) == [1, 2, 5]
+        cortado.agregar_ticket("091506-006-0060.50")
+        cortado.cerrar()
+        assert os.path.getsize(os.path.join(carpeta, "tickets_data.tck")) == 5 * TAMANO_REGISTRO
+        completo = TicketManager(archivo, backend="binario")
+        assert sorted(completo.tickets) == [1, 2, 5, 6]
+        completo.cerrar()
+
+        # Corte con el código del último alta a medias: se descarta su registro
+        ruta_codigos = os.path.join(carpeta, "tickets_data.cod")
+        os.truncate(ruta_codigos, os.path.getsize(ruta_codigos) - 3)
+        sin_codigo = TicketManager(archivo, backend="binario")
+        assert sorted(sin_codigo.tickets) == [1, 2, 5]
+        sin_codigo.cerrar()
+        assert os.path.getsize(os.path.join(carpeta, "tickets_data.tck")) == 4 * TAMANO_REGISTRO
+
+def test_impresion():
+    """Prueba el render ESC/POS y la cola de impresión con reintentos"""
+    print("\n=== PRUEBA DE IMPRESIÓN ESC/POS ===\n")
+
+    texto = "=" * 32 + "\nCIERRE DE CAJA - TURNO\nMAÑANA\n" + "=" * 32 + "\nPróximo turno: tarde\n" + "x " * 20
+    datos = renderizar_escpos(texto)
+    print(f"   {datos!r}")
+    assert datos.startswith(b"\x1b@\x1bt\x02") and datos.endswith(b"\x1dVB\x00")
+    assert b"\x1ba\x01\x1bE\x01CIERRE DE CAJA - TURNO\n" in datos
+    assert "MAÑANA".encode("cp850") in datos and "Próximo".encode("cp850") in datos
+    assert max(len(linea) for linea in datos.split(b"\n")[5:-1]) <= 32
+
+    class TransporteInestable(TransporteImpresora):
+        """Falla las primeras `fallas` veces"""
+        def __init__(self, fallas):
+            self.fallas = fallas
+            self.recibidos = []
+
+        def enviar(self, datos):
+            if self.fallas:
+                self.fallas -= 1
+                raise OSError("impresora sin papel")
+            self.recibidos.append(datos)
+
+    transporte = TransporteInestable(fallas=1)
+    cola = ColaImpresion(transporte, reintentos=2, espera=0.01)
+    trabajo = cola.enviar("Hola")
+    assert trabajo.terminado.wait(2)
+    estados = [estado for _, estado in cola.obtener_actualizaciones()]
+    assert estados == [TrabajoImpresion.IMPRIMIENDO, TrabajoImpresion.REINTENTANDO,
+                       TrabajoImpresion.IMPRIMIENDO, TrabajoImpresion.IMPRESO]
+    assert transporte.recibidos == [renderizar_escpos("Hola")]
+
+    fallido = ColaImpresion(TransporteInestable(fallas=5), reintentos=2, espera=0.01).enviar("Hola")
+    assert fallido.terminado.wait(2) and fallido.estado == TrabajoImpresion.FALLIDO
+    assert fallido.intentos == 2 and fallido.error == "impresora sin papel"
+    cola.detener()
+
+    with carpeta_temporal() as carpeta:
+        ruta = os.path.join(carpeta, "impresiones.bin")
+        cola = ColaImpresion(crear_transporte("archivo:" + ruta))
+        for texto_trabajo in ("uno", "dos"):
+            cola.enviar(texto_trabajo)
+        cola.detener()
+        with open(ruta, 'rb') as f:
+            assert f.read() == renderizar_escpos("uno") + renderizar_escpos("dos")
+
+    # Impresora de red simulada en un puerto local
+    servidor = socket.create_server(("127.0.0.1", 0))
+    recibido = bytearray()
+
+    def aceptar():
+        conexion, _ = servidor.accept()
+        with conexion:
+            while True:
+                bloque = conexion.recv(4096)
+                if not bloque:
+                    break
+                recibido.extend(bloque)
+
+    hilo = threading.Thread(target=aceptar)
+    hilo.start()
+    cola = ColaImpresion(crear_transporte(f"tcp:127.0.0.1:{servidor.getsockname()[1]}"))
+    assert cola.enviar("red").terminado.wait(5)
+    hilo.join(5)
+    servidor.close()
+    assert bytes(recibido) == renderizar_escpos("red")
+
 if __name__ == "__main__":
     try:
         test_parseo_codigos()
         test_ticket_manager()
+        test_journal_persistencia()
+        test_parser_equivalente()
+        test_faltantes_lejanos()
+        test_backend_sqlite()
+        test_importacion_lote()
+        test_auditoria()
+        test_lector_escaner()
+        test_ingesta_socket()
+        test_eventos()
+        test_cancelacion_existente()
+        test_intervalos_faltantes()
+        test_fechas_medianoche()
+        test_arranque_diferido()
+        test_cierre_en_segundo_plano()
+        test_cierre_recuperado()
+        test_escritura_fallida()
+        test_archivo_historico()
+        test_log_binario()
+        test_impresion()
         print("\n🎉 ¡Todas las pruebas completadas exitosamente!")
         
     except Exception as e:
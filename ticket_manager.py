@@ -1,258 +1,338 @@
-import re
-import json
-from datetime import datetime, timedelta
-from dateutil import parser
-from typing import Dict, List, Optional, Tuple
 import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from archivo_historico import ArchivoHistorico
+from intervalos import ConjuntoIntervalos
+from parser_codigos import ParserCodigos, resolver_fecha
+from persistencia import crear_persistencia, escribir_atomico
+from registro_binario import ESTADOS, desde_segundos
+
+# Eventos publicados a los suscriptores de TicketManager: callback(evento, datos)
+EVENTO_TICKET_AGREGADO = "ticket_agregado"    # folio, centavos, estado (alta nueva, "OK" o "CANCELADO")
+EVENTO_TICKET_CANCELADO = "ticket_cancelado"  # folio, centavos (un ticket ya registrado pasó a CANCELADO)
+EVENTO_TICKET_REACTIVADO = "ticket_reactivado"  # folio, centavos (volvió a OK)
+EVENTO_HUECO_ABIERTO = "hueco_abierto"        # desde, hasta (folios faltantes nuevos)
+EVENTO_HUECO_CERRADO = "hueco_cerrado"        # folio (faltante que llegó tarde)
+EVENTO_TURNO_CERRADO = "turno_cerrado"        # turno, nuevo_turno
+
+def formatear_monto(centavos: int) -> str:
+    """12550 -> '$125.50' (el monto sólo se convierte a texto al mostrarlo)"""
+    signo = "-" if centavos < 0 else ""
+    centavos = abs(centavos)
+    return f"{signo}${centavos // 100}.{centavos % 100:02d}"
 
 class Ticket:
-    """Representa un ticket individual con folio, fecha/hora, monto y estado"""
+    """Representa un ticket individual con folio, fecha/hora, monto (en centavos) y estado"""
+
+    # Sin __dict__ por instancia: una terminal puede tener cientos de miles en memoria
+    __slots__ = ('folio', 'fecha_hora', 'centavos', 'codigo_original', 'estado')
     
-    def __init__(self, folio: str, fecha_hora: datetime, monto: float, codigo_original: str, estado: str = "OK"):
+    def __init__(self, folio: int, fecha_hora: datetime, centavos: int, codigo_original: str, estado: str = "OK"):
         self.folio = folio
         self.fecha_hora = fecha_hora
-        self.monto = monto
+        self.centavos = centavos
         self.codigo_original = codigo_original
         # estado: "OK" | "CANCELADO"
         self.estado = estado
     
     def __str__(self):
-        return f"Ticket {self.folio}: {self.fecha_hora.strftime('%H:%M:%S')} - ${self.monto:.2f}"
+        return f"Ticket {TicketManager.formatear_folio(self.folio)}: {self.fecha_hora.strftime('%H:%M:%S')} - {formatear_monto(self.centavos)}"
     
     def __repr__(self):
         return self.__str__()
 
+class TicketMapeado(Ticket):
+    """
+    Ticket leído del log binario: el código original queda como un tramo del
+    bloque de códigos cargado y sólo se decodifica cuando alguien lo pide
+    """
+
+    __slots__ = ('_codigos', '_desplazamiento', '_largo')
+
+    def __init__(self, folio: int, fecha_hora: datetime, centavos: int, codigos: bytes,
+                 desplazamiento: int, largo: int, estado: str = "OK"):
+        self.folio = folio
+        self.fecha_hora = fecha_hora
+        self.centavos = centavos
+        self.estado = estado
+        self._codigos = codigos
+        self._desplazamiento = desplazamiento
+        self._largo = largo
+
+    @property
+    def codigo_original(self) -> str:
+        inicio = self._desplazamiento
+        return self._codigos[inicio:inicio + self._largo].decode('utf-8')
+
 class TicketManager:
     """Maneja la colección de tickets, detecta faltantes y organiza por turnos"""
     
-    def __init__(self):
-        self.tickets: Dict[str, Ticket] = {}  # folio -> Ticket
-        self.tickets_por_fecha: Dict[str, List[Ticket]] = {}  # fecha -> lista de tickets
+    def __init__(self, data_file: str = "tickets_data.json", backend: Optional[str] = None,
+                 cargar: bool = True, persistencia=None):
+        self.tickets: Dict[int, Ticket] = {}  # folio (entero) -> Ticket
         self.turno_actual = "mañana"
-        self.tickets_faltantes_detectados = set()
+        # Apertura del turno (hora del primer ticket): los códigos que sólo traen
+        # hora y no tienen vecinos se fechan desde ella, sin pasar de reloj()
+        self.turno_abierto: Optional[datetime] = None
+        self.reloj: Callable[[], datetime] = datetime.now
+        self.tickets_faltantes_detectados = ConjuntoIntervalos()  # folios enteros, por intervalos
         self.contador_advertencia = 0  # Para controlar los 3 tickets de advertencia
         self.ultimo_folio_esperado = None
-        self.data_file = "tickets_data.json"
-        self.cargar_datos()
-
-    # Utilidades para manejar folios por número (evita depender del zfill)
-    def _folio_key_variants(self, folio_num: int) -> List[str]:
-        s = str(folio_num)
-        return [s, s.zfill(3), s.zfill(4), s.zfill(5)]
-
-    def _has_ticket_by_int(self, folio_num: int) -> bool:
-        for k in self._folio_key_variants(folio_num):
-            if k in self.tickets:
-                return True
-        return False
-
-    def _get_ticket_by_int(self, folio_num: int) -> Optional['Ticket']:
-        for k in self._folio_key_variants(folio_num):
-            if k in self.tickets:
-                return self.tickets[k]
-        return None
+        self._reiniciar_agregados()
+        self.data_file = data_file
+        # backend: 'json' (snapshot + journal, por defecto), 'sqlite' o 'binario' (log de ancho fijo); ver persistencia.BACKENDS
+        # persistencia: backend ya creado (para rearmar un turno cerrado sin abrir otro)
+        self.persistencia = persistencia if persistencia is not None else crear_persistencia(data_file, backend)
+        self.parser = ParserCodigos()
+        # Turnos cerrados en formato binario, junto al archivo de datos
+        self.historico = ArchivoHistorico(os.path.join(os.path.dirname(os.path.abspath(data_file)), "historico"))
+        self._suscriptores: List[Callable[[str, Dict], None]] = []
+        # Reportes de cierre que se están escribiendo en segundo plano
+        self._reportes_pendientes: Dict[str, threading.Thread] = {}
+        # cargar=False deja la carga al llamador (la GUI la hace en un hilo tras mostrar la ventana)
+        if cargar:
+            self.cargar_datos()
+
+    def suscribir(self, callback: Callable[[str, Dict], None]):
+        """Registra callback(evento, datos); ver EVENTO_* para los eventos y sus datos"""
+        self._suscriptores.append(callback)
+
+    def desuscribir(self, callback: Callable[[str, Dict], None]):
+        if callback in self._suscriptores:
+            self._suscriptores.remove(callback)
+
+    def _publicar(self, evento: str, **datos):
+        for callback in self._suscriptores:
+            try:
+                callback(evento, datos)
+            except Exception as e:
+                print(f"Error notificando {evento}: {e}")
+
+    @property
+    def tickets_por_fecha(self) -> Dict[str, List[Ticket]]:
+        """fecha -> lista de tickets en orden de hora; se calcula al pedirlo a partir del índice de tiempos"""
+        por_fecha: Dict[str, List[Ticket]] = {}
+        for _, folio in self.tiempos_ordenados:
+            ticket = self.tickets[folio]
+            por_fecha.setdefault(ticket.fecha_hora.strftime('%Y-%m-%d'), []).append(ticket)
+        return por_fecha
+
+    def _reiniciar_agregados(self):
+        """Agregados del turno mantenidos en O(1) por alta de ticket"""
+        self.folio_min: Optional[int] = None
+        self.folio_max: Optional[int] = None
+        self.total_ok = 0
+        self.total_cancelados = 0
+        self.centavos_ok = 0
+        self.centavos_cancelado = 0
+        # Índice ordenado de folios para buscar vecinos con bisect
+        self.folios_ordenados: List[int] = []
+        # Índice del turno ordenado por (fecha_hora, folio) para consultas por horario
+        self.tiempos_ordenados: List[Tuple[datetime, int]] = []
+
+    def _acumular_ticket(self, ticket: 'Ticket'):
+        folio = ticket.folio
+        if self.folio_min is None or folio < self.folio_min:
+            self.folio_min = folio
+        if self.folio_max is None or folio > self.folio_max:
+            self.folio_max = folio
+        if not self.folios_ordenados or folio > self.folios_ordenados[-1]:
+            self.folios_ordenados.append(folio)  # caso habitual: folio creciente
+        else:
+            insort(self.folios_ordenados, folio)
+        clave_tiempo = (ticket.fecha_hora, folio)
+        if not self.tiempos_ordenados or clave_tiempo > self.tiempos_ordenados[-1]:
+            self.tiempos_ordenados.append(clave_tiempo)
+        else:
+            insort(self.tiempos_ordenados, clave_tiempo)
+        if getattr(ticket, 'estado', 'OK') == 'CANCELADO':
+            self.total_cancelados += 1
+            self.centavos_cancelado += ticket.centavos
+        else:
+            self.total_ok += 1
+            self.centavos_ok += ticket.centavos
+
+    @staticmethod
+    def formatear_folio(folio: int, ancho: int = 3) -> str:
+        """Los folios se guardan como enteros; el relleno con ceros es sólo de presentación"""
+        return str(folio).zfill(ancho)
     
     def parsear_codigo_barras(self, codigo: str) -> Optional[Ticket]:
         """
         Parsea un código de barras y extrae hora, folio y monto.
         Formato compacto recomendado: HHMMSS-FFF-MMMM.CC
-        También soporta formatos alternativos para compatibilidad.
+        También soporta formatos alternativos para compatibilidad (ver parser_codigos).
         """
         try:
             # NORMALIZAR: quitar espacios en blanco alrededor
             codigo = codigo.strip()
-
-            # FORMATO COMPACTO ROBUSTO (acepta cualquier separador no numérico y con/sin punto)
-            # Normalizar: dejar sólo dígitos y el punto decimal
-            codigo_norm = re.sub(r'[^0-9\.]', '', codigo)
-
-            # Evitar parsear cadenas claramente incompletas
-            if len(codigo_norm) < 12:
+            resultado = self.parser.parsear(codigo)
+            if resultado is None:
                 return None
-
-            # Intento A: HHMMSS FFF/FFFF/FFFFF . CC (con punto) — folio 3, 4 o 5 dígitos
-            m = re.match(r'^(\d{6})(\d{3,5})(\d{4})\.(\d{2})$', codigo_norm)
-            if m:
-                hora_str, folio_str, mmmm, cc = m.groups()
-                hoy = datetime.now()
-                fecha_encontrada = hoy.replace(
-                    hour=int(hora_str[:2]),
-                    minute=int(hora_str[2:4]),
-                    second=int(hora_str[4:6]),
-                    microsecond=0
-                )
-                # normalizar folio removiendo ceros a la izquierda
-                folio_encontrado = str(int(folio_str))
-                monto_encontrado = float(f"{int(mmmm):04d}.{int(cc):02d}")
-                return Ticket(folio_encontrado, fecha_encontrada, monto_encontrado, codigo)
-
-            # Intento B: HHMMSS FFF/FFFF/FFFFF MMMM CC (sin punto) — folio 3, 4 o 5 dígitos
-            m = re.match(r'^(\d{6})(\d{3,5})(\d{4})(\d{2})$', codigo_norm)
-            if m:
-                hora_str, folio_str, mmmm, cc = m.groups()
-                hoy = datetime.now()
-                fecha_encontrada = hoy.replace(
-                    hour=int(hora_str[:2]),
-                    minute=int(hora_str[2:4]),
-                    second=int(hora_str[4:6]),
-                    microsecond=0
-                )
-                folio_encontrado = str(int(folio_str))
-                monto_encontrado = float(f"{int(mmmm):04d}.{int(cc):02d}")
-                return Ticket(folio_encontrado, fecha_encontrada, monto_encontrado, codigo)
-
-            # PATRÓN ALTERNATIVO: YYYYMMDDHHMMSS-FFF-MMMM.CC
-            patron_estandar = r'(\d{14})-(\d{3})-(\d{4}\.\d{2})'
-            match_estandar = re.search(patron_estandar, codigo)
-            if match_estandar:
-                fecha_str, folio_str, monto_str = match_estandar.groups()
-                fecha_encontrada = datetime.strptime(fecha_str, '%Y%m%d%H%M%S')
-                folio_encontrado = folio_str
-                monto_encontrado = float(monto_str)
-                return Ticket(folio_encontrado, fecha_encontrada, monto_encontrado, codigo)
-
-            # PATRONES ALTERNATIVOS para compatibilidad con formatos existentes
-            patrones_fecha = [
-                r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})',  # 2025-10-13T14:30:25
-                r'(\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2})',   # 13/10/2025 14:30:25
-                r'(\d{14})',                                # 20251013143025 (sin separadores)
-                r'(\d{12})',                                # 202510131430 (sin segundos)
-            ]
-            
-            # Patrón para folio (3, 4 o 5 dígitos)
-            patron_folio = r'(\b\d{3,5}\b)'
-            
-            # Patrón para monto (formato decimal con 2 decimales)
-            patron_monto = r'(\d+\.\d{2})'
-            
-            fecha_encontrada = None
-            folio_encontrado = None
-            monto_encontrado = None
-            
-            # Buscar fecha/hora
-            for patron in patrones_fecha:
-                match = re.search(patron, codigo)
-                if match:
-                    fecha_str = match.group(1)
-                    try:
-                        if 'T' in fecha_str:
-                            fecha_encontrada = datetime.strptime(fecha_str, '%Y-%m-%dT%H:%M:%S')
-                        elif '/' in fecha_str:
-                            fecha_encontrada = datetime.strptime(fecha_str, '%d/%m/%Y %H:%M:%S')
-                        elif len(fecha_str) == 14:  # YYYYMMDDHHMMSS
-                            fecha_encontrada = datetime.strptime(fecha_str, '%Y%m%d%H%M%S')
-                        elif len(fecha_str) == 12:  # YYYYMMDDHHMM (sin segundos)
-                            fecha_encontrada = datetime.strptime(fecha_str, '%Y%m%d%H%M')
-                        break
-                    except ValueError:
-                        continue
-            
-            # Buscar folio (buscar específicamente después de guion bajo o al final)
-            # Buscar patrón _XXX_ o _XXXX_ o _XXXXX_ al final
-            match_folio = re.search(r'_(\d{3,5})(?:_|$)', codigo)
-            if match_folio:
-                folio_encontrado = str(int(match_folio.group(1)))
-            else:
-                # Buscar cualquier secuencia de 3 dígitos como respaldo
-                folios = re.findall(patron_folio, codigo)
-                if folios:
-                    folio_encontrado = str(int(folios[0]))
-            
-            # Buscar monto
-            montos = re.findall(patron_monto, codigo)
-            if montos:
-                monto_encontrado = float(montos[0])
-            
-            # Si no se encuentran todos los componentes, usar valores por defecto
-            if not fecha_encontrada:
-                fecha_encontrada = datetime.now()
-            
-            if not folio_encontrado:
-                # Generar folio basado en timestamp si no se encuentra
-                folio_encontrado = str(int(datetime.now().timestamp()) % 10000)
-            
-            if monto_encontrado is None:
-                # Evitar interpretar cadenas numéricas largas como monto
-                numeros = re.findall(r'\d+', codigo)
-                numeros = [n for n in numeros if 1 <= len(n) <= 6]  # evitar 15+ dígitos
-                if numeros:
-                    try:
-                        monto_encontrado = float(numeros[-1])
-                    except ValueError:
-                        monto_encontrado = 0.0
+            folio = int(resultado.folio)
+            fecha_hora = resultado.fecha_hora
+            if resultado.fecha_inferida:
+                vecino = self._buscar_ticket_cercano(folio, -1) or self._buscar_ticket_cercano(folio, 1)
+                if vecino is not None:
+                    fecha_hora = resolver_fecha(fecha_hora, vecino.fecha_hora)
                 else:
-                    monto_encontrado = 0.0
-            
-            return Ticket(folio_encontrado, fecha_encontrada, monto_encontrado, codigo)
+                    # Primer ticket del turno: hacia adelante desde la apertura, sin pasar de ahora
+                    fecha_hora = resolver_fecha(fecha_hora, self.reloj(), desde=self.turno_abierto)
+            return Ticket(folio, fecha_hora, resultado.centavos, codigo)
             
         except Exception as e:
             print(f"Error parseando código: {e}")
             return None
     
+    def tickets_en_ventana(self, desde: datetime, hasta: datetime) -> List[Ticket]:
+        """Tickets con fecha_hora en [desde, hasta], en orden de hora (O(log n + k))"""
+        inicio = bisect_left(self.tiempos_ordenados, (desde,))
+        fin = bisect_right(self.tiempos_ordenados, (hasta, float('inf')))
+        return [self.tickets[folio] for _, folio in self.tiempos_ordenados[inicio:fin]]
+
     def agregar_ticket(self, codigo: str, cancelado: bool = False) -> Tuple[bool, str, bool]:
         """
         Agrega un ticket y retorna (éxito, mensaje, mostrar_amarillo)
         """
         ticket = self.parsear_codigo_barras(codigo)
+        resultado = self._validar_y_aplicar(ticket, cancelado)
+        if resultado[0]:
+            self._registrar_evento(self._registro_alta(ticket))
+        return resultado
+
+    def _validar_y_aplicar(self, ticket: Optional[Ticket], cancelado: bool) -> Tuple[bool, str, bool]:
+        """Valida un ticket ya parseado y, si procede, lo incorpora en memoria (sin persistir)"""
         if not ticket:
             return False, "Código de barras inválido", False
         
         # Verificar si ya existe
-        folio_nuevo = int(ticket.folio)
-        # Normalizar clave a cadena sin ceros a la izquierda
-        ticket.folio = str(folio_nuevo)
-        if self._has_ticket_by_int(folio_nuevo):
-            return False, f"Ticket {ticket.folio} ya existe", False
+        folio_nuevo = ticket.folio
+        if folio_nuevo in self.tickets:
+            return False, f"Ticket {self.formatear_folio(folio_nuevo)} ya existe", False
         
         # Validar que el ticket esté en un rango razonable
         if self.tickets:
-            folios_existentes = [int(f) for f in self.tickets.keys()]
-            folio_min_actual = min(folios_existentes)
-            folio_max_actual = max(folios_existentes)
-            folio_nuevo = int(ticket.folio)
+            folio_min_actual = self.folio_min
+            folio_max_actual = self.folio_max
             
             # Permitir tickets en el rango actual ±10 tickets
             RANGO_MAXIMO = 10
             
             # Si el ticket está muy por debajo del rango actual
             if folio_nuevo < folio_min_actual - RANGO_MAXIMO:
-                return False, f"Ticket {ticket.folio} está muy fuera de rango (muy antiguo). Rango actual: {folio_min_actual:03d}-{folio_max_actual:03d}", False
+                return False, f"Ticket {self.formatear_folio(folio_nuevo)} está muy fuera de rango (muy antiguo). Rango actual: {self.formatear_folio(folio_min_actual)}-{self.formatear_folio(folio_max_actual)}", False
             
             # Si el ticket está muy por encima del rango actual
             if folio_nuevo > folio_max_actual + RANGO_MAXIMO:
-                return False, f"Ticket {ticket.folio} está muy fuera de rango (muy adelantado). Rango actual: {folio_min_actual:03d}-{folio_max_actual:03d}", False
+                return False, f"Ticket {self.formatear_folio(folio_nuevo)} está muy fuera de rango (muy adelantado). Rango actual: {self.formatear_folio(folio_min_actual)}-{self.formatear_folio(folio_max_actual)}", False
         
         # Si es cancelado, marcar estado
         if cancelado:
             ticket.estado = "CANCELADO"
+        if self.turno_abierto is None:
+            # Tras un cierre el turno nuevo se abre con su primer ticket
+            self.turno_abierto = ticket.fecha_hora
 
-        # Agregar ticket
-        self.tickets[ticket.folio] = ticket
-        fecha_str = ticket.fecha_hora.strftime('%Y-%m-%d')
-        
-        if fecha_str not in self.tickets_por_fecha:
-            self.tickets_por_fecha[fecha_str] = []
-        
-        self.tickets_por_fecha[fecha_str].append(ticket)
-        
-        # Verificar si hay tickets faltantes
-        mostrar_amarillo = self._verificar_tickets_faltantes(ticket)
-        
-        self.guardar_datos()
+        mostrar_amarillo = self._aplicar_ticket(ticket)
+        self._publicar(EVENTO_TICKET_AGREGADO, folio=ticket.folio, centavos=ticket.centavos, estado=ticket.estado)
         if cancelado:
-            return True, f"Ticket {ticket.folio} CANCELADO registrado", False
+            return True, f"Ticket {self.formatear_folio(folio_nuevo)} CANCELADO registrado", False
         else:
-            return True, f"Ticket {ticket.folio} registrado correctamente", mostrar_amarillo
+            return True, f"Ticket {self.formatear_folio(folio_nuevo)} registrado correctamente", mostrar_amarillo
+
+    def agregar_tickets_lote(self, codigos: Iterable[str], cancelado: bool = False) -> List[Tuple[str, bool, str, bool]]:
+        """
+        Ingresa varios códigos de una vez (re-captura tras una caída, logs de impresora).
+        Retorna por código (codigo, éxito, mensaje, mostrar_amarillo) con la misma
+        semántica que llamadas sucesivas a agregar_ticket, pero persiste una sola vez.
+        """
+        # Parsear, validar y aplicar de a uno: la fecha de los códigos compactos,
+        # los duplicados y el rango se resuelven contra lo ya aceptado en el lote
+        resultados = []
+        registros = []
+        for codigo in codigos:
+            ticket = self.parsear_codigo_barras(codigo)
+            exito, mensaje, mostrar_amarillo = self._validar_y_aplicar(ticket, cancelado)
+            if exito:
+                registros.append(self._registro_alta(ticket))
+            resultados.append((codigo, exito, mensaje, mostrar_amarillo))
+
+        if registros:
+            self._registrar_eventos(registros)
+        return resultados
+
+    def importar_archivo(self, ruta: str, cancelado: bool = False) -> List[Tuple[str, bool, str, bool]]:
+        """Importa un archivo de texto con un código de barras por línea"""
+        with open(ruta, 'r', encoding='utf-8') as f:
+            codigos = [linea.strip() for linea in f if linea.strip()]
+        return self.agregar_tickets_lote(codigos, cancelado)
 
     def agregar_ticket_cancelado(self, codigo: str) -> Tuple[bool, str, bool]:
-        """Atajo para agregar ticket marcado como CANCELADO"""
+        """
+        Cancela el folio del código: si ya fue escaneado cambia su estado,
+        si no, lo agrega marcado como CANCELADO
+        """
+        ticket = self.parsear_codigo_barras(codigo)
+        if ticket is not None and ticket.folio in self.tickets:
+            exito, mensaje = self.cancelar_ticket(ticket.folio)
+            return exito, mensaje, False
         return self.agregar_ticket(codigo, cancelado=True)
+
+    def cancelar_ticket(self, folio: int) -> Tuple[bool, str]:
+        """Marca como CANCELADO un ticket ya registrado; retorna (éxito, mensaje)"""
+        return self._cambiar_estado(folio, "CANCELADO")
+
+    def reactivar_ticket(self, folio: int) -> Tuple[bool, str]:
+        """Deshace la cancelación de un ticket; retorna (éxito, mensaje)"""
+        return self._cambiar_estado(folio, "OK")
+
+    def _cambiar_estado(self, folio: int, estado: str) -> Tuple[bool, str]:
+        ticket = self.tickets.get(folio)
+        if ticket is None:
+            return False, f"Ticket {self.formatear_folio(folio)} no está registrado"
+        if ticket.estado == estado:
+            return False, f"Ticket {self.formatear_folio(folio)} ya está {estado}"
+
+        self._aplicar_estado(ticket, estado)
+        # Un solo registro en el journal, no se reescribe el turno
+        self._registrar_evento({'op': 'estado', 'f': folio, 'e': estado})
+        if estado == "CANCELADO":
+            self._publicar(EVENTO_TICKET_CANCELADO, folio=folio, centavos=ticket.centavos)
+            return True, f"Ticket {self.formatear_folio(folio)} CANCELADO"
+        self._publicar(EVENTO_TICKET_REACTIVADO, folio=folio, centavos=ticket.centavos)
+        return True, f"Ticket {self.formatear_folio(folio)} reactivado"
+
+    def _aplicar_estado(self, ticket: Ticket, estado: str):
+        """Cambia el estado en memoria moviendo el ticket entre los totales en O(1)"""
+        if ticket.estado == estado:
+            return
+        if estado == "CANCELADO":
+            self.total_ok -= 1
+            self.centavos_ok -= ticket.centavos
+            self.total_cancelados += 1
+            self.centavos_cancelado += ticket.centavos
+        else:
+            self.total_cancelados -= 1
+            self.centavos_cancelado -= ticket.centavos
+            self.total_ok += 1
+            self.centavos_ok += ticket.centavos
+        ticket.estado = estado
+
+    def _aplicar_ticket(self, ticket: Ticket) -> bool:
+        """Incorpora un ticket ya validado al estado en memoria (sin persistir)"""
+        self.tickets[ticket.folio] = ticket
+        self._acumular_ticket(ticket)
+        
+        # Verificar si hay tickets faltantes
+        return self._verificar_tickets_faltantes(ticket)
     
     def _verificar_tickets_faltantes(self, nuevo_ticket: Ticket) -> bool:
         """
         Verifica si hay tickets faltantes y maneja la lógica de advertencia
         """
-        folio_actual = int(nuevo_ticket.folio)
+        folio_actual = nuevo_ticket.folio
         
         # Si es el primer ticket del día o reinicio
         if self.ultimo_folio_esperado is None:
@@ -266,20 +346,18 @@ class TicketManager:
             self.contador_advertencia = 0
             return False
         elif folio_actual > self.ultimo_folio_esperado + 1:
-            # Hay tickets faltantes
-            for folio_faltante in range(self.ultimo_folio_esperado + 1, folio_actual):
-                # Guardar sin ceros a la izquierda
-                self.tickets_faltantes_detectados.add(str(folio_faltante))
+            # Hay tickets faltantes: un solo intervalo, sin importar el tamaño del salto
+            self.tickets_faltantes_detectados.agregar_rango(self.ultimo_folio_esperado + 1, folio_actual - 1)
+            self._publicar(EVENTO_HUECO_ABIERTO, desde=self.ultimo_folio_esperado + 1, hasta=folio_actual - 1)
             
             self.ultimo_folio_esperado = folio_actual
             self.contador_advertencia = 3  # Mostrar amarillo por los próximos 3 tickets
             return True
         else:
             # Ticket anterior que llegó tarde
-            # Quitar de faltantes cualquier variante
-            for variante in [str(folio_actual), str(folio_actual).zfill(3), str(folio_actual).zfill(4)]:
-                if variante in self.tickets_faltantes_detectados:
-                    self.tickets_faltantes_detectados.remove(variante)
+            # Quitar de faltantes
+            if self.tickets_faltantes_detectados.discard(folio_actual):
+                self._publicar(EVENTO_HUECO_CERRADO, folio=folio_actual)
             
             # Si aún hay advertencias pendientes, continuar mostrando amarillo
             if self.contador_advertencia > 0:
@@ -293,233 +371,521 @@ class TicketManager:
         Genera lista completa de tickets con información de faltantes
         Retorna lista de diccionarios con: folio, status, hora, monto, horario_camaras
         """
-        if not self.tickets:
-            return []
-        
-        # Obtener rango de folios
-        folios_existentes = [int(f) for f in self.tickets.keys()]
-        if not folios_existentes:
-            return []
-            
-        folio_min = min(folios_existentes)
-        folio_max = max(folios_existentes)
-        width = max(3, len(str(folio_max)))
-        
-        resultado = []
-        
+        return list(self.iterar_resumen_detallado())
+
+    def iterar_resumen_detallado(self, solo_faltantes: bool = False, solo_cancelados: bool = False,
+                                 desde: Optional[int] = None, hasta: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Versión perezosa de obtener_resumen_detallado: genera las filas una a una
+        en orden de folio, opcionalmente filtradas por estado y rango [desde, hasta].
+        Lee el turno en vivo; para paginar mientras se sigue escaneando usar
+        instantanea_resumen_detallado.
+        """
+        return self._iterar_filas(self.tickets, self.folios_ordenados, solo_faltantes, solo_cancelados, desde, hasta)
+
+    def instantanea_resumen_detallado(self, solo_faltantes: bool = False, solo_cancelados: bool = False,
+                                      desde: Optional[int] = None, hasta: Optional[int] = None,
+                                      pagina: int = 200) -> Iterator[Dict]:
+        """
+        Como iterar_resumen_detallado, para paginar mientras se sigue escaneando.
+        Al llamar fija el turno y el rango de folios (O(1), sin copiar el turno);
+        cada tramo de `pagina` folios se arma entero al pedir su primera fila.
+        Los escaneos posteriores sólo se ven en los tramos que aún no se pidieron
+        y, tras un cierre, se sigue con el turno cerrado: no se saltan ni se
+        repiten filas.
+        """
+        tickets, folios_ordenados = self.tickets, self.folios_ordenados
+        if not tickets:
+            return iter(())
+        inicio = folios_ordenados[0] if desde is None else desde
+        fin = folios_ordenados[-1] if hasta is None else hasta
+        return self._paginar_filas(tickets, folios_ordenados, solo_faltantes, solo_cancelados,
+                                   inicio, fin, pagina)
+
+    def _paginar_filas(self, tickets: Dict[int, Ticket], folios_ordenados: List[int],
+                       solo_faltantes: bool, solo_cancelados: bool,
+                       inicio: int, fin: int, pagina: int) -> Iterator[Dict]:
+        while inicio <= fin:
+            fin_tramo = min(inicio + pagina - 1, fin)
+            yield from list(self._iterar_filas(tickets, folios_ordenados, solo_faltantes, solo_cancelados,
+                                               inicio, fin_tramo))
+            inicio = fin_tramo + 1
+
+    def _iterar_filas(self, tickets: Dict[int, Ticket], folios_ordenados: List[int],
+                      solo_faltantes: bool, solo_cancelados: bool,
+                      desde: Optional[int], hasta: Optional[int]) -> Iterator[Dict]:
+        if not tickets:
+            return
+
+        folio_min = folios_ordenados[0] if desde is None else max(desde, folios_ordenados[0])
+        folio_max = folios_ordenados[-1] if hasta is None else min(hasta, folios_ordenados[-1])
+        if folio_min > folio_max:
+            return
+        width = max(3, len(str(folios_ordenados[-1])))
+
+        if solo_faltantes:
+            # Recorrer sólo los huecos entre folios consecutivos del índice
+            i = bisect_right(folios_ordenados, folio_min) - 1
+            while i < len(folios_ordenados) - 1:
+                anterior_folio = folios_ordenados[i]
+                posterior_folio = folios_ordenados[i + 1]
+                if anterior_folio >= folio_max:
+                    break
+                if posterior_folio - anterior_folio > 1:
+                    horario = self._horario_camaras(tickets[anterior_folio], tickets[posterior_folio])
+                    for folio_num in range(max(anterior_folio + 1, folio_min), min(posterior_folio - 1, folio_max) + 1):
+                        yield self._fila_faltante(folio_num, width, horario)
+                i += 1
+            return
+
+        if solo_cancelados:
+            inicio = bisect_left(folios_ordenados, folio_min)
+            fin = bisect_right(folios_ordenados, folio_max)
+            for folio_num in folios_ordenados[inicio:fin]:
+                ticket = tickets[folio_num]
+                if ticket.estado == 'CANCELADO':
+                    yield self._fila_ticket(ticket, width)
+            return
+
         for folio_num in range(folio_min, folio_max + 1):
-            folio_display = str(folio_num).zfill(width)
-            ticket = self._get_ticket_by_int(folio_num)
+            ticket = tickets.get(folio_num)
             if ticket:
-                resultado.append({
-                    'folio': folio_display,
-                    'status': 'CANCELADO' if getattr(ticket, 'estado', 'OK') == 'CANCELADO' else 'OK',
-                    'hora': ticket.fecha_hora.strftime('%H:%M:%S'),
-                    'monto': f"${ticket.monto:.2f}",
-                    'horario_camaras': None
-                })
+                yield self._fila_ticket(ticket, width)
             else:
-                # Ticket faltante
-                ticket_anterior = self._buscar_ticket_cercano(folio_num, -1)
-                ticket_posterior = self._buscar_ticket_cercano(folio_num, 1)
-                
-                horario_camaras = ""
-                if ticket_anterior and ticket_posterior:
-                    # Nuevo criterio: desde la hora (minuto) del ticket anterior hasta 10 min después del posterior
-                    hora_inicio = ticket_anterior.fecha_hora.replace(second=0, microsecond=0)
-                    hora_fin = (ticket_posterior.fecha_hora + timedelta(minutes=10)).replace(second=0, microsecond=0)
-                    horario_camaras = f"{hora_inicio.strftime('%H:%M')} - {hora_fin.strftime('%H:%M')}"
-                elif ticket_anterior:
-                    hora_inicio = ticket_anterior.fecha_hora
-                    hora_fin = hora_inicio + timedelta(minutes=10)
-                    horario_camaras = f"{hora_inicio.strftime('%H:%M')} - {hora_fin.strftime('%H:%M')}"
-                elif ticket_posterior:
-                    hora_fin = ticket_posterior.fecha_hora
-                    hora_inicio = hora_fin - timedelta(minutes=10)
-                    horario_camaras = f"{hora_inicio.strftime('%H:%M')} - {hora_fin.strftime('%H:%M')}"
-                else:
-                    horario_camaras = "Sin referencia"
-                
-                resultado.append({
-                    'folio': folio_display,
-                    'status': 'FALTANTE',
-                    'hora': '---',
-                    'monto': '---',
-                    'horario_camaras': horario_camaras
-                })
-        
-        return resultado
+                horario = self._horario_camaras(
+                    self._ticket_cercano(tickets, folios_ordenados, folio_num, -1),
+                    self._ticket_cercano(tickets, folios_ordenados, folio_num, 1)
+                )
+                yield self._fila_faltante(folio_num, width, horario)
 
-    def obtener_estadisticas_turno(self) -> Dict[str, float]:
-        """Devuelve conteos y montos separados por estado para el turno en curso"""
-        tickets_cancelados = [t for t in self.tickets.values() if getattr(t, 'estado', 'OK') == 'CANCELADO']
-        tickets_validos = [t for t in self.tickets.values() if getattr(t, 'estado', 'OK') != 'CANCELADO']
+    def iterar_intervalos_faltantes(self) -> Iterator[Tuple[int, int, str]]:
+        """(inicio, fin, horario_camaras) por cada intervalo de folios faltantes detectados"""
+        for inicio, fin in self.tickets_faltantes_detectados.intervalos():
+            yield inicio, fin, self._horario_camaras(
+                self._buscar_ticket_cercano(inicio, -1),
+                self._buscar_ticket_cercano(fin, 1)
+            )
 
-        monto_cancelado = sum(t.monto for t in tickets_cancelados)
-        monto_ok = sum(t.monto for t in tickets_validos)
+    def contar_faltantes(self) -> int:
+        """Folios faltantes dentro del rango escaneado, en O(1)"""
+        if not self.tickets:
+            return 0
+        return (self.folio_max - self.folio_min + 1) - len(self.tickets)
 
+    def _fila_ticket(self, ticket: Ticket, width: int) -> Dict:
         return {
-            'total_ok': len(tickets_validos),
-            'total_cancelados': len(tickets_cancelados),
+            'folio': self.formatear_folio(ticket.folio, width),
+            'status': 'CANCELADO' if ticket.estado == 'CANCELADO' else 'OK',
+            'hora': ticket.fecha_hora.strftime('%H:%M:%S'),
+            'monto': formatear_monto(ticket.centavos),
+            'horario_camaras': None
+        }
+
+    def _fila_faltante(self, folio_num: int, width: int, horario_camaras: str) -> Dict:
+        return {
+            'folio': self.formatear_folio(folio_num, width),
+            'status': 'FALTANTE',
+            'hora': '---',
+            'monto': '---',
+            'horario_camaras': horario_camaras
+        }
+
+    def _horario_camaras(self, ticket_anterior: Optional[Ticket], ticket_posterior: Optional[Ticket]) -> str:
+        """Ventana sugerida para revisar cámaras a partir de los tickets vecinos"""
+        if ticket_anterior and ticket_posterior:
+            # Un folio menor impreso más tarde (reloj atrasado): ordenar por hora
+            if ticket_anterior.fecha_hora > ticket_posterior.fecha_hora:
+                ticket_anterior, ticket_posterior = ticket_posterior, ticket_anterior
+            # Desde la hora (minuto) del ticket anterior hasta 10 min después del posterior
+            hora_inicio = ticket_anterior.fecha_hora.replace(second=0, microsecond=0)
+            hora_fin = (ticket_posterior.fecha_hora + timedelta(minutes=10)).replace(second=0, microsecond=0)
+        elif ticket_anterior:
+            hora_inicio = ticket_anterior.fecha_hora
+            hora_fin = hora_inicio + timedelta(minutes=10)
+        elif ticket_posterior:
+            hora_fin = ticket_posterior.fecha_hora
+            hora_inicio = hora_fin - timedelta(minutes=10)
+        else:
+            return "Sin referencia"
+        return f"{hora_inicio.strftime('%H:%M')} - {hora_fin.strftime('%H:%M')}"
+
+    def obtener_estadisticas_turno(self) -> Dict[str, int]:
+        """Devuelve conteos y montos (en centavos) separados por estado para el turno en curso (O(1))"""
+        return {
+            'total_ok': self.total_ok,
+            'total_cancelados': self.total_cancelados,
             'total_escaneados': len(self.tickets),
-            'monto_ok': monto_ok,
-            'monto_cancelado': monto_cancelado
+            'centavos_ok': self.centavos_ok,
+            'centavos_cancelado': self.centavos_cancelado
         }
     
     def obtener_resumen(self) -> str:
         """Genera un resumen de tickets faltantes y sugerencias de horarios (versión simple)"""
-        stats = self.obtener_estadisticas_turno()
+        return self._texto_resumen(self.obtener_estadisticas_turno(), self.tickets_faltantes_detectados,
+                                   self._buscar_ticket_cercano)
 
-        if not self.tickets_faltantes_detectados:
+    @staticmethod
+    def _texto_resumen(stats: Dict[str, int], faltantes: ConjuntoIntervalos,
+                       buscar_cercano: Callable[[int, int], Optional[Ticket]]) -> str:
+        """Texto de obtener_resumen; recibe el estado para poder usarse con un turno ya separado"""
+        if not faltantes:
             return (
                 "OK - Ningun ticket faltante\n"
                 f"Cancelados registrados: {stats['total_cancelados']}\n"
-                f"Monto cancelado (no suma): ${stats['monto_cancelado']:.2f}"
+                f"Monto cancelado (no suma): {formatear_monto(stats['centavos_cancelado'])}"
             )
 
         resumen = (
-            f"TICKETS FALTANTES: {len(self.tickets_faltantes_detectados)}\n\n"
+            f"TICKETS FALTANTES: {len(faltantes)}\n\n"
             f"Cancelados registrados: {stats['total_cancelados']}\n"
-            f"Monto cancelado (no suma): ${stats['monto_cancelado']:.2f}\n\n"
+            f"Monto cancelado (no suma): {formatear_monto(stats['centavos_cancelado'])}\n\n"
         )
         
-        for folio in sorted(self.tickets_faltantes_detectados):
-            # Buscar tickets antes y después para estimar horario
-            folio_int = int(folio)
-            ticket_anterior = self._buscar_ticket_cercano(folio_int, -1)
-            ticket_posterior = self._buscar_ticket_cercano(folio_int, 1)
+        for inicio, fin in faltantes.intervalos():
+            # Un intervalo no tiene tickets dentro: los vecinos son los mismos para todos sus folios
+            ticket_anterior = buscar_cercano(inicio, -1)
+            ticket_posterior = buscar_cercano(fin, 1)
+            folios = (f"Folio {TicketManager.formatear_folio(inicio)}" if inicio == fin
+                      else f"Folios {TicketManager.formatear_folio(inicio)}-{TicketManager.formatear_folio(fin)}")
             
             if ticket_anterior and ticket_posterior:
                 hora_inicio = ticket_anterior.fecha_hora - timedelta(minutes=5)
                 hora_fin = ticket_posterior.fecha_hora + timedelta(minutes=5)
-                resumen += f"Folio {folio}: Revisar camaras entre {hora_inicio.strftime('%H:%M')} y {hora_fin.strftime('%H:%M')}\n"
+                resumen += f"{folios}: Revisar camaras entre {hora_inicio.strftime('%H:%M')} y {hora_fin.strftime('%H:%M')}\n"
             elif ticket_anterior:
                 hora_inicio = ticket_anterior.fecha_hora
                 hora_fin = hora_inicio + timedelta(minutes=10)
-                resumen += f"Folio {folio}: Revisar camaras desde {hora_inicio.strftime('%H:%M')} (+10 min)\n"
+                resumen += f"{folios}: Revisar camaras desde {hora_inicio.strftime('%H:%M')} (+10 min)\n"
             elif ticket_posterior:
                 hora_fin = ticket_posterior.fecha_hora
                 hora_inicio = hora_fin - timedelta(minutes=10)
-                resumen += f"Folio {folio}: Revisar camaras hasta {hora_fin.strftime('%H:%M')} (-10 min)\n"
+                resumen += f"{folios}: Revisar camaras hasta {hora_fin.strftime('%H:%M')} (-10 min)\n"
             else:
-                resumen += f"Folio {folio}: Sin referencia temporal\n"
+                resumen += f"{folios}: Sin referencia temporal\n"
         
         return resumen
     
     def _buscar_ticket_cercano(self, folio_objetivo: int, direccion: int) -> Optional[Ticket]:
-        """Busca el ticket más cercano en la dirección especificada"""
-        for i in range(1, 100):  # Buscar hasta 100 folios de distancia
-            folio_buscar = folio_objetivo + (i * direccion)
-            if folio_buscar < 1 or folio_buscar > 99999:
-                break
-            t = self._get_ticket_by_int(folio_buscar)
-            if t:
-                return t
-        
-        return None
+        """Busca el ticket más cercano en la dirección especificada (O(log n), sin límite de distancia)"""
+        return self._ticket_cercano(self.tickets, self.folios_ordenados, folio_objetivo, direccion)
+
+    @staticmethod
+    def _ticket_cercano(tickets: Dict[int, Ticket], folios_ordenados: List[int],
+                        folio_objetivo: int, direccion: int) -> Optional[Ticket]:
+        if direccion < 0:
+            i = bisect_left(folios_ordenados, folio_objetivo) - 1
+            if i < 0:
+                return None
+        else:
+            i = bisect_right(folios_ordenados, folio_objetivo)
+            if i >= len(folios_ordenados):
+                return None
+        return tickets[folios_ordenados[i]]
     
     def cierre_de_caja(self) -> str:
-        """Realiza el cierre de caja y prepara para el siguiente turno"""
-        resumen = self.obtener_resumen()
-        
-        # Cambiar turno
+        """
+        Realiza el cierre de caja y prepara para el siguiente turno.
+        El turno se separa en O(1) (se cambian los contenedores, no se copian) y
+        el nuevo turno queda listo de inmediato; el reporte se arma y escribe
+        en segundo plano con un nombre único.
+        """
+        # Con eventos sin escribir no se cierra: quedarían fuera del turno apartado (lanza OSError)
+        self.persistencia.vaciar()
         nuevo_turno = "tarde" if self.turno_actual == "mañana" else "mañana"
-        
-        # Generar reporte de cierre
-        stats = self.obtener_estadisticas_turno()
-        
-        reporte = f"""
-=== CIERRE DE CAJA - TURNO {self.turno_actual.upper()} ===
-Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}
+        libro = self._separar_turno(nuevo_turno)
+        libro['reporte'] = self._reservar_nombre_reporte(libro['turno'], libro['cerrado'])
+
+        # El turno cerrado queda apartado en disco hasta que el reporte y el histórico estén escritos
+        try:
+            libro['cierre'] = self.persistencia.cerrar_turno(self._estado_serializable(), {
+                'turno': libro['turno'],
+                'abierto': libro['abierto'].isoformat() if libro['abierto'] else None,
+                'cerrado': libro['cerrado'].isoformat(timespec='seconds'),
+                'reporte': libro['reporte'],
+            })
+        except Exception as e:
+            print(f"Error guardando datos: {e}")
+
+        self._lanzar_reporte(libro)
+        self._publicar(EVENTO_TURNO_CERRADO, turno=libro['turno'], nuevo_turno=nuevo_turno)
+        return f"Cierre completado. Reporte guardado en: {os.path.basename(libro['reporte'])}"
+
+    def _separar_turno(self, nuevo_turno: str) -> Dict:
+        """Entrega el estado del turno que cierra y deja uno vacío en su lugar"""
+        libro = {
+            'turno': self.turno_actual,
+            'nuevo_turno': nuevo_turno,
+            'abierto': self.turno_abierto,
+            'cerrado': datetime.now().replace(microsecond=0),
+            'stats': self.obtener_estadisticas_turno(),
+            'tickets': self.tickets,
+            'folios_ordenados': self.folios_ordenados,
+            'faltantes': self.tickets_faltantes_detectados,
+        }
+        self.turno_actual = nuevo_turno
+        self.turno_abierto = None
+        self.tickets = {}
+        self.tickets_faltantes_detectados = ConjuntoIntervalos()
+        self._reiniciar_agregados()
+        self.contador_advertencia = 0
+        self.ultimo_folio_esperado = None
+        return libro
+
+    def _reservar_nombre_reporte(self, turno: str, cerrado: datetime) -> str:
+        """cierre_<turno>_<fecha>_<hora>.txt, con sufijo si ya existe: nunca pisa otro reporte"""
+        base = os.path.abspath(f"cierre_{turno}_{cerrado.strftime('%Y%m%d_%H%M%S')}")
+        nombre = base + ".txt"
+        n = 2
+        while os.path.exists(nombre) or nombre in self._reportes_pendientes:
+            nombre = f"{base}_{n}.txt"
+            n += 1
+        return nombre
+
+    def _lanzar_reporte(self, libro: Dict):
+        hilo = threading.Thread(target=self._finalizar_reporte, args=(libro,))
+        self._reportes_pendientes[libro['reporte']] = hilo
+        hilo.start()
+
+    def _finalizar_reporte(self, libro: Dict):
+        """Escribe el reporte y archiva el turno; recién entonces se borra el turno apartado"""
+        nombre_archivo = libro['reporte']
+        completo = True
+        try:
+            stats = libro['stats']
+            resumen = self._texto_resumen(
+                stats, libro['faltantes'],
+                lambda folio, direccion: self._ticket_cercano(libro['tickets'], libro['folios_ordenados'],
+                                                              folio, direccion)
+            )
+            reporte = f"""
+=== CIERRE DE CAJA - TURNO {libro['turno'].upper()} ===
+Fecha: {libro['cerrado'].strftime('%d/%m/%Y %H:%M')}
 
     Tickets OK: {stats['total_ok']}
     Cancelados: {stats['total_cancelados']}
     Total escaneados: {stats['total_escaneados']}
-    Monto total (OK): ${stats['monto_ok']:.2f}
-    Monto cancelado (referencia, no suma): ${stats['monto_cancelado']:.2f}
+    Monto total (OK): {formatear_monto(stats['centavos_ok'])}
+    Monto cancelado (referencia, no suma): {formatear_monto(stats['centavos_cancelado'])}
 
 {resumen}
 
-Próximo turno: {nuevo_turno}
+Próximo turno: {libro['nuevo_turno']}
 ========================================
 """
-        
-        # Guardar reporte
-        fecha_actual = datetime.now().strftime('%Y%m%d')
-        nombre_archivo = f"cierre_{self.turno_actual}_{fecha_actual}.txt"
-        
-        with open(nombre_archivo, 'w', encoding='utf-8') as f:
-            f.write(reporte)
-        
-        # Resetear para nuevo turno
-        self.turno_actual = nuevo_turno
-        self.tickets.clear()
-        self.tickets_por_fecha.clear()
-        self.tickets_faltantes_detectados.clear()
-        self.contador_advertencia = 0
-        self.ultimo_folio_esperado = None
-        
-        self.guardar_datos()
-        
-        return f"Cierre completado. Reporte guardado en: {nombre_archivo}"
-    
+            # Un cierre recuperado puede tener ya su reporte (se escribe de forma atómica)
+            if not os.path.exists(nombre_archivo):
+                escribir_atomico(nombre_archivo, reporte)
+        except Exception as e:
+            completo = False
+            print(f"Error guardando reporte de cierre: {e}")
+        try:
+            self.historico.archivar_turno(
+                libro['turno'], libro['abierto'] or libro['cerrado'], libro['cerrado'],
+                [libro['tickets'][folio] for folio in libro['folios_ordenados']],
+                libro['stats'], len(libro['faltantes'])
+            )
+            if completo and libro.get('cierre') is not None:
+                self.persistencia.confirmar_cierre(libro['cierre'])
+        except Exception as e:
+            print(f"Error archivando turno: {e}")
+        finally:
+            self._reportes_pendientes.pop(nombre_archivo, None)
+
+    def _recuperar_cierres(self):
+        """
+        Termina los cierres que un corte dejó sin reporte o sin archivar: el turno
+        sigue apartado en la persistencia y se rearma en un TicketManager aparte
+        """
+        for cierre, info, datos, registros in self.persistencia.cierres_pendientes():
+            anterior = TicketManager(self.data_file, cargar=False, persistencia=self.persistencia)
+            anterior._restaurar(datos, registros)
+            turno = info.get('turno') or anterior.turno_actual
+            libro = anterior._separar_turno("tarde" if turno == "mañana" else "mañana")
+            cerrado = datetime.fromisoformat(info['cerrado']) if info.get('cerrado') else libro['cerrado']
+            abierto = datetime.fromisoformat(info['abierto']) if info.get('abierto') else None
+            if abierto is None and anterior.tiempos_ordenados:
+                abierto = anterior.tiempos_ordenados[0][0]
+            libro.update(turno=turno, abierto=abierto, cerrado=cerrado, cierre=cierre,
+                         reporte=info.get('reporte') or self._reservar_nombre_reporte(turno, cerrado))
+            print(f"Recuperando cierre del turno {turno} ({info.get('cerrado')})")
+            self._lanzar_reporte(libro)
+
+    def esperar_reportes(self, timeout: Optional[float] = None):
+        """Espera a que terminen de escribirse los reportes de cierre pendientes"""
+        for hilo in list(self._reportes_pendientes.values()):
+            hilo.join(timeout)
+
+    def _serializar_ticket(self, ticket: Ticket) -> Dict:
+        return {
+            'folio': ticket.folio,
+            'fecha_hora': ticket.fecha_hora.isoformat(),
+            'centavos': ticket.centavos,
+            'codigo_original': ticket.codigo_original,
+            'estado': getattr(ticket, 'estado', 'OK')
+        }
+
+    def _registro_alta(self, ticket: Ticket) -> Dict:
+        """Registro compacto de journal para un ticket nuevo"""
+        return {
+            'op': 'alta',
+            'f': ticket.folio,
+            'h': ticket.fecha_hora.isoformat(),
+            'ct': ticket.centavos,
+            'c': ticket.codigo_original,
+            'e': getattr(ticket, 'estado', 'OK')
+        }
+
+    def _registrar_evento(self, registro: Dict):
+        """Anexa un evento al journal y compacta en segundo plano cuando crece"""
+        self._registrar_eventos([registro])
+
+    def _registrar_eventos(self, registros: List[Dict]):
+        try:
+            self.persistencia.registrar_lote(registros)
+            if self.persistencia.necesita_compactar():
+                # En este hilo sólo se copian referencias; el hilo escritor arma el snapshot.
+                # Un estado más nuevo en un ticket copiado no importa: los 'estado' posteriores
+                # del journal se vuelven a aplicar al cargar y dejan el mismo resultado.
+                estado = self._estado_turno()
+                tickets = list(self.tickets.values())
+                self.persistencia.compactar_en_segundo_plano(
+                    lambda: self._estado_serializable(estado, tickets))
+        except Exception as e:
+            print(f"Error guardando datos: {e}")
+
+    def error_persistencia(self) -> Optional[str]:
+        """Por qué hay eventos sin guardar (se siguen reintentando), o None si todo se escribió"""
+        return getattr(self.persistencia, 'error_escritura', None)
+
+    def _estado_turno(self) -> Dict:
+        """Datos del turno sin los tickets (tamaño independiente del turno)"""
+        return {
+            'turno_actual': self.turno_actual,
+            'turno_abierto': self.turno_abierto.isoformat() if self.turno_abierto else None,
+            'tickets_faltantes': self.tickets_faltantes_detectados.a_lista(),
+            'contador_advertencia': self.contador_advertencia,
+            'ultimo_folio_esperado': self.ultimo_folio_esperado
+        }
+
+    def _estado_serializable(self, estado: Optional[Dict] = None,
+                             tickets: Optional[Iterable[Ticket]] = None) -> Dict:
+        estado = self._estado_turno() if estado is None else estado
+        tickets = self.tickets.values() if tickets is None else tickets
+        return dict(estado, tickets={str(t.folio): self._serializar_ticket(t) for t in tickets})
+
+    @staticmethod
+    def _centavos_guardados(centavos: Optional[int], monto: Optional[float]) -> int:
+        """Los archivos anteriores guardaban el monto como float"""
+        if centavos is not None:
+            return int(centavos)
+        return round((monto or 0) * 100)
+
     def guardar_datos(self):
-        """Guarda los datos en un archivo JSON"""
+        """Guarda un snapshot completo en el archivo JSON y vacía el journal"""
         try:
-            datos = {
-                'turno_actual': self.turno_actual,
-                'tickets': {},
-                'tickets_faltantes': list(self.tickets_faltantes_detectados),
-                'contador_advertencia': self.contador_advertencia,
-                'ultimo_folio_esperado': self.ultimo_folio_esperado
-            }
-            
-            # Serializar tickets
-            for folio, ticket in self.tickets.items():
-                datos['tickets'][folio] = {
-                    'folio': ticket.folio,
-                    'fecha_hora': ticket.fecha_hora.isoformat(),
-                    'monto': ticket.monto,
-                    'codigo_original': ticket.codigo_original,
-                    'estado': getattr(ticket, 'estado', 'OK')
-                }
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(datos, f, indent=2, ensure_ascii=False)
-                
+            self.persistencia.guardar_snapshot(self._estado_serializable())
         except Exception as e:
             print(f"Error guardando datos: {e}")
     
     def cargar_datos(self):
-        """Carga los datos desde el archivo JSON"""
+        """Carga el último snapshot JSON y reproduce el journal posterior"""
+        try:
+            datos, registros = self.persistencia.cargar()
+            self._restaurar(datos, registros)
+
+            if hasattr(self.persistencia, 'leer_registros'):
+                self._cargar_log_binario()
+        except Exception as e:
+            print(f"Error cargando datos: {e}")
+
+        if self.turno_abierto is None and self.tiempos_ordenados:
+            # Archivos anteriores no guardaban la apertura: el ticket más antiguo la aproxima
+            self.turno_abierto = self.tiempos_ordenados[0][0]
+
+        try:
+            self._recuperar_cierres()
+        except Exception as e:
+            print(f"Error recuperando cierres pendientes: {e}")
+
+    def _restaurar(self, datos: Optional[Dict], registros: Iterable[Dict]):
+        """Aplica un snapshot y los eventos posteriores (formato de persistencia.cargar)"""
+        if datos:
+            self.turno_actual = datos.get('turno_actual', 'mañana')
+            if datos.get('turno_abierto'):
+                self.turno_abierto = datetime.fromisoformat(datos['turno_abierto'])
+            # Acepta [[inicio, fin], ...] y la lista anterior de folios ('007' o 7)
+            self.tickets_faltantes_detectados = ConjuntoIntervalos.desde_lista(datos.get('tickets_faltantes', []))
+            self.contador_advertencia = datos.get('contador_advertencia', 0)
+            self.ultimo_folio_esperado = datos.get('ultimo_folio_esperado')
+            
+            # Deserializar tickets
+            tickets_data = datos.get('tickets', {})
+            for ticket_data in tickets_data.values():
+                fecha_hora = datetime.fromisoformat(ticket_data['fecha_hora'])
+                ticket = Ticket(
+                    int(ticket_data['folio']),
+                    fecha_hora,
+                    self._centavos_guardados(ticket_data.get('centavos'), ticket_data.get('monto')),
+                    ticket_data['codigo_original'],
+                    ticket_data.get('estado', 'OK')
+                )
+                self.tickets[ticket.folio] = ticket
+                self._acumular_ticket(ticket)
+
+        # Reproducir eventos del journal posteriores al snapshot
+        for registro in registros:
+            if registro.get('op') == 'alta':
+                ticket = Ticket(
+                    int(registro['f']),
+                    datetime.fromisoformat(registro['h']),
+                    self._centavos_guardados(registro.get('ct'), registro.get('m')),
+                    registro['c'],
+                    registro.get('e', 'OK')
+                )
+                self._aplicar_ticket(ticket)
+            elif registro.get('op') == 'estado':
+                ticket = self.tickets.get(int(registro['f']))
+                if ticket is not None:
+                    self._aplicar_estado(ticket, registro['e'])
+
+    def _cargar_log_binario(self):
+        """
+        Reproduce el log de ancho fijo (backend 'binario'): el primer registro de
+        un folio es su alta y los siguientes, cambios de estado
+        """
+        registros, codigos = self.persistencia.leer_registros()
+        for folio, segundos, centavos, desplazamiento, largo, estado in registros:
+            ticket = self.tickets.get(folio)
+            if ticket is not None:
+                self._aplicar_estado(ticket, ESTADOS[estado])
+            else:
+                self._aplicar_ticket(TicketMapeado(folio, desde_segundos(segundos), centavos,
+                                                   codigos, desplazamiento, largo, ESTADOS[estado]))
+
+    def consultar_turnos(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict]:
+        """Totales de turnos anteriores (sólo con el backend 'sqlite')"""
+        if not hasattr(self.persistencia, 'resumen_turnos'):
+            return []
+        return self.persistencia.resumen_turnos(desde, hasta)
+
+    def consultar_historico(self, desde: Optional[str] = None, hasta: Optional[str] = None,
+                            turno: Optional[str] = None) -> List[Dict]:
+        """
+        Totales de los turnos archivados con día de apertura en [desde, hasta]
+        ('YYYY-MM-DD'); sale del índice, sin leer los tickets
+        """
+        return self.historico.turnos(desde, hasta, turno)
+
+    def tickets_historicos(self, desde: Optional[str] = None, hasta: Optional[str] = None,
+                           turno: Optional[str] = None) -> Iterator[Ticket]:
+        """Tickets archivados del rango, turno por turno y en orden de folio (mapea sólo esos tramos)"""
+        for _, folio, fecha_hora, centavos, estado, codigo in self.historico.tickets(desde, hasta, turno):
+            yield Ticket(folio, fecha_hora, centavos, codigo, estado)
+
+    def cerrar(self):
+        """Sincroniza a disco lo pendiente; llamar al salir de la aplicación"""
+        self.esperar_reportes()
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    datos = json.load(f)
-                
-                self.turno_actual = datos.get('turno_actual', 'mañana')
-                self.tickets_faltantes_detectados = set(datos.get('tickets_faltantes', []))
-                self.contador_advertencia = datos.get('contador_advertencia', 0)
-                self.ultimo_folio_esperado = datos.get('ultimo_folio_esperado')
-                
-                # Deserializar tickets
-                tickets_data = datos.get('tickets', {})
-                for folio, ticket_data in tickets_data.items():
-                    fecha_hora = datetime.fromisoformat(ticket_data['fecha_hora'])
-                    ticket = Ticket(
-                        ticket_data['folio'],
-                        fecha_hora,
-                        ticket_data['monto'],
-                        ticket_data['codigo_original'],
-                        ticket_data.get('estado', 'OK')
-                    )
-                    self.tickets[folio] = ticket
-                    
-                    # Organizar por fecha
-                    fecha_str = fecha_hora.strftime('%Y-%m-%d')
-                    if fecha_str not in self.tickets_por_fecha:
-                        self.tickets_por_fecha[fecha_str] = []
-                    self.tickets_por_fecha[fecha_str].append(ticket)
-                        
+            self.persistencia.cerrar()
         except Exception as e:
-            print(f"Error cargando datos: {e}")
\ No newline at end of file
+            print(f"Error cerrando persistencia: {e}")